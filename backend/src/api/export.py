@@ -1,329 +1,159 @@
 from __future__ import annotations
 
-import io
-import json
-import os
-import zipfile
-from datetime import datetime, date
-from decimal import Decimal
-from typing import Any, Dict, List, Optional, Tuple
-
-from flask import Blueprint, Response, request
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
+
+from services.exports import (
+    ExportError,
+    cache_path,
+    export_filename,
+    export_mimetype,
+    fail_job,
+    get_job,
+    normalize_params,
+    open_export,
+    start_job,
+    tee_to_file,
+)
 
 try:
-    from services.db.connection import db_cursor  # type: ignore
-except Exception:  # pragma: no cover - allow running without DB
-    db_cursor = None  # type: ignore
+    from services.tasks import process_export  # type: ignore
+except Exception:  # pragma: no cover - allow running without Celery in tests/dev
+    process_export = None  # type: ignore
 
-from services.storage import FileStorage
+logger = logging.getLogger(__name__)
 
 export_bp = Blueprint("export", __name__)
-_jobs: Dict[str, dict] = {}
-
 
-def _parse_date(value: Optional[str]) -> Optional[date]:
-    if not value:
-        return None
-    value = value.strip()
-    if not value:
-        return None
-    try:
-        return datetime.fromisoformat(value).date()
-    except ValueError:
-        try:
-            return datetime.strptime(value, "%Y-%m-%d").date()
-        except ValueError:
-            return None
 
+def _text_error(e: ExportError) -> Response:
+    return Response(e.message, status=e.status, mimetype="text/plain; charset=utf-8")
 
-def _fetch_proposals(period_from: Optional[date], period_to: Optional[date]) -> Tuple[List[dict], Dict[str, str]]:
-    if db_cursor is None:
-        return [], {}
 
-    where: List[str] = ["uf.ai_status = 'completed'"]
-    params: List[Any] = []
-    if period_from:
-        where.append("DATE(COALESCE(uf.purchase_datetime, uf.created_at)) >= %s")
-        params.append(period_from.isoformat())
-    if period_to:
-        where.append("DATE(COALESCE(uf.purchase_datetime, uf.created_at)) <= %s")
-        params.append(period_to.isoformat())
+def _serve_export(kind: str, raw: Dict[str, Any]) -> Any:
+    """Download an export directly: from the result cache when this exact data was
+    exported before, otherwise streamed while the cache file is written alongside.
 
-    where_sql = " AND ".join(where)
-    sql = f"""
-        SELECT
-            uf.id,
-            COALESCE(uf.purchase_datetime, uf.created_at) AS dt,
-            COALESCE(uf.merchant_name, '') AS merchant,
-            ap.account_code,
-            ap.debit,
-            ap.credit,
-            ap.notes
-        FROM ai_accounting_proposals ap
-        JOIN unified_files uf ON uf.id = ap.receipt_id
-        WHERE {where_sql}
-        ORDER BY dt ASC, uf.id ASC, ap.id ASC
+    Direct downloads are not recorded in the export job registry; use /export/jobs
+    for a download that can be picked up later.
     """
-
-    grouped: Dict[str, dict] = {}
-    account_labels: Dict[str, str] = {}
-
-    try:
-        with db_cursor() as cur:
-            cur.execute(sql, tuple(params))
-            rows = cur.fetchall() or []
-    except Exception:
-        return [], {}
-
-    for rid, dt, merchant, account, debit, credit, notes in rows:
-        entry_amount = Decimal(str(debit or 0)) - Decimal(str(credit or 0))
-        if rid not in grouped:
-            ver_date = dt.date() if hasattr(dt, "date") else datetime.utcnow().date()
-            grouped[rid] = {
-                "date": ver_date,
-                "text": merchant or f"Receipt {rid}",
-                "entries": [],
-            }
-        grouped[rid]["entries"].append(
-            {
-                "account": account,
-                "amount": entry_amount,
-                "notes": notes or "",
-            }
-        )
-        if account not in account_labels:
-            label = (notes or "").strip()
-            account_labels[account] = label or f"Account {account}"
-    verifications = list(grouped.values())
-    verifications.sort(key=lambda item: (item["date"], item["text"]))
-    return verifications, account_labels
-
-
-def _format_amount(amount: Decimal) -> str:
-    quantized = amount.quantize(Decimal("0.01"))
-    return f"{quantized:.2f}"
-
-
-def _sanitize_text(value: str) -> str:
-    return value.replace('"', "'").strip() or "Receipt"
-
-
-
-def _build_sie(verifications: List[dict], account_labels: Dict[str, str], period_from: Optional[date], period_to: Optional[date]) -> str:
-    today = datetime.utcnow().strftime("%Y%m%d")
-    lines = [
-        "#FLAGGA 0",
-        "#FORMAT PC8",
-        '#PROGRAM "Mind Admin" "1.0"',
-        f"#GEN {today}",
-        "#SIETYP 4",
-    ]
-
-    if period_from or period_to:
-        comment_from = period_from.isoformat() if period_from else "(start)"
-        comment_to = period_to.isoformat() if period_to else "(end)"
-        lines.append(f"; Export period {comment_from} to {comment_to}")
-
-    for account in sorted(account_labels.keys()):
-        label = _sanitize_text(account_labels[account])
-        lines.append(f'#KONTO {account} "{label}"')
-
-    if not verifications:
-        lines.append("; No verifications available for selected period")
-        return "\n".join(lines) + "\n"
-
-    for index, ver in enumerate(verifications, start=1):
-        ver_date = ver["date"].strftime("%Y%m%d") if isinstance(ver["date"], date) else today
-        ver_text = _sanitize_text(ver["text"])
-        ver_nr = f"{index:04d}"
-        lines.append(f'#VER "A" "{ver_nr}" {ver_date} "{ver_text}"')
-        for entry in ver["entries"]:
-            amount = entry.get("amount", Decimal("0"))
-            if not isinstance(amount, Decimal):
-                amount = Decimal(str(amount or 0))
-            if amount == 0:
-                continue
-            formatted_amount = _format_amount(amount)
-            entry_text = _sanitize_text(entry.get("notes") or ver_text)
-            lines.append(f'#TRANS {entry["account"]} {{}} {formatted_amount} "{entry_text}"')
-
-    return "\n".join(lines) + "\n"
-
-
-def _build_filename(period_from: Optional[date], period_to: Optional[date]) -> str:
-    if period_from and period_to:
-        return f"export_{period_from.isoformat()}_{period_to.isoformat()}.sie"
-    if period_from:
-        return f"export_{period_from.isoformat()}_end.sie"
-    if period_to:
-        return f"export_start_{period_to.isoformat()}.sie"
-    return "export_all.sie"
-
-
-def _collect_company_card_data(statement_id: str) -> Tuple[Optional[dict], List[Tuple[str, bytes]], Optional[str]]:
-    if db_cursor is None:
-        return None, [], "db_unavailable"
-
-    statement_sql = (
-        "SELECT id, period_start, period_end, status, uploaded_at FROM invoice_documents "
-        "WHERE id=%s AND invoice_type='company_card'"
-    )
-
-    lines_sql = (
-        "SELECT id, transaction_date, amount, merchant_name, description, matched_file_id, match_status "
-        "FROM invoice_lines WHERE invoice_id=%s ORDER BY transaction_date ASC, id ASC"
-    )
-
-    receipt_map: Dict[str, dict] = {}
     try:
-        with db_cursor() as cur:
-            cur.execute(statement_sql, (statement_id,))
-            row = cur.fetchone()
-            if not row:
-                return None, [], "not_found"
-            sid, p_start, p_end, status, uploaded_at = row
-            statement_info = {
-                "id": sid,
-                "period_start": p_start.isoformat() if hasattr(p_start, "isoformat") and p_start else None,
-                "period_end": p_end.isoformat() if hasattr(p_end, "isoformat") and p_end else None,
-                "status": status,
-                "uploaded_at": uploaded_at.isoformat() if hasattr(uploaded_at, "isoformat") else str(uploaded_at),
-            }
-
-            cur.execute(lines_sql, (statement_id,))
-            line_rows = cur.fetchall() or []
-    except Exception:
-        return None, [], "db_error"
-
-    lines: List[dict] = []
-    receipt_ids: List[str] = []
-    for (lid, tx, amount, merchant_name, description, matched_file_id, match_status) in line_rows:
-        if matched_file_id:
-            receipt_ids.append(matched_file_id)
-        lines.append(
-            {
-                "id": int(lid),
-                "transaction_date": tx.isoformat() if hasattr(tx, "isoformat") else tx,
-                "amount": float(amount) if amount is not None else None,
-                "merchant_name": merchant_name,
-                "description": description,
-                "matched_file_id": matched_file_id,
-                "match_status": match_status,
-            }
-        )
-
-    if receipt_ids:
-        placeholders = ",".join(["%s"] * len(receipt_ids))
-        receipt_sql = (
-            "SELECT id, merchant_name, purchase_datetime, gross_amount, net_amount, ai_status, submitted_by "
-            f"FROM unified_files WHERE id IN ({placeholders})"
-        )
-        try:
-            with db_cursor() as cur:
-                cur.execute(receipt_sql, tuple(receipt_ids))
-                for rid, merchant, purchase_dt, gross, net, ai_status, submitted_by in cur.fetchall() or []:
-                    receipt_map[rid] = {
-                        "id": rid,
-                        "merchant_name": merchant,
-                        "purchase_datetime": purchase_dt.isoformat() if hasattr(purchase_dt, "isoformat") else purchase_dt,
-                        "gross_amount": float(gross) if gross is not None else None,
-                        "net_amount": float(net) if net is not None else None,
-                        "ai_status": ai_status,
-                        "submitted_by": submitted_by,
-                        "files": [],
-                    }
-        except Exception:
-            return None, [], "db_error"
-
-    storage = FileStorage(os.getenv("STORAGE_DIR", "/data/storage"))
-    assets: List[Tuple[str, bytes]] = []
-    for rid in receipt_map.keys():
+        params = normalize_params(kind, raw)
+    except ExportError as e:
+        return _text_error(e)
+    job = start_job(kind, params, record=False)
+    job_id = datetime.utcnow().strftime(f"{kind}-%Y%m%d%H%M%S%f")
+    filename = export_filename(kind, params)
+
+    if job["cached_path"] is not None:
+        resp = send_file(job["cached_path"], mimetype=export_mimetype(kind), as_attachment=True, download_name=filename)
+    else:
         try:
-            files = storage.list(rid)
-        except Exception:
-            files = []
-        for fname in files:
+            chunks = open_export(kind, params)
+        except ExportError as e:
+            return _text_error(e)
+        target = cache_path(job["cache_key"]) if job["cache_key"] else None
+        if target is not None:
+            chunks = tee_to_file(chunks, target)
+
+        def generate() -> Iterator[bytes]:
             try:
-                data = storage.load(rid, fname)
-                zip_path = f"receipts/{rid}/{fname}"
-                assets.append((zip_path, data))
-                receipt_map[rid]["files"].append(zip_path)
-            except Exception:
-                continue
-
-    bundle = {
-        "statement": statement_info,
-        "lines": [],
-    }
-
-    for line in lines:
-        rid = line.get("matched_file_id")
-        matched_receipt = receipt_map.get(rid) if rid else None
-        bundle["lines"].append(
-            {
-                **line,
-                "matched_receipt": matched_receipt,
-            }
-        )
-
-    return bundle, assets, None
+                yield from chunks
+            except GeneratorExit:
+                # The client went away before the last chunk; closing the tee drops its partial file
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+                raise
+            except Exception as e:
+                logger.error(f"export: direct {kind} export {job_id} failed: {e}")
+                raise
+
+        resp = Response(stream_with_context(generate()), status=200, mimetype=export_mimetype(kind))
+        resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    resp.headers["X-Export-Job-Id"] = job_id
+    return resp
 
 
 @export_bp.get("/export/sie")
 def export_sie() -> Any:
-    period_from = _parse_date(request.args.get("from"))
-    period_to = _parse_date(request.args.get("to"))
-    if period_from and period_to and period_from > period_to:
-        period_from, period_to = period_to, period_from
+    return _serve_export("sie", {"from": request.args.get("from"), "to": request.args.get("to")})
 
-    verifications, account_labels = _fetch_proposals(period_from, period_to)
-    sie_content = _build_sie(verifications, account_labels, period_from, period_to)
 
-    job_id = datetime.utcnow().strftime("sie-%Y%m%d%H%M%S%f")
-    _jobs[job_id] = {
-        "status": "done",
-        "from": period_from.isoformat() if period_from else None,
-        "to": period_to.isoformat() if period_to else None,
-        "verifications": len(verifications),
-    }
+@export_bp.get("/export/company-card")
+def export_company_card() -> Any:
+    return _serve_export("company_card", {"statement_id": request.args.get("statement_id")})
 
-    filename = _build_filename(period_from, period_to)
-    resp = Response(sie_content, status=200, mimetype="text/plain; charset=utf-8")
-    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    resp.headers["X-Export-Job-Id"] = job_id
-    return resp
 
+def _job_payload(job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {key: job.get(key) for key in ("id", "kind", "params", "status", "error", "result_size",
+                                            "created_at", "started_at", "finished_at")}
+    ready = job.get("status") == "done" and job.get("result_path")
+    payload["download_url"] = f"/export/jobs/{job['id']}/download" if ready else None
+    return payload
 
-@export_bp.get("/export/company-card")
-def export_company_card() -> Any:
-    statement_id = request.args.get("statement_id")
-    if not statement_id or not statement_id.strip():
-        return Response("statement_id is required", status=400, mimetype="text/plain; charset=utf-8")
 
-    bundle, assets, error = _collect_company_card_data(statement_id.strip())
-    if error == "db_unavailable":
-        return Response("database unavailable", status=503, mimetype="text/plain; charset=utf-8")
-    if error == "not_found":
-        return Response("statement not found", status=404, mimetype="text/plain; charset=utf-8")
-    if error == "db_error" or bundle is None:
-        return Response("failed to build export", status=500, mimetype="text/plain; charset=utf-8")
+@export_bp.post("/export/jobs")
+def create_export_job() -> Any:
+    """Queue an export on the Celery export queue; body ``{kind, from, to}`` or ``{kind, statement_id}``."""
+    payload = request.get_json(silent=True) or {}
+    kind = str(payload.get("kind") or "sie")
+    try:
+        params = normalize_params(kind, payload)
+    except ExportError as e:
+        return jsonify({"error": e.message}), e.status
+    job = start_job(kind, params)
+    if not job["recorded"]:
+        return jsonify({"error": "export registry unavailable"}), 503
+    if job["status"] != "done":
+        try:
+            if process_export is None:
+                raise RuntimeError("tasks_unavailable")
+            process_export.delay(job["id"])  # type: ignore[attr-defined]
+        except Exception as e:
+            logger.error(f"export: failed to queue job {job['id']}: {e}")
+            fail_job(job["id"], "queue_unavailable")
+            return jsonify({"error": "queue_unavailable", "id": job["id"]}), 503
+    try:
+        stored = get_job(job["id"])
+    except ExportError:
+        stored = None
+    body = _job_payload(stored or {"id": job["id"], "kind": kind, "params": params, "status": job["status"]})
+    return jsonify(body), 200 if job["status"] == "done" else 202
 
-    buffer = io.BytesIO()
-    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("statement.json", json.dumps(bundle, ensure_ascii=False, indent=2))
-        for path, data in assets:
-            zf.writestr(path, data)
 
-    job_id = datetime.utcnow().strftime("cc-%Y%m%d%H%M%S%f")
-    _jobs[job_id] = {
-        "status": "done",
-        "statement_id": statement_id,
-        "attachments": len(assets),
-    }
+@export_bp.get("/export/jobs/<job_id>")
+def export_job_status(job_id: str) -> Any:
+    try:
+        job = get_job(job_id)
+    except ExportError as e:
+        return jsonify({"error": e.message}), e.status
+    if job is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(_job_payload(job)), 200
 
-    buffer.seek(0)
-    filename = f"company_card_{statement_id}.zip"
-    resp = Response(buffer.getvalue(), status=200, mimetype="application/zip")
-    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    resp.headers["X-Export-Job-Id"] = job_id
-    return resp
+
+@export_bp.get("/export/jobs/<job_id>/download")
+def export_job_download(job_id: str) -> Any:
+    try:
+        job = get_job(job_id)
+    except ExportError as e:
+        return jsonify({"error": e.message}), e.status
+    if job is None:
+        return jsonify({"error": "not_found"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": "not_ready", "status": job["status"]}), 409
+    path = Path(job["result_path"]) if job.get("result_path") else None
+    if path is None or not path.is_file():
+        # Evicted from the cache; the client should start a new job.
+        return jsonify({"error": "result_expired"}), 410
+    return send_file(
+        path,
+        mimetype=export_mimetype(job["kind"]),
+        as_attachment=True,
+        download_name=export_filename(job["kind"], job["params"]),
+    )
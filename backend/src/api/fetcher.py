@@ -39,6 +39,7 @@ def trigger_fetch_ftp():
                 "downloaded": result.downloaded,
                 "skipped": result.skipped,
                 "errors": result.errors,
+                "duplicates": result.duplicates,
                 "enqueued": enqueued,
             }
         ),
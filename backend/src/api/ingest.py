@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+import json
 import os
+import shutil
 import uuid
-from typing import Any
+from typing import Any, Optional
 from flask import Blueprint, jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.formparser import parse_form_data
 
 from api.middleware import auth_required
+from services import capture_uploads
+from services.capture import CaptureRecordError, PageWriter, commit_pages, discard_receipt, record_capture
+from services.dedup import CHUNK_SIZE
 from services.queue_manager import get_celery
 from services.storage import FileStorage
 try:
@@ -17,10 +24,6 @@ try:
     from services.db.files import list_unprocessed
 except Exception:  # pragma: no cover
     list_unprocessed = lambda limit=50: []  # type: ignore
-try:
-    from services.db.connection import db_cursor
-except Exception:  # pragma: no cover
-    db_cursor = None  # type: ignore
 
 
 ingest_bp = Blueprint("ingest", __name__)
@@ -67,21 +70,76 @@ def trigger_classify(fid: str):
     return jsonify({"queued": True, "task_id": getattr(r, "id", None)}), 200
 
 
+def _stream_pages(
+    fs: FileStorage, receipt_id: str, created: list[PageWriter]
+) -> tuple[Any, list[tuple[PageWriter, Optional[str]]]]:
+    """Parse the multipart body with every file part written straight to disk.
+
+    Returns the form fields and the ``images`` pages with their client filenames;
+    every part created is appended to ``created`` so the caller can clean up.
+    """
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        page = PageWriter(fs, receipt_id, len(created) + 1)
+        created.append(page)
+        return page
+
+    if "files" in request.__dict__:
+        # Something already parsed the body (and spooled it); copy those parts instead.
+        form, files = request.form, request.files
+        pages = []
+        for f in files.getlist('images'):
+            page = stream_factory(None, None, f.filename)
+            shutil.copyfileobj(f.stream, page, CHUNK_SIZE)
+            pages.append((page, f.filename))
+        return form, pages
+
+    _stream, form, files = parse_form_data(
+        request.environ,
+        stream_factory=stream_factory,
+        max_form_memory_size=request.max_form_memory_size,
+        max_content_length=request.max_content_length,
+        max_form_parts=request.max_form_parts,
+        silent=False,
+    )
+    return form, [(f.stream, f.filename) for f in files.getlist('images')]
+
+
 @ingest_bp.post("/capture/upload")
 def capture_upload() -> Any:
     """Public capture endpoint: accepts multi-page images, optional tags and location.
     Behavior:
-      - For each uploaded image, ensure a unified_files record exists (id = shared receipt_id)
-      - Save files under STORAGE_DIR/<receipt_id>/page-*.ext via FileStorage
-      - Store optional tags into file_tags (best-effort) and enqueue OCR for the first page
+      - Each page is streamed in chunks to STORAGE_DIR/<receipt_id>/, hashed and its format
+        sniffed on the way, then fsynced and renamed to page-<n>.<ext>
+      - The unified_files row (id = shared receipt_id), tags and location are written in one transaction;
+        if that fails the pages are removed and 500 is returned
+      - OCR is enqueued for the receipt
+      - If the same pages were already ingested, return the existing receipt_id with duplicate=true
     """
-    files = request.files.getlist('images')
-    if not files:
+    receipt_id = str(uuid.uuid4())
+    storage_dir = os.getenv('STORAGE_DIR', '/data/storage')
+    fs = FileStorage(storage_dir)
+    created: list[PageWriter] = []
+    try:
+        form, pages = _stream_pages(fs, receipt_id, created)
+    except HTTPException:
+        discard_receipt(fs, receipt_id, created)
+        raise
+    except Exception:
+        discard_receipt(fs, receipt_id, created)
+        return jsonify({"ok": False, "error": "bad_upload"}), 400
+    # Parts that are not pages are not kept
+    page_set = {id(page) for page, _ in pages}
+    for part in created:
+        if id(part) not in page_set:
+            part.discard()
+    if not pages:
+        discard_receipt(fs, receipt_id)
         return jsonify({"ok": False, "error": "no_images"}), 400
-    tags_raw = request.form.get('tags')
-    location_raw = request.form.get('location')
+
+    tags_raw = form.get('tags')
+    location_raw = form.get('location')
     try:
-        import json
         tags = json.loads(tags_raw) if tags_raw else []
         if not isinstance(tags, list):
             tags = []
@@ -94,74 +152,109 @@ def capture_upload() -> Any:
             location = json.loads(location_raw)
         except Exception:
             location = None
-    receipt_id = str(uuid.uuid4())
-    storage_dir = os.getenv('STORAGE_DIR', '/data/storage')
-    fs = FileStorage(storage_dir)
-    saved: list[str] = []
     # Get original filename from first file
-    original_filename = files[0].filename if files[0] and files[0].filename else None
+    original_filename = pages[0][1] or None
 
-    # Insert unified_files row
-    if db_cursor is not None:
-        try:
-            with db_cursor() as cur:
-                cur.execute(
-                    (
-                        "INSERT INTO unified_files (id, file_type, created_at, submitted_by, original_filename) "
-                        "VALUES (%s, %s, NOW(), %s, %s)"
-                    ),
-                    (receipt_id, 'receipt', (request.headers.get('X-User') or 'anonymous'), original_filename),
-                )
-        except Exception:
-            # best-effort
-            pass
-    # Save files
-    for idx, f in enumerate(files, start=1):
-        # derive extension
-        fname = f.filename or f"page-{idx}.jpg"
-        ext = os.path.splitext(fname)[1] or '.jpg'
-        safe_name = f"page-{idx}{ext}"
-        try:
-            data = f.read()
-            fs.save(receipt_id, safe_name, data)
-            saved.append(safe_name)
-        except Exception:
-            continue
-    # Save tags best-effort
-    if tags and db_cursor is not None:
-        try:
-            with db_cursor() as cur:
-                for t in tags:
-                    if not t or not isinstance(t, str):
-                        continue
-                    cur.execute(
-                        (
-                            "INSERT INTO file_tags (file_id, tag, created_at) VALUES (%s, %s, NOW())"
-                        ),
-                        (receipt_id, t.strip()),
-                    )
-        except Exception:
-            pass
-    # Save location best-effort
-    if location and isinstance(location, dict) and db_cursor is not None:
-        try:
-            lat = location.get('lat')
-            lon = location.get('lon')
-            acc = location.get('acc')
-            with db_cursor() as cur:
-                cur.execute(
-                    (
-                        "INSERT INTO file_locations (file_id, lat, lon, acc) VALUES (%s, %s, %s, %s)"
-                    ),
-                    (receipt_id, lat, lon, acc),
-                )
-        except Exception:
-            pass
+    saved, page_hashes, mime_type = commit_pages(pages)
+    try:
+        existing = record_capture(
+            receipt_id,
+            page_hashes,
+            request.headers.get('X-User') or 'anonymous',
+            original_filename,
+            mime_type=mime_type,
+            tags=tags,
+            location=location,
+        )
+    except CaptureRecordError:
+        # Without its row the receipt is unreachable; drop the pages and let the client retry
+        discard_receipt(fs, receipt_id)
+        return jsonify({"ok": False, "error": "record_failed"}), 500
+    if existing is not None:
+        # The same receipt uploaded again is linked to the existing row instead of being stored and OCR'd twice
+        discard_receipt(fs, receipt_id)
+        return jsonify({"ok": True, "receipt_id": existing, "duplicate": True, "saved": []}), 200
     # Enqueue OCR for this receipt (first page id == receipt_id in this schema)
+    _enqueue_ocr(receipt_id)
+    return jsonify({"ok": True, "receipt_id": receipt_id, "saved": saved}), 200
+
+
+def _enqueue_ocr(receipt_id: str) -> None:
     try:
         if process_ocr is None:
             raise RuntimeError("tasks_unavailable")
         process_ocr.delay(receipt_id)  # type: ignore[attr-defined]
     except Exception:
         pass
-    return jsonify({"ok": True, "receipt_id": receipt_id, "saved": saved}), 200
+
+
+def _upload_error(e: capture_uploads.UploadError) -> Any:
+    return jsonify({"ok": False, "error": e.error, **e.details}), e.status
+
+
+@ingest_bp.post("/capture/uploads")
+def capture_upload_create() -> Any:
+    """Open a resumable capture upload.
+
+    Body: ``{"pages": [{"size": <bytes>, "filename": "..."}], "tags": [...], "location": {...}}``.
+    Pages are then sent with PUT /capture/uploads/<id>/pages/<n>?offset=<bytes already sent>.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        state = capture_uploads.create_session(
+            body.get('pages'),
+            tags=body.get('tags'),
+            location=body.get('location'),
+            submitted_by=request.headers.get('X-User') or 'anonymous',
+        )
+    except capture_uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify(state), 201
+
+
+@ingest_bp.get("/capture/uploads/<upload_id>")
+def capture_upload_progress(upload_id: str) -> Any:
+    """Bytes received per page, so a client can resume where the connection dropped."""
+    try:
+        return jsonify(capture_uploads.progress(upload_id)), 200
+    except capture_uploads.UploadError as e:
+        return _upload_error(e)
+
+
+@ingest_bp.put("/capture/uploads/<upload_id>/pages/<int:page>")
+def capture_upload_chunk(upload_id: str, page: int) -> Any:
+    """Append the raw request body to a page at ``offset`` (query parameter, default 0)."""
+    try:
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"ok": False, "error": "invalid_offset"}), 400
+    try:
+        received = capture_uploads.write_chunk(upload_id, page, offset, request.stream)
+    except capture_uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify({"ok": True, "page": page, "received": received}), 200
+
+
+@ingest_bp.post("/capture/uploads/<upload_id>/finalize")
+def capture_upload_finalize(upload_id: str) -> Any:
+    """Create the receipt from a complete upload; answers like /capture/upload.
+
+    Retrying after a lost response returns the same result without enqueuing OCR again.
+    """
+    try:
+        result, created = capture_uploads.finalize(upload_id)
+    except capture_uploads.UploadError as e:
+        return _upload_error(e)
+    if created:
+        _enqueue_ocr(result["receipt_id"])
+    return jsonify(result), 200
+
+
+@ingest_bp.delete("/capture/uploads/<upload_id>")
+def capture_upload_abort(upload_id: str) -> Any:
+    try:
+        capture_uploads.abort(upload_id)
+    except capture_uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify({"ok": True}), 200
+
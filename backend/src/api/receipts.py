@@ -4,12 +4,17 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from typing import Any
 
+import base64
 import json
 import logging
 import os
+import threading
+import time
 from pathlib import Path
 from flask import Blueprint, jsonify, request, send_file
 
+from services.receipt_search import MATCH_SQL, highlight, parse_query, snippet
+
 try:
     from PIL import Image
 except Exception:
@@ -18,8 +23,11 @@ except Exception:
 try:
     # Optional DB dependency; endpoints should still respond if DB missing
     from services.db.connection import db_cursor
+    from services.db.files import set_line_item_count, set_line_item_counts
 except Exception:  # pragma: no cover - fallback for early scaffolding
     db_cursor = None  # type: ignore
+    set_line_item_count = None  # type: ignore
+    set_line_item_counts = None  # type: ignore
 
 
 logger = logging.getLogger(__name__)
@@ -92,6 +100,16 @@ def _count_line_items(rid: str) -> int:
     return 0
 
 
+def _write_line_items(rid: str, items: list[Any]) -> None:
+    """Write the line items file and keep unified_files.line_item_count in sync."""
+    _line_items_path(rid).write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
+    if set_line_item_count is not None:
+        try:
+            set_line_item_count(rid, len(items))
+        except Exception as e:
+            logger.warning(f"Failed to store line item count for {rid}: {e}")
+
+
 def _fetch_saved_accounting_entries(rid: str) -> list[dict[str, Any]]:
     entries: list[dict[str, Any]] = []
     if db_cursor is None:
@@ -147,6 +165,91 @@ def _save_accounting_entries(rid: str, entries: list[dict[str, Any]]) -> bool:
         return False
 
 
+def _encode_cursor(created_at: Any, rid: str) -> str:
+    """Opaque keyset cursor for the row after which the next page starts.
+
+    Rows without ``created_at`` sort last; their cursor carries the id alone.
+    """
+    if created_at is None:
+        ts = None
+    else:
+        ts = created_at.isoformat(sep=" ") if hasattr(created_at, "isoformat") else str(created_at)
+    raw = json.dumps([ts, rid], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime | None, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, rid = json.loads(raw.decode("utf-8"))
+        return (datetime.fromisoformat(ts) if ts is not None else None), str(rid)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from e
+
+
+def _seek_after(after: tuple[datetime | None, str]) -> tuple[str, list[Any]]:
+    """Predicate for the rows after ``after`` in ``created_at DESC, id DESC`` order.
+
+    MySQL sorts NULL ``created_at`` after every timestamp when descending, so a
+    timestamped cursor still has the NULL rows ahead of it.
+    """
+    created_at, rid = after
+    if created_at is None:
+        return "created_at IS NULL AND id < %s", [rid]
+    return (
+        "(created_at <= %s AND (created_at < %s OR id < %s) OR created_at IS NULL)",
+        [created_at, created_at, rid],
+    )
+
+
+# (where_sql, params) -> (expires_at, total); totals are shared by every page of a listing.
+_COUNT_CACHE: dict[tuple[str, tuple[Any, ...]], tuple[float, int]] = {}
+_COUNT_CACHE_LOCK = threading.Lock()
+_COUNT_CACHE_MAX = 256
+
+
+def _count_cache_ttl() -> float:
+    try:
+        return max(float(os.getenv("RECEIPTS_COUNT_CACHE_TTL", "30")), 0.0)
+    except ValueError:
+        return 30.0
+
+
+def _exact_count(where_sql: str, params: list[Any]) -> int:
+    with db_cursor() as cur:
+        cur.execute(f"SELECT COUNT(1) FROM unified_files {where_sql}", tuple(params))
+        (total,) = cur.fetchone() or (0,)
+    return int(total or 0)
+
+
+def _cached_count(where_sql: str, params: list[Any]) -> int:
+    key = (where_sql, tuple(params))
+    now = time.monotonic()
+    with _COUNT_CACHE_LOCK:
+        hit = _COUNT_CACHE.get(key)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+    total = _exact_count(where_sql, params)
+    ttl = _count_cache_ttl()
+    if ttl:
+        with _COUNT_CACHE_LOCK:
+            if len(_COUNT_CACHE) >= _COUNT_CACHE_MAX:
+                _COUNT_CACHE.clear()
+            _COUNT_CACHE[key] = (now + ttl, total)
+    return total
+
+
+def _estimated_count() -> int | None:
+    """InnoDB's row estimate for unified_files (no scan; can be off by a few percent)."""
+    with db_cursor() as cur:
+        cur.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'unified_files'"
+        )
+        row = cur.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
 @receipts_bp.get("/receipts")
 def list_receipts() -> Any:
     # Optional filters
@@ -156,22 +259,49 @@ def list_receipts() -> Any:
     q_tags = request.args.get("tags")
     q_from = request.args.get("from")
     q_to = request.args.get("to")
-
-    # Simple pagination
-    try:
-        page = max(int(request.args.get("page", 1)), 1)
-    except Exception:
-        page = 1
+    q_search = (request.args.get("q") or "").strip()
+    search = parse_query(q_search) if q_search else None
+    if search is not None and not search.terms:
+        # Only words too short for the FULLTEXT index: fall back to a merchant match.
+        q_merchant = q_merchant or q_search
+        search = None
+
+    # Pagination: ?cursor= (keyset on created_at, id; empty for the first page) or
+    # the older ?page= (OFFSET). Both return next_cursor so clients can switch.
+    # Search results are ranked by relevance, so they page with ?page= only.
     try:
         page_size = int(request.args.get("page_size", 50))
     except Exception:
         page_size = 50
     page_size = max(1, min(page_size, 100))
-    offset = (page - 1) * page_size
+    cursor_mode = "cursor" in request.args
+    if cursor_mode and search is not None:
+        return jsonify({"error": "cursor_not_supported_with_q"}), 400
+    after: tuple[datetime | None, str] | None = None
+    if cursor_mode:
+        page = None
+        offset = 0
+        if request.args.get("cursor"):
+            try:
+                after = _decode_cursor(request.args["cursor"])
+            except ValueError:
+                return jsonify({"error": "invalid_cursor"}), 400
+    else:
+        try:
+            page = max(int(request.args.get("page", 1)), 1)
+        except Exception:
+            page = 1
+        offset = (page - 1) * page_size
+
+    # Total: exact (page mode default), cached (cursor mode default), approx or none.
+    total_mode = (request.args.get("total") or ("cached" if cursor_mode or search else "exact")).lower()
+    if total_mode not in {"exact", "cached", "approx", "none"}:
+        total_mode = "exact"
 
     items: list[dict[str, Any]] = []
-    total = 0
-    meta = {"page": page, "page_size": page_size}
+    total: int | None = 0
+    next_cursor: str | None = None
+    meta: dict[str, Any] = {"page": page, "page_size": page_size}
 
     if db_cursor is not None:
         try:
@@ -203,87 +333,133 @@ def list_receipts() -> Any:
                         )
                     )
                     params.extend(tag_list)
-
-            where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+            if search is not None:
+                where.append(MATCH_SQL)
+                params.append(search.boolean)
 
             where_sql = ("WHERE " + " AND ".join(where)) if where else ""
 
             # Count
-            with db_cursor() as cur:
-                cur.execute(
-                    f"SELECT COUNT(1) FROM unified_files {where_sql}",
-                    tuple(params),
-                )
-                (total,) = cur.fetchone() or (0,)
-
-            # Page
+            if total_mode == "none":
+                total = None
+            elif total_mode == "approx" and not where:
+                total = _estimated_count()
+            elif total_mode == "exact":
+                total = _exact_count(where_sql, params)
+            else:
+                total = _cached_count(where_sql, params)
+
+            # Page: pick ids from unified_files alone so (created_at, id) index order
+            # (or the FULLTEXT rank) drives the scan, then join tags/locations for just
+            # those rows. One extra row tells us whether there is a next page.
+            page_where = list(where)
+            page_params = [search.boolean] if search is not None else []
+            page_params.extend(params)
+            if after is not None:
+                seek_sql, seek_params = _seek_after(after)
+                page_where.append(seek_sql)
+                page_params.extend(seek_params)
+            page_where_sql = ("WHERE " + " AND ".join(page_where)) if page_where else ""
+            page_params.extend([page_size + 1, offset])
             with db_cursor() as cur:
                 cur.execute(
                     (
                         "SELECT u.id, u.original_filename, u.merchant_name, u.purchase_datetime, u.net_amount, u.gross_amount, u.ai_status, u.submitted_by, "
-                        "u.file_creation_timestamp, fl.lat, fl.lon, fl.acc, "
-                        "COALESCE(GROUP_CONCAT(t.tag), '') as tags "
-                        "FROM unified_files u "
+                        "u.file_creation_timestamp, u.line_item_count, fl.lat, fl.lon, fl.acc, "
+                        "COALESCE(GROUP_CONCAT(t.tag), '') as tags, u.created_at, p.score, "
+                        + ("u.ocr_raw " if search is not None else "NULL AS ocr_raw ")
+                        + "FROM (SELECT id, "
+                        + (MATCH_SQL if search is not None else "0")
+                        + " AS score FROM unified_files "
+                        + page_where_sql
+                        + (" ORDER BY score DESC," if search is not None else " ORDER BY")
+                        + " created_at DESC, id DESC LIMIT %s OFFSET %s) p "
+                        "JOIN unified_files u ON u.id=p.id "
                         "LEFT JOIN file_tags t ON t.file_id=u.id "
                         "LEFT JOIN file_locations fl ON fl.file_id=u.id "
-                        + where_sql
-                        + " GROUP BY u.id, u.file_creation_timestamp, fl.lat, fl.lon, fl.acc ORDER BY u.created_at DESC LIMIT %s OFFSET %s"
+                        "GROUP BY u.id, u.created_at, u.file_creation_timestamp, u.line_item_count, p.score, fl.lat, fl.lon, fl.acc "
+                        "ORDER BY p.score DESC, u.created_at DESC, u.id DESC"
                     ),
-                    tuple(params + [page_size, offset]),
+                    tuple(page_params),
                 )
-                for rid, fname, merchant, pdt, net, gross, status, submitted_by, file_creation_ts, lat, lon, acc, tag_csv in cur.fetchall():
-                    purchase_iso = pdt.isoformat() if hasattr(pdt, "isoformat") else pdt
-                    purchase_date = None
-                    if hasattr(pdt, "date"):
-                        try:
-                            purchase_date = pdt.date().isoformat()
-                        except Exception:
-                            purchase_date = None
-                    elif isinstance(pdt, str) and pdt:
-                        purchase_date = pdt.split("T")[0]
-
-                    # Format file creation timestamp
-                    file_creation_iso = None
-                    if file_creation_ts:
-                        if hasattr(file_creation_ts, "isoformat"):
-                            file_creation_iso = file_creation_ts.isoformat()
-                        elif isinstance(file_creation_ts, str):
-                            file_creation_iso = file_creation_ts
-
-                    # Build location object if coordinates exist
-                    location = None
-                    if lat is not None and lon is not None:
-                        location = {
-                            "lat": float(lat),
-                            "lon": float(lon),
-                            "accuracy": float(acc) if acc is not None else None
-                        }
-
-                    net_value = float(net) if net is not None else None
-                    gross_value = float(gross) if gross is not None else None
-                    line_items = _count_line_items(rid)
-                    items.append(
-                        {
-                            "id": rid,
-                            "original_filename": fname,
-                            "merchant": merchant,
-                            "purchase_datetime": purchase_iso,
-                            "purchase_date": purchase_date,
-                            "file_creation_timestamp": file_creation_iso,
-                            "location": location,
-                            "net_amount": net_value,
-                            "gross_amount": gross_value,
-                            "status": status,
-                            "submitted_by": submitted_by,
-                            "line_item_count": line_items,
-                            "tags": [t for t in (tag_csv or "").split(",") if t],
-                        }
-                    )
+                rows = cur.fetchall()
+            if len(rows) > page_size:
+                rows = rows[:page_size]
+                if search is None:
+                    next_cursor = _encode_cursor(rows[-1][14], rows[-1][0])
+            uncounted: list[tuple[str, int]] = []
+            for rid, fname, merchant, pdt, net, gross, status, submitted_by, file_creation_ts, line_item_count, lat, lon, acc, tag_csv, _created_at, score, ocr_raw in rows:
+                purchase_iso = pdt.isoformat() if hasattr(pdt, "isoformat") else pdt
+                purchase_date = None
+                if hasattr(pdt, "date"):
+                    try:
+                        purchase_date = pdt.date().isoformat()
+                    except Exception:
+                        purchase_date = None
+                elif isinstance(pdt, str) and pdt:
+                    purchase_date = pdt.split("T")[0]
+
+                # Format file creation timestamp
+                file_creation_iso = None
+                if file_creation_ts:
+                    if hasattr(file_creation_ts, "isoformat"):
+                        file_creation_iso = file_creation_ts.isoformat()
+                    elif isinstance(file_creation_ts, str):
+                        file_creation_iso = file_creation_ts
+
+                # Build location object if coordinates exist
+                location = None
+                if lat is not None and lon is not None:
+                    location = {
+                        "lat": float(lat),
+                        "lon": float(lon),
+                        "accuracy": float(acc) if acc is not None else None
+                    }
+
+                net_value = float(net) if net is not None else None
+                gross_value = float(gross) if gross is not None else None
+                if line_item_count is None:
+                    # Rows written before line_item_count existed: count once, then persist.
+                    line_item_count = _count_line_items(rid)
+                    uncounted.append((rid, line_item_count))
+                items.append(
+                    {
+                        "id": rid,
+                        "original_filename": fname,
+                        "merchant": merchant,
+                        "purchase_datetime": purchase_iso,
+                        "purchase_date": purchase_date,
+                        "file_creation_timestamp": file_creation_iso,
+                        "location": location,
+                        "net_amount": net_value,
+                        "gross_amount": gross_value,
+                        "status": status,
+                        "submitted_by": submitted_by,
+                        "line_item_count": int(line_item_count),
+                        "tags": [t for t in (tag_csv or "").split(",") if t],
+                    }
+                )
+                if search is not None:
+                    text = snippet(ocr_raw, search)
+                    items[-1]["search"] = {
+                        "score": float(score or 0),
+                        "merchant_highlights": highlight(merchant, search),
+                        "snippet": text,
+                        "snippet_highlights": highlight(text, search),
+                    }
+            if uncounted and set_line_item_counts is not None:
+                try:
+                    set_line_item_counts(uncounted)
+                except Exception as e:
+                    logger.warning(f"Failed to backfill line item counts: {e}")
         except Exception as e:
             # Fallback to empty but still 200
             items = []
             total = 0
-    meta["total"] = int(total)
+            next_cursor = None
+    meta["total"] = int(total) if total is not None else None
+    meta["total_mode"] = total_mode
+    meta["next_cursor"] = next_cursor
     meta["items"] = len(items)
     return jsonify({"items": items, "meta": meta}), 200
 
@@ -382,7 +558,7 @@ def update_receipt(rid: str) -> Any:
     # Accept line_items in payload to persist to file store
     if "line_items" in payload and isinstance(payload["line_items"], list):
         try:
-            _line_items_path(rid).write_text(json.dumps(payload["line_items"], ensure_ascii=False, indent=2), encoding="utf-8")
+            _write_line_items(rid, payload["line_items"])
         except Exception:
             pass
     return jsonify({"id": rid, "updated": updated, "data": payload}), 200
@@ -433,7 +609,7 @@ def put_line_items(rid: str) -> Any:
     if not isinstance(items, list):
         return jsonify({"error": "invalid"}), 400
     try:
-        _line_items_path(rid).write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
+        _write_line_items(rid, items)
         return jsonify({"id": rid, "count": len(items)}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
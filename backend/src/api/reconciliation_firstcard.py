@@ -3,8 +3,6 @@ from __future__ import annotations
 from typing import Any, Dict, List, Optional
 import uuid
 import base64
-import io
-import re
 
 from flask import Blueprint, jsonify, request
 try:
@@ -15,8 +13,20 @@ except Exception:  # pragma: no cover
 
 try:
     from services.db.connection import db_cursor
+    from services.card_matching import match_statement
 except Exception:  # pragma: no cover
     db_cursor = None  # type: ignore
+    match_statement = None  # type: ignore
+
+try:
+    from services.statement_import import create_pending, import_pdf, import_statement, save_pdf
+except Exception:  # pragma: no cover
+    import_statement = None  # type: ignore
+
+try:
+    from services.tasks import process_statement_pdf  # type: ignore
+except Exception:  # pragma: no cover - allow running without Celery in tests/dev
+    process_statement_pdf = None  # type: ignore
 
 
 recon_bp = Blueprint("reconciliation_firstcard", __name__)
@@ -33,43 +43,6 @@ def _decode_pdf_payload(payload: dict[str, Any]) -> Optional[bytes]:
     return None
 
 
-def _parse_pdf_statement(pdf_bytes: bytes) -> dict[str, Any]:
-    text = ''
-    try:
-        from pdfminer.high_level import extract_text
-        text = extract_text(io.BytesIO(pdf_bytes)) or ''
-    except Exception:
-        try:
-            text = pdf_bytes.decode('utf-8', errors='ignore')
-        except Exception:
-            text = ''
-    lines: list[dict[str, Any]] = []
-    period_start: Optional[str] = None
-    period_end: Optional[str] = None
-    pattern = re.compile(r'(20\d{2}-\d{2}-\d{2})\s+(.+?)\s+(-?\d+[\.,]\d{2})')
-    for match in pattern.finditer(text):
-        tx_date, merchant, amount = match.groups()
-        amount_val = float(amount.replace(',', '.'))
-        lines.append(
-            {
-                "transaction_date": tx_date,
-                "merchant_name": merchant.strip(),
-                "amount": amount_val,
-                "description": merchant.strip(),
-            }
-        )
-    period_match = re.search(r'Period\s*:?\s*(20\d{2}-\d{2}-\d{2})\s*(?:to|-)\s*(20\d{2}-\d{2}-\d{2})', text, re.IGNORECASE)
-    if period_match:
-        period_start, period_end = period_match.groups()
-    return {
-        "period_start": period_start,
-        "period_end": period_end,
-        "lines": lines,
-        "raw_text": text,
-    }
-
-
-
 @recon_bp.post("/reconciliation/firstcard/import")
 def firstcard_import() -> Any:
     """Import a company card statement into invoice_documents/invoice_lines.
@@ -82,6 +55,12 @@ def firstcard_import() -> Any:
         ]
       }
     Returns: { id: <document_id>, lines: <count> }
+
+    Lines are inserted in batches in one transaction. A statement sent as
+    ``pdf_base64`` instead of lines is stored and parsed page by page by the
+    ``process_statement_pdf`` task: the response is 202 with ``status: "queued"``
+    and ``invoice_documents.status`` moves queued -> parsing -> imported (or failed).
+    Without a task queue the PDF is parsed in the request as before.
     """
     payload = request.get_json(silent=True) or {}
     doc_id = payload.get("document_id") or str(uuid.uuid4())
@@ -89,107 +68,54 @@ def firstcard_import() -> Any:
     period_end = payload.get("period_end")
     lines = payload.get("lines") or []
     pdf_bytes = _decode_pdf_payload(payload)
-    if not lines and pdf_bytes:
-        parsed = _parse_pdf_statement(pdf_bytes)
-        lines = parsed.get("lines") or []
-        period_start = period_start or parsed.get("period_start")
-        period_end = period_end or parsed.get("period_end")
     inserted = 0
-    if db_cursor is not None:
+    if db_cursor is None or import_statement is None:
+        return jsonify({"status": "ok", "id": doc_id, "lines": inserted}), 200
+
+    if not lines and pdf_bytes:
         try:
-            with db_cursor() as cur:
-                # Create invoice document (company card)
-                cur.execute(
-                    (
-                        "INSERT INTO invoice_documents (id, invoice_type, period_start, period_end, status) "
-                        "VALUES (%s, %s, %s, %s, 'imported')"
-                    ),
-                    (doc_id, "company_card", period_start, period_end),
-                )
-                # Insert lines if provided
-                if isinstance(lines, list) and lines:
-                    for ln in lines:
-                        cur.execute(
-                            (
-                                "INSERT INTO invoice_lines (invoice_id, transaction_date, amount, merchant_name, description) "
-                                "VALUES (%s, %s, %s, %s, %s)"
-                            ),
-                            (
-                                doc_id,
-                                ln.get("transaction_date"),
-                                ln.get("amount"),
-                                (ln.get("merchant_name") or ln.get("merchant") or None),
-                                ln.get("description"),
-                            ),
-                        )
-                        inserted += 1
+            save_pdf(doc_id, pdf_bytes)
+            create_pending(doc_id, period_start, period_end)
         except Exception:
-            pass
+            return jsonify({"status": "ok", "id": doc_id, "lines": inserted}), 200
+        try:
+            if process_statement_pdf is None:
+                raise RuntimeError("tasks_unavailable")
+            process_statement_pdf.delay(doc_id)  # type: ignore[attr-defined]
+            return jsonify({"status": "queued", "id": doc_id, "lines": inserted}), 202
+        except Exception:
+            result = import_pdf(doc_id)
+            return jsonify({"status": "ok", "id": doc_id, "lines": int(result.get("lines") or 0)}), 200
+
+    try:
+        inserted = import_statement(doc_id, period_start, period_end, lines if isinstance(lines, list) else [])
+    except Exception:
+        pass
     return jsonify({"status": "ok", "id": doc_id, "lines": inserted}), 200
 
 
 @recon_bp.post("/reconciliation/firstcard/match")
 def firstcard_match() -> Any:
-    """Naive matching of invoice_lines to receipts in unified_files.
+    """Match open invoice_lines of a statement to receipts in unified_files.
 
     Input JSON: { "document_id": "..." }
-    Strategy: for each line without a match, find a unified_files row where
-      DATE(purchase_datetime) == transaction_date and |gross_amount - amount| < 0.01
-    Updates invoice_lines.matched_file_id/match_score/match_status and inserts invoice_line_history.
+    Strategy (services.card_matching): load the statement's unmatched lines and every
+    unmatched receipt in its date window (plus CARD_MATCH_DATE_TOLERANCE_DAYS) once,
+    score pairs on amount, posting delay and merchant-name similarity, assign them
+    globally so each receipt backs at most one line, then write invoice_lines updates
+    (match_score = pair score) and invoice_line_history rows in batches.
     """
     payload = request.get_json(silent=True) or {}
     document_id = payload.get("document_id") or payload.get("doc_id") or payload.get("file_id")
     matched = 0
-    if not document_id or db_cursor is None:
+    if not document_id or db_cursor is None or match_statement is None:
         return jsonify({"matched": matched}), 200
 
     try:
-        with db_cursor() as cur:
-            # Fetch candidate lines
-            cur.execute(
-                (
-                    "SELECT id, transaction_date, amount FROM invoice_lines "
-                    "WHERE invoice_id=%s AND matched_file_id IS NULL"
-                ),
-                (document_id,),
-            )
-            lines = cur.fetchall() or []
-
-        for line_id, tx_date, amount in lines:
-            file_id = None
-            try:
-                with db_cursor() as cur:
-                    cur.execute(
-                        (
-                            "SELECT id FROM unified_files "
-                            "WHERE purchase_datetime IS NOT NULL "
-                            "AND DATE(purchase_datetime)=%s "
-                            "AND gross_amount IS NOT NULL "
-                            "AND ABS(gross_amount - %s) < 0.01 "
-                            "ORDER BY created_at DESC LIMIT 1"
-                        ),
-                        (tx_date, amount),
-                    )
-                    row = cur.fetchone()
-                    if row:
-                        (file_id,) = row
-                        cur.execute(
-                            (
-                                "UPDATE invoice_lines SET matched_file_id=%s, match_score=%s, match_status='auto' WHERE id=%s"
-                            ),
-                            (file_id, 0.8, line_id),
-                        )
-                        cur.execute(
-                            (
-                                "INSERT INTO invoice_line_history (invoice_line_id, action, performed_by, old_matched_file_id, new_matched_file_id, reason) "
-                                "VALUES (%s, 'matched', 'system', NULL, %s, 'auto-match')"
-                            ),
-                            (line_id, file_id),
-                        )
-                        matched += 1
-                        record_invoice_decision("matched")
-            except Exception:
-                continue
+        matches = match_statement(document_id)
+        matched = len(matches)
+        for _ in matches:
+            record_invoice_decision("matched")
 
         # If any matched, bump document status
         if matched > 0:
@@ -4,7 +4,7 @@ import time
 from functools import wraps
 from typing import Callable
 
-from prometheus_client import Counter, Summary, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Summary, generate_latest, CONTENT_TYPE_LATEST
 from flask import Response, request
 
 REQUEST_COUNT = Counter(
@@ -36,6 +36,26 @@ INVOICE_MATCH_COUNT = Counter(
     ["decision"],  # matched|rejected|confirmed|unmatched
 )
 
+# Database connection pool metrics (per process)
+DB_POOL_CONNECTIONS = Gauge(
+    "mind_db_pool_connections",
+    "Pooled MySQL connections by state",
+    ["state"],  # checked_out|idle
+)
+DB_POOL_WAIT = Summary(
+    "mind_db_pool_wait_seconds",
+    "Time spent waiting to check out a pooled MySQL connection",
+)
+OCR_CACHE_REQUESTS = Counter(
+    "mind_ocr_cache_requests_total",
+    "OCR page cache lookups",
+    ["result"],  # hit|miss
+)
+OCR_CACHE_EVICTIONS = Counter(
+    "mind_ocr_cache_evictions_total",
+    "OCR page cache entries evicted to stay within OCR_CACHE_MAX_MB",
+)
+
 
 def metrics_endpoint() -> Response:
     return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
@@ -21,6 +21,7 @@ from ..models.ai_processing import (
     Company,
     AccountingProposal
 )
+from .card_matching import merchant_similarity
 
 logger = logging.getLogger(__name__)
 
@@ -300,42 +301,34 @@ class AIService:
         try:
             logger.info(f"Matching credit card for document {request.file_id}")
 
-            # TODO: Implement actual AI matching logic
-            # This would use fuzzy matching on merchant names and amounts
-
             matched = False
             matched_id = None
             confidence = 0.0
             match_details = {}
 
-            if potential_matches:
-                # Simple matching: take first match with same date and amount
-                for match in potential_matches:
-                    transaction_id, merchant_name, amount = match
-
-                    # Check if merchant names are similar
-                    if request.merchant_name:
-                        # TODO: Implement fuzzy string matching
-                        name_similarity = 0.8  # Placeholder
-                    else:
-                        name_similarity = 0.5
-
-                    # Amount matches exactly (already filtered in query)
-                    amount_match = 1.0
-
-                    # Calculate overall confidence
-                    match_confidence = (name_similarity + amount_match) / 2
-
-                    if match_confidence > 0.7:
-                        matched = True
-                        matched_id = transaction_id
-                        confidence = match_confidence
-                        match_details = {
-                            "merchant_name_match": name_similarity,
-                            "amount_match": amount_match,
-                            "transaction_id": transaction_id
-                        }
-                        break
+            # Candidates are already filtered on date and amount; pick the one whose
+            # merchant name is most similar rather than the first row returned.
+            for match in potential_matches or []:
+                transaction_id, merchant_name, amount = match
+
+                similarity = merchant_similarity(request.merchant_name, merchant_name)
+                name_similarity = 0.5 if similarity is None else similarity
+
+                # Amount matches exactly (already filtered in query)
+                amount_match = 1.0
+
+                # Calculate overall confidence
+                match_confidence = (name_similarity + amount_match) / 2
+
+                if match_confidence > 0.7 and match_confidence > confidence:
+                    matched = True
+                    matched_id = transaction_id
+                    confidence = match_confidence
+                    match_details = {
+                        "merchant_name_match": round(name_similarity, 3),
+                        "amount_match": amount_match,
+                        "transaction_id": transaction_id
+                    }
 
             return CreditCardMatchResponse(
                 file_id=request.file_id,
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from services.dedup import HashingWriter, combine, existing_for, split_duplicates
+from services.storage import FileStorage, fsync_dir
+
+try:
+    from services.db.connection import db_cursor, db_transaction
+except Exception:  # pragma: no cover - allow running without DB
+    db_cursor = None  # type: ignore
+    db_transaction = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Bytes kept from the start of each page to recognise its format.
+SNIFF_BYTES = 32
+
+# file_tags.tag is VARCHAR(64)
+TAG_MAX_LENGTH = 64
+
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"heim", b"heis", b"mif1"}
+
+
+class CaptureRecordError(Exception):
+    """The upload's rows could not be written; nothing was recorded for it."""
+
+
+def sniff(header: bytes) -> Optional[Tuple[str, str]]:
+    """``(extension, mime type)`` from a file's first bytes, or None if unrecognised."""
+    if header.startswith(b"\xff\xd8\xff"):
+        return ".jpg", "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png", "image/png"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif", "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp", "image/webp"
+    if header[4:8] == b"ftyp" and header[8:12] in _HEIF_BRANDS:
+        return ".heic", "image/heic"
+    if header.startswith(b"%PDF-"):
+        return ".pdf", "application/pdf"
+    return None
+
+
+class PageWriter:
+    """Disk-backed target for one uploaded page.
+
+    Bytes go straight to ``<receipt dir>/<name>.part`` as they arrive, hashed and with
+    the header kept for :func:`sniff`, so a page is never held in memory. It is
+    file-like enough to serve as a werkzeug ``stream_factory`` result.
+    """
+
+    def __init__(self, fs: FileStorage, receipt_id: str, index: int) -> None:
+        self.receipt_id = receipt_id
+        self.index = index
+        self.path = fs.path(receipt_id, f"page-{index}.part")
+        self._fh = self.path.open("w+b")
+        self._hash = HashingWriter(self._fh)
+        self._header = b""
+
+    def write(self, data: bytes) -> int:
+        if len(self._header) < SNIFF_BYTES:
+            self._header += data[:SNIFF_BYTES - len(self._header)]
+        return self._hash.write(data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._fh.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._fh.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._fh.read(size)
+
+    @property
+    def size(self) -> int:
+        return self._hash.size
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def kind(self) -> Optional[Tuple[str, str]]:
+        return sniff(self._header)
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self._fh.close()
+
+    def commit(self, filename: Optional[str] = None) -> str:
+        """fsync and atomically rename to ``page-<n><ext>``; returns the stored name.
+
+        The extension comes from the sniffed format, else from ``filename``, else ``.jpg``.
+        """
+        kind = self.kind
+        ext = kind[0] if kind else (os.path.splitext(filename or "")[1] or ".jpg")
+        target = self.path.with_name(f"page-{self.index}{ext}")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self.close()
+        os.replace(self.path, target)
+        fsync_dir(target.parent)
+        return target.name
+
+    def discard(self) -> None:
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def discard_receipt(fs: FileStorage, receipt_id: str, pages: Sequence[PageWriter] = ()) -> None:
+    """Drop a receipt's partial or duplicate files."""
+    for page in pages:
+        page.discard()
+    try:
+        fs.purge(receipt_id)
+    except Exception:
+        pass
+
+
+def _clean_tags(tags: Any) -> List[str]:
+    """Non-empty string tags, stripped, cut to the column width and without repeats."""
+    out: List[str] = []
+    for tag in tags if isinstance(tags, (list, tuple)) else ():
+        if not isinstance(tag, str):
+            continue
+        tag = tag.strip()[:TAG_MAX_LENGTH].strip()
+        if tag and tag not in out:
+            out.append(tag)
+    return out
+
+
+def _number(value: Any, limit: float) -> Optional[float]:
+    """``value`` as a finite float within ``±limit``, else None."""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number) or abs(number) > limit:
+        return None
+    return number
+
+
+def _clean_location(location: Any) -> Optional[Tuple[float, float, Optional[float]]]:
+    """``(lat, lon, acc)`` from a client location, or None when it is unusable."""
+    if not isinstance(location, dict):
+        return None
+    lat = _number(location.get('lat'), 90.0)
+    lon = _number(location.get('lon'), 180.0)
+    if lat is None or lon is None:
+        return None
+    acc = _number(location.get('acc'), math.inf)
+    if acc is not None and acc < 0:
+        acc = None
+    return lat, lon, acc
+
+
+def record_capture(
+    receipt_id: str,
+    page_hashes: Sequence[str],
+    submitted_by: str,
+    original_filename: Optional[str],
+    mime_type: Optional[str] = None,
+    tags: Sequence[Any] = (),
+    location: Optional[Dict[str, Any]] = None,
+) -> Optional[str]:
+    """Create the unified_files row with its tags and location in one transaction.
+
+    Returns the id of an already ingested receipt with the same content instead
+    (nothing is written then), or None when ``receipt_id`` was recorded. Tags and
+    location are cleaned first; a location that is not valid coordinates is dropped.
+    Raises :class:`CaptureRecordError` when the rows could not be written.
+    """
+    tag_rows = [(receipt_id, tag) for tag in _clean_tags(tags)]
+    coords = _clean_location(location)
+    if location and coords is None:
+        logger.warning(f"capture {receipt_id}: ignoring invalid location {location!r}")
+
+    content_hash = combine(page_hashes) if page_hashes else None
+    if content_hash is not None:
+        _fresh, dups = split_duplicates([(receipt_id, content_hash)])
+        if dups:
+            return dups[0][1]
+    if db_cursor is None:
+        return None
+
+    try:
+        with db_transaction():
+            with db_cursor() as cur:
+                cur.execute(
+                    (
+                        "INSERT INTO unified_files (id, file_type, created_at, submitted_by, original_filename, "
+                        "mime_type, content_hash) VALUES (%s, %s, NOW(), %s, %s, %s, %s)"
+                    ),
+                    (receipt_id, 'receipt', submitted_by, original_filename, mime_type, content_hash),
+                )
+                if tag_rows:
+                    cur.executemany(
+                        "INSERT INTO file_tags (file_id, tag, created_at) VALUES (%s, %s, NOW())",
+                        tag_rows,
+                    )
+                if coords is not None:
+                    cur.execute(
+                        "INSERT INTO file_locations (file_id, lat, lon, acc) VALUES (%s, %s, %s, %s)",
+                        (receipt_id, *coords),
+                    )
+    except Exception as e:
+        # A concurrent upload of the same bytes won the unique index
+        existing = existing_for(e, content_hash)
+        if existing:
+            return existing
+        logger.error(f"capture {receipt_id}: could not record upload: {e}")
+        raise CaptureRecordError(str(e)) from e
+    return None
+
+
+def commit_pages(pages: Sequence[Tuple[PageWriter, Optional[str]]]) -> Tuple[List[str], List[str], Optional[str]]:
+    """Commit ``(page, client filename)`` pairs; returns stored names, page hashes and the first page's mime type."""
+    saved: List[str] = []
+    hashes: List[str] = []
+    mime_type: Optional[str] = None
+    for page, filename in pages:
+        try:
+            name = page.commit(filename)
+        except Exception as e:
+            logger.error(f"capture {page.receipt_id}: could not store page {page.index}: {e}")
+            page.discard()
+            continue
+        kind = page.kind
+        if mime_type is None and kind is not None:
+            mime_type = kind[1]
+        saved.append(name)
+        hashes.append(page.hexdigest())
+    return saved, hashes, mime_type
+
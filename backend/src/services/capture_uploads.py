@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from services.capture import SNIFF_BYTES, CaptureRecordError, discard_receipt, record_capture, sniff
+from services.dedup import CHUNK_SIZE
+from services.storage import FileStorage, fsync_dir
+
+try:
+    import fcntl
+except Exception:  # pragma: no cover - non-POSIX platforms
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGES = 20
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """A request the upload session cannot accept; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, error: str, status: int = 400, **details: Any) -> None:
+        super().__init__(error)
+        self.error = error
+        self.status = status
+        self.details = details
+
+
+def uploads_dir() -> Path:
+    """Resumable capture sessions, shared by every API worker."""
+    return Path(os.getenv("STORAGE_DIR", "/data/storage")) / "uploads"
+
+
+def _ttl_seconds() -> float:
+    try:
+        return float(os.getenv("CAPTURE_UPLOAD_TTL_HOURS", "24")) * 3600
+    except ValueError:
+        return 24 * 3600.0
+
+
+def _max_page_bytes() -> int:
+    try:
+        return int(float(os.getenv("CAPTURE_UPLOAD_MAX_PAGE_MB", "25")) * 1024 * 1024)
+    except ValueError:
+        return 25 * 1024 * 1024
+
+
+def _session_dir(upload_id: str) -> Path:
+    if not _ID_RE.match(upload_id or ""):
+        raise UploadError("not_found", 404)
+    return uploads_dir() / upload_id
+
+
+def _part(root: Path, index: int) -> Path:
+    return root / f"page-{index}.part"
+
+
+@contextmanager
+def _locked(root: Path) -> Iterator[Dict[str, Any]]:
+    """Hold the session's lock and yield its metadata; changes are saved on exit."""
+    meta_path = root / "session.json"
+    if not meta_path.exists():
+        raise UploadError("not_found", 404)
+    with (root / ".lock").open("a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            meta = json.loads(meta_path.read_text())
+        except FileNotFoundError:
+            raise UploadError("not_found", 404)
+        before = json.dumps(meta, sort_keys=True)
+        yield meta
+        if json.dumps(meta, sort_keys=True) != before:
+            tmp = meta_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(meta))
+            os.replace(tmp, meta_path)
+        else:
+            # Activity keeps a session alive for prune_sessions
+            os.utime(meta_path)
+
+
+def prune_sessions(max_age_seconds: Optional[float] = None) -> int:
+    """Remove sessions untouched for CAPTURE_UPLOAD_TTL_HOURS; returns how many were removed.
+
+    Runs when a session is opened and from the periodic ``prune_capture_uploads``
+    task. A session whose lock is held by a request is skipped.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = _ttl_seconds()
+    if max_age_seconds <= 0:
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    try:
+        entries = list(uploads_dir().iterdir())
+    except FileNotFoundError:
+        return 0
+    for root in entries:
+        try:
+            if _session_stamp(root) >= cutoff:
+                continue
+            with (root / ".lock").open("a") as lock:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        # A request holds the session right now, so it is not idle
+                        continue
+                # Touched while we waited for the lock: still alive
+                if _session_stamp(root) >= cutoff:
+                    continue
+                shutil.rmtree(root)
+                removed += 1
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.warning(f"capture upload {root.name}: could not prune: {e}")
+    return removed
+
+
+def _session_stamp(root: Path) -> float:
+    meta_path = root / "session.json"
+    return meta_path.stat().st_mtime if meta_path.exists() else root.stat().st_mtime
+
+
+def _progress(root: Path, meta: Dict[str, Any]) -> Dict[str, Any]:
+    pages = []
+    for index, page in enumerate(meta["pages"], start=1):
+        part = _part(root, index)
+        received = part.stat().st_size if part.exists() else 0
+        pages.append({"index": index, "size": page["size"], "received": received})
+    out: Dict[str, Any] = {
+        "upload_id": meta["id"],
+        "status": meta["status"],
+        "pages": pages,
+        "complete": all(p["received"] == p["size"] for p in pages),
+    }
+    if meta.get("result"):
+        out["result"] = meta["result"]
+    return out
+
+
+def create_session(
+    pages: Any,
+    tags: Any = None,
+    location: Any = None,
+    submitted_by: str = "anonymous",
+) -> Dict[str, Any]:
+    """Open a session for ``pages`` (``[{"size": bytes, "filename": ...}]``); returns its progress."""
+    if not isinstance(pages, list) or not pages:
+        raise UploadError("no_images")
+    if len(pages) > MAX_PAGES:
+        raise UploadError("too_many_pages", 413, max_pages=MAX_PAGES)
+    limit = _max_page_bytes()
+    declared: List[Dict[str, Any]] = []
+    for page in pages:
+        try:
+            size = int(page.get("size"))
+        except Exception:
+            raise UploadError("invalid_page_size")
+        if size <= 0:
+            raise UploadError("invalid_page_size")
+        if size > limit:
+            raise UploadError("page_too_large", 413, max_bytes=limit)
+        filename = page.get("filename")
+        declared.append({"size": size, "filename": filename if isinstance(filename, str) else None})
+
+    prune_sessions()
+    upload_id = uuid.uuid4().hex
+    root = uploads_dir() / upload_id
+    root.mkdir(parents=True)
+    meta = {
+        "id": upload_id,
+        "created_at": time.time(),
+        "status": "open",
+        "pages": declared,
+        "tags": tags if isinstance(tags, list) else [],
+        "location": location if isinstance(location, dict) else None,
+        "submitted_by": submitted_by,
+    }
+    (root / "session.json").write_text(json.dumps(meta))
+    return _progress(root, meta)
+
+
+def progress(upload_id: str) -> Dict[str, Any]:
+    root = _session_dir(upload_id)
+    with _locked(root) as meta:
+        return _progress(root, meta)
+
+
+def write_chunk(upload_id: str, index: int, offset: int, stream: BinaryIO) -> int:
+    """Append the request body to page ``index`` at ``offset``; returns the bytes received so far.
+
+    ``offset`` must equal what the server already has (see :func:`progress`), so a
+    resent chunk never duplicates data; a mismatch answers 409 with the real offset.
+    """
+    root = _session_dir(upload_id)
+    with _locked(root) as meta:
+        if meta["status"] != "open":
+            raise UploadError("already_finalized", 409)
+        if not 1 <= index <= len(meta["pages"]):
+            raise UploadError("no_such_page", 404)
+        size = meta["pages"][index - 1]["size"]
+        part = _part(root, index)
+        received = part.stat().st_size if part.exists() else 0
+        if offset != received:
+            raise UploadError("offset_mismatch", 409, received=received)
+        with part.open("ab") as fh:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if received + len(chunk) > size:
+                    fh.truncate(offset)
+                    raise UploadError("exceeds_page_size", 413, size=size)
+                fh.write(chunk)
+                received += len(chunk)
+            fh.flush()
+            os.fsync(fh.fileno())
+        return received
+
+
+def _adopt_page(fs: FileStorage, receipt_id: str, index: int, part: Path, filename: Optional[str]) -> Tuple[Path, str, Optional[str]]:
+    """Hash and sniff a completed page, then rename it into the receipt's directory."""
+    sha = hashlib.sha256()
+    with part.open("rb") as fh:
+        header = fh.read(SNIFF_BYTES)
+        sha.update(header)
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    kind = sniff(header)
+    ext = kind[0] if kind else (os.path.splitext(filename or "")[1] or ".jpg")
+    target = fs.path(receipt_id, f"page-{index}{ext}")
+    os.replace(part, target)
+    return target, sha.hexdigest(), kind[1] if kind else None
+
+
+def _restore_pages(fs: FileStorage, receipt_id: str, adopted: List[Tuple[Path, Path]]) -> None:
+    """Put adopted pages back as parts so the session can be finalised again."""
+    for target, part in adopted:
+        os.replace(target, part)
+    discard_receipt(fs, receipt_id)
+
+
+def finalize(upload_id: str) -> Tuple[Dict[str, Any], bool]:
+    """Turn a complete session into a receipt, as /capture/upload would.
+
+    Returns ``(result, created)``; ``created`` is False for a duplicate or when the
+    session was already finalised (the stored result is returned again, so a client
+    that lost the response can safely retry). If the receipt cannot be recorded the
+    session stays open with its pages and a 500 :class:`UploadError` is raised.
+    """
+    root = _session_dir(upload_id)
+    with _locked(root) as meta:
+        if meta["status"] == "finalized":
+            return meta["result"], False
+        state = _progress(root, meta)
+        if not state["complete"]:
+            raise UploadError("incomplete", 409, pages=state["pages"])
+
+        fs = FileStorage(os.getenv("STORAGE_DIR", "/data/storage"))
+        receipt_id = str(uuid.uuid4())
+        adopted: List[Tuple[Path, Path]] = []
+        hashes: List[str] = []
+        mime_type: Optional[str] = None
+        try:
+            for index, page in enumerate(meta["pages"], start=1):
+                part = _part(root, index)
+                target, content_hash, page_mime = _adopt_page(fs, receipt_id, index, part, page["filename"])
+                adopted.append((target, part))
+                hashes.append(content_hash)
+                mime_type = mime_type or page_mime
+            fsync_dir(adopted[0][0].parent)
+        except Exception:
+            _restore_pages(fs, receipt_id, adopted)
+            raise
+        saved = [target.name for target, _ in adopted]
+
+        pages = meta["pages"]
+        try:
+            existing = record_capture(
+                receipt_id,
+                hashes,
+                meta.get("submitted_by") or "anonymous",
+                pages[0]["filename"],
+                mime_type=mime_type,
+                tags=meta.get("tags") or [],
+                location=meta.get("location"),
+            )
+        except CaptureRecordError:
+            _restore_pages(fs, receipt_id, adopted)
+            raise UploadError("record_failed", 500)
+        if existing is not None:
+            discard_receipt(fs, receipt_id)
+            result: Dict[str, Any] = {"ok": True, "receipt_id": existing, "duplicate": True, "saved": []}
+        else:
+            result = {"ok": True, "receipt_id": receipt_id, "saved": saved}
+        meta["status"] = "finalized"
+        meta["result"] = result
+        return result, existing is None
+
+
+def abort(upload_id: str) -> None:
+    root = _session_dir(upload_id)
+    if not (root / "session.json").exists():
+        raise UploadError("not_found", 404)
+    shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from services.db.connection import db_cursor, db_transaction
+except Exception:  # pragma: no cover - allow running without DB
+    db_cursor = None  # type: ignore
+    db_transaction = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Lines updated per UPDATE ... CASE statement.
+UPDATE_BATCH = 500
+# Score weights; they sum to 1.
+AMOUNT_WEIGHT = 0.5
+DATE_WEIGHT = 0.25
+MERCHANT_WEIGHT = 0.25
+# Components larger than this (lines or receipts) are assigned greedily by score
+# instead of with the O(n^3) Hungarian method.
+MAX_ASSIGNMENT_SIZE = 300
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+# Legal forms and card-processor prefixes that say nothing about who the merchant is.
+_MERCHANT_NOISE = {
+    "ab", "aktiebolag", "publ", "hb", "kb", "as", "asa", "oy", "ltd", "inc", "gmbh", "llc", "sa",
+    "www", "com", "se", "sumup", "zettle", "izettle", "klarna", "paypal", "sq", "pos",
+}
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return max(float(os.getenv(name, str(default))), 0.0)
+    except ValueError:
+        return default
+
+
+def date_tolerance_days() -> int:
+    return int(_env_number("CARD_MATCH_DATE_TOLERANCE_DAYS", 3))
+
+
+def amount_tolerance_ore(amount_ore: int) -> int:
+    """Allowed difference for a line amount: the larger of a fixed öre margin and a share of the amount."""
+    fixed = _env_number("CARD_MATCH_AMOUNT_TOLERANCE_ORE", 100)
+    share = _env_number("CARD_MATCH_AMOUNT_TOLERANCE_PCT", 2.0) / 100
+    return int(max(fixed, abs(amount_ore) * share))
+
+
+def min_score() -> float:
+    return _env_number("CARD_MATCH_MIN_SCORE", 0.6)
+
+
+def to_ore(amount: Any) -> Optional[int]:
+    """Amount in öre (hundredths), rounded half up; ``None`` for missing or unparsable values."""
+    if amount is None:
+        return None
+    try:
+        value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+        return int((value * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    except Exception:
+        return None
+
+
+def _as_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value[:10]).date()
+        except ValueError:
+            return None
+    return None
+
+
+@dataclass(frozen=True)
+class StatementLine:
+    id: int
+    day: date
+    amount_ore: int
+    merchant: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CandidateReceipt:
+    id: str
+    day: date
+    amount_ore: int
+    created_at: Optional[datetime] = None
+    merchant: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Match:
+    line_id: int
+    file_id: str
+    score: float
+
+
+def normalize_merchant(name: Optional[str]) -> str:
+    """Lower-case ASCII tokens of ``name`` without accents, numbers, legal forms or processor prefixes."""
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    tokens = [t for t in _TOKEN_RE.findall(text) if not t.isdigit() and t not in _MERCHANT_NOISE]
+    return " ".join(tokens)
+
+
+@lru_cache(maxsize=65536)
+def _trigrams(normalized: str) -> FrozenSet[str]:
+    # pg_trgm style: each word padded with two spaces in front and one behind.
+    grams = set()
+    for token in normalized.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def merchant_similarity(a: Optional[str], b: Optional[str]) -> Optional[float]:
+    """Trigram similarity (shared / all trigrams) of two merchant names; ``None`` if either is blank."""
+    left, right = _trigrams(normalize_merchant(a)), _trigrams(normalize_merchant(b))
+    if not left or not right:
+        return None
+    return len(left & right) / len(left | right)
+
+
+def score_pair(line: StatementLine, receipt: CandidateReceipt, days: int, tolerance_ore: int) -> Optional[float]:
+    """Score in ``[0, 1]`` for a line/receipt pair, or ``None`` when outside the date or amount tolerance.
+
+    Card transactions post on or after the purchase day, so a receipt dated after
+    the line costs twice as much per day as one dated before it. A missing merchant
+    name on either side scores 0.5 for that component.
+    """
+    delay = (line.day - receipt.day).days
+    diff = abs(line.amount_ore - receipt.amount_ore)
+    if abs(delay) > days or diff > tolerance_ore:
+        return None
+    # Both fall linearly to 0.5 at the edge of their tolerance.
+    amount_score = 1.0 - 0.5 * diff / tolerance_ore if tolerance_ore else 1.0
+    date_score = 1.0 - 0.5 * (delay if delay >= 0 else -2 * delay) / days if days else 1.0
+    similarity = merchant_similarity(line.merchant, receipt.merchant)
+    merchant_score = 0.5 if similarity is None else similarity
+    return AMOUNT_WEIGHT * amount_score + DATE_WEIGHT * max(date_score, 0.0) + MERCHANT_WEIGHT * merchant_score
+
+
+def candidate_pairs(lines: Iterable[StatementLine], receipts: Iterable[CandidateReceipt]) -> List[Tuple[StatementLine, CandidateReceipt, float]]:
+    """Every pair within tolerance that scores at least ``CARD_MATCH_MIN_SCORE``.
+
+    Receipts are blocked by purchase day and sorted by amount within a day, so each
+    line only looks at ``2 * tolerance + 1`` day buckets and bisects to its amount range.
+    """
+    days = date_tolerance_days()
+    threshold = min_score()
+    buckets: Dict[date, List[CandidateReceipt]] = {}
+    for receipt in receipts:
+        buckets.setdefault(receipt.day, []).append(receipt)
+    amounts: Dict[date, List[int]] = {}
+    for day, bucket in buckets.items():
+        bucket.sort(key=lambda r: r.amount_ore)
+        amounts[day] = [r.amount_ore for r in bucket]
+
+    pairs: List[Tuple[StatementLine, CandidateReceipt, float]] = []
+    for line in lines:
+        tolerance = amount_tolerance_ore(line.amount_ore)
+        for offset in range(-days, days + 1):
+            day = line.day + timedelta(days=offset)
+            bucket = buckets.get(day)
+            if not bucket:
+                continue
+            keys = amounts[day]
+            lo = bisect.bisect_left(keys, line.amount_ore - tolerance)
+            hi = bisect.bisect_right(keys, line.amount_ore + tolerance)
+            for receipt in bucket[lo:hi]:
+                score = score_pair(line, receipt, days, tolerance)
+                if score is not None and score >= threshold:
+                    pairs.append((line, receipt, score))
+    return pairs
+
+
+def _hungarian(cost: List[List[float]]) -> List[int]:
+    """Column assigned to each row minimising total cost; needs ``len(rows) <= len(columns)``."""
+    n, m = len(cost), len(cost[0])
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    owner = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        owner[0] = row
+        col = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col] = True
+            current, delta, next_col = owner[col], inf, 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                reduced = cost[current - 1][j - 1] - u[current] - v[j]
+                if reduced < minv[j]:
+                    minv[j], way[j] = reduced, col
+                if minv[j] < delta:
+                    delta, next_col = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            col = next_col
+            if owner[col] == 0:
+                break
+        while col:
+            prev = way[col]
+            owner[col] = owner[prev]
+            col = prev
+    assignment = [-1] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            assignment[owner[j] - 1] = j - 1
+    return assignment
+
+
+def _components(edges: Sequence[Tuple[int, str, float]]) -> List[List[Tuple[int, str, float]]]:
+    parent: Dict[Any, Any] = {}
+
+    def find(node: Any) -> Any:
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for line_id, file_id, _ in edges:
+        parent[find(("l", line_id))] = find(("r", file_id))
+    groups: Dict[Any, List[Tuple[int, str, float]]] = {}
+    for edge in edges:
+        groups.setdefault(find(("l", edge[0])), []).append(edge)
+    return list(groups.values())
+
+
+def _assign_greedy(edges: Sequence[Tuple[int, str, float]]) -> List[Match]:
+    taken_lines: set = set()
+    taken_files: set = set()
+    matches: List[Match] = []
+    for line_id, file_id, score in sorted(edges, key=lambda e: -e[2]):
+        if line_id not in taken_lines and file_id not in taken_files:
+            taken_lines.add(line_id)
+            taken_files.add(file_id)
+            matches.append(Match(line_id, file_id, score))
+    return matches
+
+
+def assign(edges: Sequence[Tuple[int, str, float]]) -> List[Match]:
+    """One receipt per line and one line per receipt, maximising the summed score.
+
+    ``edges`` are ``(line_id, file_id, score)``. The graph is split into connected
+    components, which stay small after blocking, and each is solved exactly.
+    """
+    matches: List[Match] = []
+    for component in _components(edges):
+        line_ids = sorted({e[0] for e in component})
+        file_ids = sorted({e[1] for e in component})
+        if len(line_ids) == 1 or len(file_ids) == 1:
+            best = max(component, key=lambda e: e[2])
+            matches.append(Match(*best))
+            continue
+        if min(len(line_ids), len(file_ids)) > MAX_ASSIGNMENT_SIZE:
+            logger.warning(f"card matching: {len(line_ids)}x{len(file_ids)} component assigned greedily")
+            matches.extend(_assign_greedy(component))
+            continue
+        transpose = len(line_ids) > len(file_ids)
+        rows, cols = (file_ids, line_ids) if transpose else (line_ids, file_ids)
+        row_index = {key: i for i, key in enumerate(rows)}
+        col_index = {key: j for j, key in enumerate(cols)}
+        # Non-edges cost 0 (no gain) so the solver can leave rows effectively unmatched.
+        cost = [[0.0] * len(cols) for _ in rows]
+        scores: Dict[Tuple[int, int], float] = {}
+        for line_id, file_id, score in component:
+            i, j = (row_index[file_id], col_index[line_id]) if transpose else (row_index[line_id], col_index[file_id])
+            cost[i][j] = -score
+            scores[(i, j)] = score
+        for i, j in enumerate(_hungarian(cost)):
+            if (i, j) in scores:
+                line_id, file_id = (cols[j], rows[i]) if transpose else (rows[i], cols[j])
+                matches.append(Match(line_id, file_id, scores[(i, j)]))
+    return sorted(matches, key=lambda m: m.line_id)
+
+
+def match_scored(lines: Iterable[StatementLine], receipts: Iterable[CandidateReceipt]) -> List[Match]:
+    """Score every blocked candidate pair and resolve conflicts with a global assignment."""
+    edges = [(line.id, receipt.id, round(score, 4)) for line, receipt, score in candidate_pairs(lines, receipts)]
+    return assign(edges)
+
+
+def load_unmatched_lines(document_id: str) -> List[StatementLine]:
+    with db_cursor() as cur:
+        cur.execute(
+            (
+                "SELECT id, transaction_date, amount, merchant_name FROM invoice_lines "
+                "WHERE invoice_id=%s AND matched_file_id IS NULL"
+            ),
+            (document_id,),
+        )
+        rows = cur.fetchall() or []
+    lines: List[StatementLine] = []
+    for line_id, tx_date, amount, merchant in rows:
+        day, ore = _as_date(tx_date), to_ore(amount)
+        if day is not None and ore is not None:
+            lines.append(StatementLine(int(line_id), day, ore, merchant))
+    return lines
+
+
+def load_candidates(first_day: date, last_day: date) -> List[CandidateReceipt]:
+    """Every unmatched receipt purchased in ``[first_day, last_day]``, in one range query.
+
+    Receipts already attached to any statement line are left out so one receipt
+    never backs two card transactions.
+    """
+    with db_cursor() as cur:
+        cur.execute(
+            (
+                "SELECT u.id, u.purchase_datetime, u.gross_amount, u.created_at, u.merchant_name "
+                "FROM unified_files u "
+                "WHERE u.purchase_datetime >= %s AND u.purchase_datetime < %s + INTERVAL 1 DAY "
+                "AND u.gross_amount IS NOT NULL "
+                "AND NOT EXISTS (SELECT 1 FROM invoice_lines il WHERE il.matched_file_id = u.id)"
+            ),
+            (first_day.isoformat(), last_day.isoformat()),
+        )
+        rows = cur.fetchall() or []
+    receipts: List[CandidateReceipt] = []
+    for rid, purchase_dt, gross, created_at, merchant in rows:
+        day, ore = _as_date(purchase_dt), to_ore(gross)
+        if day is not None and ore is not None:
+            receipts.append(CandidateReceipt(rid, day, ore, created_at, merchant))
+    return receipts
+
+
+def _chunks(items: Sequence[Match], size: int) -> Iterable[Sequence[Match]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def apply_matches(matches: Sequence[Match], performed_by: str = "system", reason: str = "auto-match") -> List[Match]:
+    """Write matches with one UPDATE per batch and one multi-row history INSERT, in one transaction.
+
+    Lines that were matched by someone else in the meantime are locked, skipped and
+    left out of the history; returns the matches actually written.
+    """
+    if not matches:
+        return []
+    applied: List[Match] = []
+    with db_transaction():
+        with db_cursor() as cur:
+            for batch in _chunks(matches, UPDATE_BATCH):
+                placeholders = ",".join(["%s"] * len(batch))
+                cur.execute(
+                    f"SELECT id FROM invoice_lines WHERE id IN ({placeholders}) AND matched_file_id IS NULL FOR UPDATE",
+                    tuple(m.line_id for m in batch),
+                )
+                open_ids = {int(row[0]) for row in cur.fetchall() or []}
+                batch = [m for m in batch if m.line_id in open_ids]
+                if not batch:
+                    continue
+                cases = " ".join(["WHEN %s THEN %s"] * len(batch))
+                placeholders = ",".join(["%s"] * len(batch))
+                params: List[Any] = []
+                for m in batch:
+                    params.extend([m.line_id, m.file_id])
+                for m in batch:
+                    params.extend([m.line_id, m.score])
+                params.extend(m.line_id for m in batch)
+                cur.execute(
+                    (
+                        f"UPDATE invoice_lines SET matched_file_id = CASE id {cases} END, "
+                        f"match_score = CASE id {cases} END, match_status='auto' "
+                        f"WHERE id IN ({placeholders})"
+                    ),
+                    tuple(params),
+                )
+                applied.extend(batch)
+            if applied:
+                cur.executemany(
+                    (
+                        "INSERT INTO invoice_line_history (invoice_line_id, action, performed_by, old_matched_file_id, new_matched_file_id, reason) "
+                        "VALUES (%s, 'matched', %s, NULL, %s, %s)"
+                    ),
+                    [(m.line_id, performed_by, m.file_id, reason) for m in applied],
+                )
+    return applied
+
+
+def match_statement(document_id: str) -> List[Match]:
+    """Match all open lines of a statement: two reads, scoring and assignment in memory, batched writes."""
+    lines = load_unmatched_lines(document_id)
+    if not lines:
+        return []
+    window = timedelta(days=date_tolerance_days())
+    receipts = load_candidates(min(line.day for line in lines) - window, max(line.day for line in lines) + window)
+    matches = match_scored(lines, receipts)
+    applied = apply_matches(matches)
+    if len(applied) != len(matches):
+        logger.warning(f"firstcard: {len(matches) - len(applied)} of {len(matches)} lines were matched concurrently")
+    return applied
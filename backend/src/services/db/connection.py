@@ -1,10 +1,23 @@
 from __future__ import annotations
 
+import logging
 import os
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
-from typing import Any, Iterator
+from typing import Any, Deque, Iterator, List, Optional
 
 import mysql.connector
+from mysql.connector import errors as mysql_errors
+
+try:
+    from observability.metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT
+except Exception:  # pragma: no cover - metrics are optional (scripts, minimal envs)
+    DB_POOL_CONNECTIONS = None  # type: ignore
+    DB_POOL_WAIT = None  # type: ignore
+
+logger = logging.getLogger(__name__)
 
 
 def _env(name: str, default: str | None = None) -> str:
@@ -30,17 +43,313 @@ def get_connection():
     )
 
 
+class PoolTimeout(RuntimeError):
+    """Raised when no pooled connection became available within DB_POOL_TIMEOUT."""
+
+
+class _PooledConnection:
+    __slots__ = ("cnx", "created_at", "last_used")
+
+    def __init__(self, cnx: Any) -> None:
+        now = time.monotonic()
+        self.cnx = cnx
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """Small thread-safe MySQL connection pool.
+
+    - ``size`` bounds the number of open connections (idle + checked out).
+    - Connections older than ``max_lifetime`` seconds are recycled on checkout/return.
+    - Connections idle for more than ``ping_interval`` seconds are pinged before reuse.
+    - The pool remembers the pid it was created in; :func:`db_cursor` rebuilds it in
+      forked children (gunicorn/Celery prefork) so sockets are never shared across processes.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        timeout: float = 10.0,
+        max_lifetime: float = 1800.0,
+        ping_interval: float = 30.0,
+        factory=get_connection,
+    ) -> None:
+        self.size = max(int(size), 1)
+        self.timeout = float(timeout)
+        self.max_lifetime = float(max_lifetime)
+        self.ping_interval = float(ping_interval)
+        self.pid = os.getpid()
+        self._factory = factory
+        self._idle: Deque[_PooledConnection] = deque()
+        self._checked_out = 0
+        self._cond = threading.Condition()
+        self._update_gauges()
+
+    # --- stats -----------------------------------------------------------
+    @property
+    def checked_out(self) -> int:
+        return self._checked_out
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def _update_gauges(self) -> None:
+        if DB_POOL_CONNECTIONS is None:
+            return
+        try:
+            DB_POOL_CONNECTIONS.labels(state="checked_out").set(self._checked_out)
+            DB_POOL_CONNECTIONS.labels(state="idle").set(len(self._idle))
+        except Exception:
+            pass
+
+    # --- lifecycle -------------------------------------------------------
+    def _expired(self, pooled: _PooledConnection, now: float) -> bool:
+        return self.max_lifetime > 0 and (now - pooled.created_at) >= self.max_lifetime
+
+    def _healthy(self, pooled: _PooledConnection, now: float) -> bool:
+        if (now - pooled.last_used) < self.ping_interval:
+            return True
+        try:
+            pooled.cnx.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(pooled: _PooledConnection) -> None:
+        try:
+            pooled.cnx.close()
+        except Exception:
+            pass
+
+    def acquire(self) -> _PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.timeout
+        candidate: Optional[_PooledConnection] = None
+        create = False
+        with self._cond:
+            while not self._idle and self._checked_out >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout:.1f}s waiting for a DB connection "
+                        f"(pool size {self.size})"
+                    )
+                self._cond.wait(remaining)
+            if self._idle:
+                candidate = self._idle.pop()  # LIFO keeps the hottest connections busy
+            else:
+                create = True
+            self._checked_out += 1
+            self._update_gauges()
+
+        try:
+            if create:
+                candidate = _PooledConnection(self._factory())
+            else:
+                now = time.monotonic()
+                assert candidate is not None
+                if self._expired(candidate, now) or not self._healthy(candidate, now):
+                    self._close(candidate)
+                    candidate = _PooledConnection(self._factory())
+        except Exception:
+            with self._cond:
+                self._checked_out -= 1
+                self._update_gauges()
+                self._cond.notify()
+            raise
+
+        if DB_POOL_WAIT is not None:
+            try:
+                DB_POOL_WAIT.observe(time.monotonic() - start)
+            except Exception:
+                pass
+        return candidate
+
+    def release(self, pooled: _PooledConnection, discard: bool = False) -> None:
+        now = time.monotonic()
+        if not discard:
+            try:
+                if getattr(pooled.cnx, "unread_result", False):
+                    pooled.cnx.consume_results()
+                if pooled.cnx.in_transaction:
+                    pooled.cnx.rollback()
+                if not pooled.cnx.autocommit:
+                    pooled.cnx.autocommit = True
+            except Exception:
+                discard = True
+        if not discard and self._expired(pooled, now):
+            discard = True
+        if discard:
+            logger.debug("Discarding pooled DB connection")
+            self._close(pooled)
+        else:
+            pooled.last_used = now
+        with self._cond:
+            self._checked_out -= 1
+            if not discard:
+                self._idle.append(pooled)
+            self._update_gauges()
+            self._cond.notify()
+
+    def close_idle(self) -> None:
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._update_gauges()
+        for pooled in idle:
+            self._close(pooled)
+
+    def abandon(self) -> List[_PooledConnection]:
+        """Forget all connections without closing them (used after fork)."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._checked_out = 0
+        return idle
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+# Connections inherited from a parent process. They are kept referenced so the
+# child never closes (and thereby corrupts) sockets still owned by the parent.
+_INHERITED: List[_PooledConnection] = []
+
+
+def _pool_size() -> int:
+    try:
+        return int(os.getenv("DB_POOL_SIZE", "5"))
+    except ValueError:
+        return 5
+
+
+def _build_pool() -> ConnectionPool:
+    return ConnectionPool(
+        size=_pool_size(),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+        ping_interval=float(os.getenv("DB_POOL_PING_INTERVAL", "30")),
+    )
+
+
+def get_pool() -> Optional[ConnectionPool]:
+    """Return the process-wide pool, or ``None`` when pooling is disabled (DB_POOL_SIZE=0)."""
+    global _POOL
+    if _pool_size() <= 0:
+        return None
+    pool = _POOL
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _POOL_LOCK:
+        if _POOL is not None and _POOL.pid != os.getpid():
+            _INHERITED.extend(_POOL.abandon())
+            _POOL = None
+        if _POOL is None:
+            _POOL = _build_pool()
+        return _POOL
+
+
+def reset_pool() -> None:
+    """Close idle connections and drop the process-wide pool."""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None and pool.pid == os.getpid():
+        pool.close_idle()
+
+
+def _after_fork_in_child() -> None:
+    global _POOL
+    if _POOL is not None:
+        _INHERITED.extend(_POOL.abandon())
+        _POOL = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+_BROKEN_ERRORS = (mysql_errors.InterfaceError, mysql_errors.OperationalError)
+
+# Connection bound to the current thread by db_transaction(); db_cursor() joins it.
+_local = threading.local()
+
+
+def _checkout() -> tuple[Optional[ConnectionPool], _PooledConnection]:
+    pool = get_pool()
+    if pool is None:
+        return None, _PooledConnection(get_connection())
+    return pool, pool.acquire()
+
+
+def _checkin(pool: Optional[ConnectionPool], pooled: _PooledConnection, broken: bool) -> None:
+    if pool is None:
+        try:
+            pooled.cnx.close()
+        except Exception:
+            pass
+    else:
+        pool.release(pooled, discard=broken)
+
+
+@contextmanager
+def db_transaction() -> Iterator[None]:
+    """Run every ``db_cursor()`` opened in this thread on one connection and one transaction.
+
+    Commits when the block exits normally and rolls back on error. Nested calls join
+    the outer transaction.
+    """
+    if getattr(_local, "cnx", None) is not None:
+        yield
+        return
+    pool, pooled = _checkout()
+    broken = False
+    _local.cnx = pooled.cnx
+    try:
+        pooled.cnx.start_transaction()
+        yield
+        pooled.cnx.commit()
+    except BaseException as exc:
+        broken = isinstance(exc, _BROKEN_ERRORS)
+        try:
+            pooled.cnx.rollback()
+        except Exception:
+            broken = True
+        raise
+    finally:
+        _local.cnx = None
+        _checkin(pool, pooled, broken)
+
+
 @contextmanager
 def db_cursor() -> Iterator[Any]:
-    cnx = get_connection()
+    shared = getattr(_local, "cnx", None)
+    if shared is not None:
+        cur = shared.cursor(buffered=True)
+        try:
+            yield cur
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        return
+
+    pool, pooled = _checkout()
     cur = None
+    broken = False
     try:
-        cur = cnx.cursor()
+        cur = pooled.cnx.cursor()
         yield cur
+    except _BROKEN_ERRORS:
+        broken = True
+        raise
     finally:
         try:
             if cur is not None:
                 cur.close()
         except Exception:
             pass
-        cnx.close()
+        _checkin(pool, pooled, broken)
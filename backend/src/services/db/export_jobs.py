@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+from .connection import db_cursor
+
+_COLUMNS = (
+    "id", "kind", "params_json", "cache_key", "status", "result_path", "result_size",
+    "error", "created_at", "started_at", "finished_at",
+)
+
+
+def create_job(
+    job_id: str,
+    kind: str,
+    params: dict[str, Any],
+    cache_key: Optional[str],
+    status: str = "queued",
+    result_path: Optional[str] = None,
+    result_size: Optional[int] = None,
+) -> None:
+    finished = "NOW()" if status == "done" else "NULL"
+    with db_cursor() as cur:
+        cur.execute(
+            (
+                "INSERT INTO export_jobs (id, kind, params_json, cache_key, status, result_path, result_size, finished_at) "
+                f"VALUES (%s, %s, %s, %s, %s, %s, %s, {finished})"
+            ),
+            (job_id, kind, json.dumps(params, sort_keys=True), cache_key, status, result_path, result_size),
+        )
+
+
+def get_job(job_id: str) -> Optional[dict[str, Any]]:
+    with db_cursor() as cur:
+        cur.execute(f"SELECT {', '.join(_COLUMNS)} FROM export_jobs WHERE id=%s", (job_id,))
+        row = cur.fetchone()
+    if not row:
+        return None
+    job = dict(zip(_COLUMNS, row))
+    params = job.pop("params_json")
+    job["params"] = json.loads(params) if isinstance(params, (str, bytes)) else (params or {})
+    for key in ("created_at", "started_at", "finished_at"):
+        value = job[key]
+        job[key] = value.isoformat() if hasattr(value, "isoformat") else value
+    return job
+
+
+def mark_running(job_id: str) -> bool:
+    with db_cursor() as cur:
+        cur.execute(
+            "UPDATE export_jobs SET status='running', started_at=NOW() WHERE id=%s AND status IN ('queued','running')",
+            (job_id,),
+        )
+        return cur.rowcount > 0
+
+
+def mark_done(job_id: str, result_path: Optional[str], result_size: int) -> None:
+    with db_cursor() as cur:
+        cur.execute(
+            (
+                "UPDATE export_jobs SET status='done', result_path=%s, result_size=%s, error=NULL, "
+                "finished_at=NOW() WHERE id=%s"
+            ),
+            (result_path, int(result_size), job_id),
+        )
+
+
+def mark_error(job_id: str, error: str) -> None:
+    with db_cursor() as cur:
+        cur.execute(
+            "UPDATE export_jobs SET status='error', error=%s, finished_at=NOW() WHERE id=%s",
+            (error[:1024], job_id),
+        )
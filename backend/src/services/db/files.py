@@ -14,6 +14,23 @@ def set_ai_status(file_id: str, status: str) -> bool:
         return cur.rowcount > 0
 
 
+def set_line_item_count(file_id: str, count: int) -> bool:
+    with db_cursor() as cur:
+        cur.execute(
+            "UPDATE unified_files SET line_item_count=%s WHERE id=%s",
+            (int(count), file_id),
+        )
+        return cur.rowcount > 0
+
+
+def set_line_item_counts(counts: Iterable[Tuple[str, int]]) -> None:
+    rows = [(int(count), file_id) for file_id, count in counts]
+    if not rows:
+        return
+    with db_cursor() as cur:
+        cur.executemany("UPDATE unified_files SET line_item_count=%s WHERE id=%s", rows)
+
+
 def list_unprocessed(limit: int = 50) -> List[str]:
     with db_cursor() as cur:
         cur.execute(
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from .connection import db_cursor
+
+# name -> (size, modified)
+Manifest = Dict[str, Tuple[Optional[int], Optional[str]]]
+
+
+def load(source: str) -> Manifest:
+    with db_cursor() as cur:
+        cur.execute("SELECT name, size, modified FROM ftp_manifest WHERE source=%s", (source,))
+        return {
+            name: (int(size) if size is not None else None, modified)
+            for name, size, modified in cur.fetchall() or []
+        }
+
+
+def record(source: str, entries: Iterable[Tuple[str, Optional[int], Optional[str], Optional[str]]]) -> None:
+    """Upsert ``(name, size, modified, file_id)`` rows for ``source``."""
+    rows = [(source, name, size, modified, file_id) for name, size, modified, file_id in entries]
+    if not rows:
+        return
+    with db_cursor() as cur:
+        cur.executemany(
+            (
+                "INSERT INTO ftp_manifest (source, name, size, modified, file_id) VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE size=VALUES(size), modified=VALUES(modified), file_id=VALUES(file_id)"
+            ),
+            rows,
+        )
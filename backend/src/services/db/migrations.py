@@ -79,6 +79,7 @@ def apply_migrations(seed_demo: bool = True) -> None:
                     # Ignore idempotency errors
                     if (
                         "Duplicate column name" in msg
+                        or "Duplicate key name" in msg
                         or "already exists" in msg
                         or "exists" in msg and "constraint" in msg.lower()
                     ):
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from services.db.connection import db_cursor
+except Exception:  # pragma: no cover - allow running without DB
+    db_cursor = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+# MySQL ER_DUP_ENTRY: the unique content_hash index rejected a second copy.
+DUPLICATE_ENTRY = 1062
+
+
+class HashingWriter:
+    """Wrap a binary file: every ``write`` also feeds a SHA-256.
+
+    Usable as the callback of ``ftplib.retrbinary`` or with :func:`copy_hashing`,
+    so bytes are hashed on their way to disk without a second read.
+    """
+
+    def __init__(self, fh: BinaryIO) -> None:
+        self._fh = fh
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self._sha.update(data)
+        self.size += len(data)
+        return self._fh.write(data)
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+def copy_hashing(src: BinaryIO, dst: BinaryIO, chunk_size: int = CHUNK_SIZE) -> str:
+    """Copy ``src`` to ``dst`` in chunks; returns the SHA-256 of the copied bytes."""
+    writer = HashingWriter(dst)
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        writer.write(chunk)
+    return writer.hexdigest()
+
+
+def combine(page_hashes: Sequence[str]) -> str:
+    """One hash for a receipt; a single page keeps its own hash so the same file matches across channels."""
+    if len(page_hashes) == 1:
+        return page_hashes[0]
+    return hashlib.sha256("\n".join(page_hashes).encode("ascii")).hexdigest()
+
+
+def find_existing(hashes: Iterable[str]) -> Dict[str, str]:
+    """``content_hash -> unified_files.id`` for hashes already ingested, in one query."""
+    unique: List[str] = sorted({h for h in hashes if h})
+    if db_cursor is None or not unique:
+        return {}
+    placeholders = ",".join(["%s"] * len(unique))
+    with db_cursor() as cur:
+        cur.execute(
+            f"SELECT content_hash, id FROM unified_files WHERE content_hash IN ({placeholders})",
+            tuple(unique),
+        )
+        return {str(h): str(fid) for h, fid in cur.fetchall() or []}
+
+
+def is_duplicate_entry(exc: BaseException) -> bool:
+    return getattr(exc, "errno", None) == DUPLICATE_ENTRY
+
+
+def existing_for(exc: BaseException, content_hash: Optional[str]) -> Optional[str]:
+    """Id of the row that won the unique content_hash index, if ``exc`` is that duplicate-entry error."""
+    if content_hash is None or not is_duplicate_entry(exc):
+        return None
+    try:
+        return find_existing([content_hash]).get(content_hash)
+    except Exception as e:
+        logger.warning(f"dedup: could not resolve duplicate {content_hash}: {e}")
+        return None
+
+
+def split_duplicates(
+    items: Sequence[Tuple[str, str]],
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Partition ``(file_id, content_hash)`` pairs into (new, duplicates).
+
+    Duplicates are ``(file_id, existing_id)``: the hash is already in the database
+    or appeared earlier in ``items`` (the first occurrence wins).
+    """
+    try:
+        existing = find_existing(h for _, h in items)
+    except Exception as e:
+        logger.warning(f"dedup: lookup failed, ingesting without dedup: {e}")
+        existing = {}
+    fresh: List[Tuple[str, str]] = []
+    duplicates: List[Tuple[str, str]] = []
+    for file_id, content_hash in items:
+        original: Optional[str] = existing.get(content_hash)
+        if original is not None:
+            duplicates.append((file_id, original))
+            continue
+        existing[content_hash] = file_id
+        fresh.append((file_id, content_hash))
+    return fresh, duplicates
@@ -0,0 +1,599 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, date
+from decimal import Decimal
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from services.db.connection import db_cursor  # type: ignore
+    from services.db import export_jobs as job_store
+except Exception:  # pragma: no cover - allow running without DB
+    db_cursor = None  # type: ignore
+    job_store = None  # type: ignore
+
+from services.storage import FileStorage
+from services.zip_stream import ZipMember, stream_zip
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("sie", "company_card")
+
+# Bump when the rendered output changes so cached files from older code are not served.
+EXPORT_FORMAT_VERSION = 1
+
+
+class ExportError(Exception):
+    """An export that cannot be produced; ``status`` is the HTTP status to report."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            return None
+
+
+# Rows pulled per round trip, and lines per response chunk, while streaming the SIE export.
+_SIE_FETCH_ROWS = 500
+_SIE_CHUNK_LINES = 500
+
+# Verification text, as used in the file and for ordering verifications within a day.
+_VER_TEXT_SQL = "COALESCE(NULLIF(uf.merchant_name, ''), CONCAT('Receipt ', uf.id))"
+
+
+def _proposal_filter(period_from: Optional[date], period_to: Optional[date]) -> Tuple[str, List[Any]]:
+    where: List[str] = ["uf.ai_status = 'completed'"]
+    params: List[Any] = []
+    if period_from:
+        where.append("DATE(COALESCE(uf.purchase_datetime, uf.created_at)) >= %s")
+        params.append(period_from.isoformat())
+    if period_to:
+        where.append("DATE(COALESCE(uf.purchase_datetime, uf.created_at)) <= %s")
+        params.append(period_to.isoformat())
+    return " AND ".join(where), params
+
+
+def fetch_account_labels(period_from: Optional[date], period_to: Optional[date]) -> Dict[str, str]:
+    """One row per account: the notes of its first proposal in export order become the label."""
+    if db_cursor is None:
+        return {}
+    where_sql, params = _proposal_filter(period_from, period_to)
+    sql = f"""
+        SELECT
+            ap.account_code,
+            SUBSTRING_INDEX(
+                GROUP_CONCAT(COALESCE(ap.notes, '')
+                    ORDER BY COALESCE(uf.purchase_datetime, uf.created_at), uf.id, ap.id
+                    SEPARATOR 0x1e),
+                0x1e, 1
+            ) AS first_notes
+        FROM ai_accounting_proposals ap
+        JOIN unified_files uf ON uf.id = ap.receipt_id
+        WHERE {where_sql}
+        GROUP BY ap.account_code
+    """
+    labels: Dict[str, str] = {}
+    with db_cursor() as cur:
+        cur.execute(sql, tuple(params))
+        for account, notes in cur.fetchall() or []:
+            labels[account] = (notes or "").strip() or f"Account {account}"
+    return labels
+
+
+def iter_verifications(period_from: Optional[date], period_to: Optional[date]) -> Iterator[dict]:
+    """Yield verifications one at a time from an unbuffered cursor.
+
+    Rows arrive ordered by (day, text, receipt), so each receipt's proposals are
+    contiguous and a verification is complete as soon as the receipt id changes.
+    The text is compared with a binary collation: code point order, as Python's
+    sort numbered #VER before, not the case- and accent-folding column default.
+    """
+    if db_cursor is None:
+        return
+    where_sql, params = _proposal_filter(period_from, period_to)
+    sql = f"""
+        SELECT
+            uf.id,
+            COALESCE(uf.purchase_datetime, uf.created_at) AS dt,
+            {_VER_TEXT_SQL} AS ver_text,
+            ap.account_code,
+            ap.debit,
+            ap.credit,
+            ap.notes
+        FROM ai_accounting_proposals ap
+        JOIN unified_files uf ON uf.id = ap.receipt_id
+        WHERE {where_sql}
+        ORDER BY DATE(dt) ASC, CONVERT({_VER_TEXT_SQL} USING utf8mb4) COLLATE utf8mb4_bin ASC,
+            dt ASC, uf.id ASC, ap.id ASC
+    """
+    current: Optional[dict] = None
+    current_id: Optional[str] = None
+    with db_cursor() as cur:
+        cur.execute(sql, tuple(params))
+        while True:
+            rows = cur.fetchmany(_SIE_FETCH_ROWS)
+            if not rows:
+                break
+            for rid, dt, ver_text, account, debit, credit, notes in rows:
+                if rid != current_id:
+                    if current is not None:
+                        yield current
+                    current_id = rid
+                    current = {
+                        "date": dt.date() if hasattr(dt, "date") else datetime.utcnow().date(),
+                        "text": ver_text,
+                        "entries": [],
+                    }
+                current["entries"].append(
+                    {
+                        "account": account,
+                        "amount": Decimal(str(debit or 0)) - Decimal(str(credit or 0)),
+                        "notes": notes or "",
+                    }
+                )
+    if current is not None:
+        yield current
+
+
+def _format_amount(amount: Decimal) -> str:
+    quantized = amount.quantize(Decimal("0.01"))
+    return f"{quantized:.2f}"
+
+
+def _sanitize_text(value: str) -> str:
+    return value.replace('"', "'").strip() or "Receipt"
+
+
+
+def iter_sie(
+    verifications: Iterable[dict],
+    account_labels: Dict[str, str],
+    period_from: Optional[date],
+    period_to: Optional[date],
+) -> Iterator[str]:
+    """Yield the SIE file in chunks: the header and #KONTO block, then the verifications."""
+    today = datetime.utcnow().strftime("%Y%m%d")
+    lines = [
+        "#FLAGGA 0",
+        "#FORMAT PC8",
+        '#PROGRAM "Mind Admin" "1.0"',
+        f"#GEN {today}",
+        "#SIETYP 4",
+    ]
+
+    if period_from or period_to:
+        comment_from = period_from.isoformat() if period_from else "(start)"
+        comment_to = period_to.isoformat() if period_to else "(end)"
+        lines.append(f"; Export period {comment_from} to {comment_to}")
+
+    for account in sorted(account_labels.keys()):
+        label = _sanitize_text(account_labels[account])
+        lines.append(f'#KONTO {account} "{label}"')
+
+    index = 0
+    for index, ver in enumerate(verifications, start=1):
+        ver_date = ver["date"].strftime("%Y%m%d") if isinstance(ver["date"], date) else today
+        ver_text = _sanitize_text(ver["text"])
+        ver_nr = f"{index:04d}"
+        lines.append(f'#VER "A" "{ver_nr}" {ver_date} "{ver_text}"')
+        for entry in ver["entries"]:
+            amount = entry.get("amount", Decimal("0"))
+            if not isinstance(amount, Decimal):
+                amount = Decimal(str(amount or 0))
+            if amount == 0:
+                continue
+            formatted_amount = _format_amount(amount)
+            entry_text = _sanitize_text(entry.get("notes") or ver_text)
+            lines.append(f'#TRANS {entry["account"]} {{}} {formatted_amount} "{entry_text}"')
+        if len(lines) >= _SIE_CHUNK_LINES:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if index == 0:
+        lines.append("; No verifications available for selected period")
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def sie_filename(period_from: Optional[date], period_to: Optional[date]) -> str:
+    if period_from and period_to:
+        return f"export_{period_from.isoformat()}_{period_to.isoformat()}.sie"
+    if period_from:
+        return f"export_{period_from.isoformat()}_end.sie"
+    if period_to:
+        return f"export_start_{period_to.isoformat()}.sie"
+    return "export_all.sie"
+
+
+def collect_company_card_data(statement_id: str) -> Tuple[Optional[dict], List[ZipMember], Optional[str]]:
+    if db_cursor is None:
+        return None, [], "db_unavailable"
+
+    statement_sql = (
+        "SELECT id, period_start, period_end, status, uploaded_at FROM invoice_documents "
+        "WHERE id=%s AND invoice_type='company_card'"
+    )
+
+    lines_sql = (
+        "SELECT id, transaction_date, amount, merchant_name, description, matched_file_id, match_status "
+        "FROM invoice_lines WHERE invoice_id=%s ORDER BY transaction_date ASC, id ASC"
+    )
+
+    receipt_map: Dict[str, dict] = {}
+    try:
+        with db_cursor() as cur:
+            cur.execute(statement_sql, (statement_id,))
+            row = cur.fetchone()
+            if not row:
+                return None, [], "not_found"
+            sid, p_start, p_end, status, uploaded_at = row
+            statement_info = {
+                "id": sid,
+                "period_start": p_start.isoformat() if hasattr(p_start, "isoformat") and p_start else None,
+                "period_end": p_end.isoformat() if hasattr(p_end, "isoformat") and p_end else None,
+                "status": status,
+                "uploaded_at": uploaded_at.isoformat() if hasattr(uploaded_at, "isoformat") else str(uploaded_at),
+            }
+
+            cur.execute(lines_sql, (statement_id,))
+            line_rows = cur.fetchall() or []
+    except Exception:
+        return None, [], "db_error"
+
+    lines: List[dict] = []
+    receipt_ids: List[str] = []
+    for (lid, tx, amount, merchant_name, description, matched_file_id, match_status) in line_rows:
+        if matched_file_id:
+            receipt_ids.append(matched_file_id)
+        lines.append(
+            {
+                "id": int(lid),
+                "transaction_date": tx.isoformat() if hasattr(tx, "isoformat") else tx,
+                "amount": float(amount) if amount is not None else None,
+                "merchant_name": merchant_name,
+                "description": description,
+                "matched_file_id": matched_file_id,
+                "match_status": match_status,
+            }
+        )
+
+    if receipt_ids:
+        placeholders = ",".join(["%s"] * len(receipt_ids))
+        receipt_sql = (
+            "SELECT id, merchant_name, purchase_datetime, gross_amount, net_amount, ai_status, submitted_by "
+            f"FROM unified_files WHERE id IN ({placeholders})"
+        )
+        try:
+            with db_cursor() as cur:
+                cur.execute(receipt_sql, tuple(receipt_ids))
+                for rid, merchant, purchase_dt, gross, net, ai_status, submitted_by in cur.fetchall() or []:
+                    receipt_map[rid] = {
+                        "id": rid,
+                        "merchant_name": merchant,
+                        "purchase_datetime": purchase_dt.isoformat() if hasattr(purchase_dt, "isoformat") else purchase_dt,
+                        "gross_amount": float(gross) if gross is not None else None,
+                        "net_amount": float(net) if net is not None else None,
+                        "ai_status": ai_status,
+                        "submitted_by": submitted_by,
+                        "files": [],
+                    }
+        except Exception:
+            return None, [], "db_error"
+
+    storage = FileStorage(os.getenv("STORAGE_DIR", "/data/storage"))
+    # Attachments are opened lazily while the zip streams; nothing is read here.
+    assets: List[ZipMember] = []
+    for rid in receipt_map.keys():
+        try:
+            files = storage.list(rid)
+        except Exception:
+            files = []
+        for fname in files:
+            zip_path = f"receipts/{rid}/{fname}"
+            assets.append(ZipMember(zip_path, opener=partial(storage.open, rid, fname)))
+            receipt_map[rid]["files"].append(zip_path)
+
+    bundle = {
+        "statement": statement_info,
+        "lines": [],
+    }
+
+    for line in lines:
+        rid = line.get("matched_file_id")
+        matched_receipt = receipt_map.get(rid) if rid else None
+        bundle["lines"].append(
+            {
+                **line,
+                "matched_receipt": matched_receipt,
+            }
+        )
+
+    return bundle, assets, None
+
+
+# --- Export requests, rendering and the on-disk result cache -----------------------
+
+
+def normalize_params(kind: str, raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate request parameters into the canonical form stored on a job and hashed for caching."""
+    if kind == "sie":
+        period_from = parse_date(raw.get("from"))
+        period_to = parse_date(raw.get("to"))
+        if period_from and period_to and period_from > period_to:
+            period_from, period_to = period_to, period_from
+        return {
+            "from": period_from.isoformat() if period_from else None,
+            "to": period_to.isoformat() if period_to else None,
+        }
+    if kind == "company_card":
+        statement_id = str(raw.get("statement_id") or "").strip()
+        if not statement_id:
+            raise ExportError(400, "statement_id is required")
+        return {"statement_id": statement_id}
+    raise ExportError(400, f"unknown export kind: {kind}")
+
+
+def _period(params: Dict[str, Any]) -> Tuple[Optional[date], Optional[date]]:
+    return parse_date(params.get("from")), parse_date(params.get("to"))
+
+
+def export_filename(kind: str, params: Dict[str, Any]) -> str:
+    if kind == "sie":
+        return sie_filename(*_period(params))
+    return f"company_card_{params['statement_id']}.zip"
+
+
+def export_mimetype(kind: str) -> str:
+    return "text/plain; charset=utf-8" if kind == "sie" else "application/zip"
+
+
+def open_export(kind: str, params: Dict[str, Any]) -> Iterator[bytes]:
+    """Run the up-front queries for an export and return an iterator over its bytes.
+
+    Problems that should become an HTTP error (missing statement, no database) are
+    raised here as ExportError, before anything has been sent.
+    """
+    if kind == "sie":
+        period_from, period_to = _period(params)
+        try:
+            account_labels = fetch_account_labels(period_from, period_to)
+        except Exception:
+            account_labels = {}
+        # No proposals in the period (or no database): nothing to stream.
+        verifications: Iterable[dict] = iter_verifications(period_from, period_to) if account_labels else []
+        return (chunk.encode("utf-8") for chunk in iter_sie(verifications, account_labels, period_from, period_to))
+
+    bundle, assets, error = collect_company_card_data(params["statement_id"])
+    if error == "db_unavailable":
+        raise ExportError(503, "database unavailable")
+    if error == "not_found":
+        raise ExportError(404, "statement not found")
+    if error == "db_error" or bundle is None:
+        raise ExportError(500, "failed to build export")
+    members = [ZipMember("statement.json", data=json.dumps(bundle, ensure_ascii=False, indent=2).encode("utf-8"))]
+    members.extend(assets)
+    return stream_zip(members)
+
+
+def data_version(kind: str, params: Dict[str, Any]) -> Optional[str]:
+    """Cheap fingerprint of everything an export reads; ``None`` when it cannot be computed.
+
+    Any change to the rows in scope (new or edited proposals, re-matched lines,
+    replaced attachments) changes the fingerprint and so the cache key.
+    """
+    if db_cursor is None:
+        return None
+    try:
+        if kind == "sie":
+            where_sql, params_sql = _proposal_filter(*_period(params))
+            with db_cursor() as cur:
+                cur.execute(
+                    (
+                        "SELECT COUNT(ap.id), COALESCE(MAX(ap.id), 0), MAX(uf.updated_at), "
+                        "BIT_XOR(CRC32(CONCAT_WS('|', ap.id, ap.account_code, ap.debit, ap.credit, ap.notes, "
+                        "uf.merchant_name, uf.purchase_datetime))) "
+                        "FROM ai_accounting_proposals ap JOIN unified_files uf ON uf.id = ap.receipt_id "
+                        f"WHERE {where_sql}"
+                    ),
+                    tuple(params_sql),
+                )
+                parts: List[Any] = list(cur.fetchone() or ())
+        else:
+            statement_id = params["statement_id"]
+            with db_cursor() as cur:
+                cur.execute(
+                    (
+                        "SELECT COUNT(il.id), BIT_XOR(CRC32(CONCAT_WS('|', il.id, il.transaction_date, il.amount, "
+                        "il.merchant_name, il.description, il.matched_file_id, il.match_status, "
+                        "uf.updated_at, uf.merchant_name, uf.gross_amount))) "
+                        "FROM invoice_lines il LEFT JOIN unified_files uf ON uf.id = il.matched_file_id "
+                        "WHERE il.invoice_id=%s"
+                    ),
+                    (statement_id,),
+                )
+                parts = list(cur.fetchone() or ())
+                cur.execute(
+                    "SELECT DISTINCT matched_file_id FROM invoice_lines WHERE invoice_id=%s AND matched_file_id IS NOT NULL",
+                    (statement_id,),
+                )
+                receipt_ids = sorted(row[0] for row in cur.fetchall() or [])
+            # Attachments live on disk, not in the database: fold in their names, sizes and mtimes.
+            root = Path(os.getenv("STORAGE_DIR", "/data/storage"))
+            for rid in receipt_ids:
+                folder = root / rid
+                if not folder.is_dir():
+                    continue
+                for entry in sorted(folder.iterdir()):
+                    if entry.is_file():
+                        st = entry.stat()
+                        parts.append(f"{rid}/{entry.name}:{st.st_size}:{st.st_mtime_ns}")
+    except Exception as e:
+        logger.warning(f"export: data version unavailable for {kind}: {e}")
+        return None
+    raw = json.dumps([EXPORT_FORMAT_VERSION, parts], default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cache_key(kind: str, params: Dict[str, Any], version: str) -> str:
+    raw = json.dumps([kind, params, version], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:40]
+
+
+def cache_dir() -> Path:
+    return Path(os.getenv("EXPORT_CACHE_DIR") or Path(os.getenv("STORAGE_DIR", "/data/storage")) / "exports")
+
+
+def cache_path(key: str) -> Path:
+    return cache_dir() / key
+
+
+def _prune_cache(max_age_days: Optional[float] = None) -> None:
+    if max_age_days is None:
+        try:
+            max_age_days = float(os.getenv("EXPORT_CACHE_MAX_AGE_DAYS", "30"))
+        except ValueError:
+            max_age_days = 30.0
+    if max_age_days <= 0:
+        return
+    cutoff = time.time() - max_age_days * 86400
+    try:
+        for entry in cache_dir().iterdir():
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    entry.unlink()
+            except FileNotFoundError:
+                continue
+    except FileNotFoundError:
+        return
+
+
+def tee_to_file(chunks: Iterable[bytes], path: Path) -> Iterator[bytes]:
+    """Pass ``chunks`` through while writing them to ``path``.
+
+    The file only appears (atomically) once the stream has been fully consumed, so a
+    dropped download never leaves a truncated export in the cache.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    completed = False
+    try:
+        with open(tmp, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                yield chunk
+        os.replace(tmp, path)
+        completed = True
+    finally:
+        if not completed:
+            try:
+                tmp.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def write_export(kind: str, params: Dict[str, Any], path: Path) -> int:
+    for _ in tee_to_file(open_export(kind, params), path):
+        pass
+    _prune_cache()
+    return path.stat().st_size
+
+
+# --- Persistent job registry ------------------------------------------------------
+
+
+def _record(action: str, *args: Any, **kwargs: Any) -> bool:
+    """Best-effort job bookkeeping: a registry failure must not fail the export itself."""
+    if job_store is None:
+        return False
+    try:
+        getattr(job_store, action)(*args, **kwargs)
+        return True
+    except Exception as e:
+        logger.warning(f"export: job registry update failed: {e}")
+        return False
+
+
+def start_job(kind: str, params: Dict[str, Any], status: str = "queued", record: bool = True) -> Dict[str, Any]:
+    """Register an export job; if the same data was exported before, it is done immediately.
+
+    Returns ``{"id", "status", "cache_key", "cached_path", "recorded"}``; ``recorded``
+    is False when the registry could not be written (no database) or ``record`` is
+    False (direct downloads only need the cache lookup).
+    """
+    version = data_version(kind, params)
+    key = cache_key(kind, params, version) if version else None
+    cached = cache_path(key) if key else None
+    job_id = str(uuid.uuid4())
+    if cached is not None and cached.is_file():
+        size = cached.stat().st_size
+        recorded = record and _record("create_job", job_id, kind, params, key, status="done",
+                                      result_path=str(cached), result_size=size)
+        return {"id": job_id, "status": "done", "cache_key": key, "cached_path": cached, "recorded": recorded}
+    recorded = record and _record("create_job", job_id, kind, params, key, status=status)
+    return {"id": job_id, "status": status, "cache_key": key, "cached_path": None, "recorded": recorded}
+
+
+def finish_job(job_id: str, path: Optional[Path]) -> None:
+    """Mark a job done with its result file; without one it is failed instead."""
+    if path is None or not path.is_file():
+        fail_job(job_id, "no_result")
+        return
+    _record("mark_done", job_id, str(path), path.stat().st_size)
+
+
+def fail_job(job_id: str, error: str) -> None:
+    _record("mark_error", job_id, error)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    if job_store is None:
+        raise ExportError(503, "export registry unavailable")
+    try:
+        return job_store.get_job(job_id)
+    except Exception as e:
+        raise ExportError(503, f"export registry unavailable: {e}") from e
+
+
+def run_job(job_id: str) -> Dict[str, Any]:
+    """Produce the file for a queued job (Celery ``process_export``)."""
+    job = get_job(job_id)
+    if job is None:
+        return {"job_id": job_id, "ok": False, "error": "not_found"}
+    if job["status"] == "done" and job.get("result_path") and Path(job["result_path"]).is_file():
+        return {"job_id": job_id, "ok": True, "cached": True}
+    _record("mark_running", job_id)
+    kind, params = job["kind"], job["params"]
+    path = cache_path(job["cache_key"]) if job.get("cache_key") else cache_dir() / f"job-{job_id}"
+    try:
+        if not path.is_file():
+            write_export(kind, params, path)
+    except ExportError as e:
+        fail_job(job_id, e.message)
+        return {"job_id": job_id, "ok": False, "error": e.message}
+    except Exception as e:
+        logger.error(f"export: job {job_id} failed: {e}")
+        fail_job(job_id, str(e))
+        return {"job_id": job_id, "ok": False, "error": str(e)}
+    finish_job(job_id, path)
+    return {"job_id": job_id, "ok": True, "cached": False}
@@ -4,21 +4,29 @@ import json
 import logging
 import os
 import ssl
+import threading
 import uuid
 import re
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
-from ftplib import FTP, FTP_TLS, error_perm
+from ftplib import FTP, FTP_TLS, all_errors, error_perm
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 
+from services.dedup import HashingWriter, copy_hashing, existing_for, is_duplicate_entry, split_duplicates
 from services.storage import FileStorage
 
 logger = logging.getLogger(__name__)
 try:
-    from services.db.connection import db_cursor
+    from services.db.connection import db_cursor, db_transaction
 except Exception:  # pragma: no cover
     db_cursor = None  # type: ignore
+    db_transaction = None  # type: ignore
+try:
+    from services.db import ftp_manifest as manifest_store
+except Exception:  # pragma: no cover
+    manifest_store = None  # type: ignore
 try:
     from services.db.files import set_ai_status
 except Exception:  # pragma: no cover
@@ -32,6 +40,7 @@ class FetchResult:
     downloaded: List[Tuple[str, str]]  # (id, filename)
     skipped: List[str]
     errors: List[str]
+    duplicates: List[Tuple[str, str]] = field(default_factory=list)  # (filename, id of the existing copy)
 
 
 def _allowed(name: str, exts: List[str]) -> bool:
@@ -84,80 +93,122 @@ def _load_metadata(file_path: Path) -> Dict[str, Any]:
     return {}
 
 
+UNIFIED_FILE_INSERT_SQL = """
+    INSERT INTO unified_files (
+        id, file_type, created_at,
+        file_category, file_suffix,
+        merchant_name, orgnr, purchase_datetime,
+        gross_amount, net_amount, original_filename,
+        original_file_id, original_file_name, file_creation_timestamp,
+        original_file_size, mime_type, ai_status, content_hash
+    ) VALUES (
+        %s, %s, NOW(),
+        %s, %s,
+        %s, %s, %s,
+        %s, %s, %s,
+        %s, %s, %s,
+        %s, %s, %s, %s
+    )
+"""
+FILE_LOCATION_INSERT_SQL = "INSERT INTO file_locations (file_id, lat, lon, acc, created_at) VALUES (%s, %s, %s, %s, NOW())"
+FILE_TAG_INSERT_SQL = "INSERT INTO file_tags (file_id, tag, created_at) VALUES (%s, %s, NOW())"
+
+
+def _unified_file_row(
+    file_id: str,
+    filename: str,
+    metadata: Dict[str, Any],
+    file_category: Optional[int],
+    ai_status: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> tuple:
+    """Parameters for UNIFIED_FILE_INSERT_SQL from a file name and its JSON metadata."""
+    file_suffix = _get_file_suffix(filename)
+
+    # Extract metadata fields (old format)
+    merchant_name = metadata.get('merchant_name')
+    orgnr = metadata.get('orgnr')
+    purchase_datetime = metadata.get('purchase_datetime')
+    gross_amount = metadata.get('gross_amount')
+    net_amount = metadata.get('net_amount')
+
+    # Extract new JSON format fields
+    original_file_id = metadata.get('file_id')
+    original_file_name = metadata.get('original_name')
+    file_creation_timestamp = metadata.get('timestamp')
+    original_file_size = metadata.get('file_size')
+    mime_type = metadata.get('file_type')
+
+    # Convert datetime strings to datetime objects if needed
+    if purchase_datetime and isinstance(purchase_datetime, str):
+        try:
+            purchase_datetime = datetime.strptime(purchase_datetime, '%Y-%m-%d %H:%M:%S')
+        except:
+            purchase_datetime = None
+
+    if file_creation_timestamp and isinstance(file_creation_timestamp, str):
+        try:
+            # Handle ISO format with timezone: 2025-09-07T19:33:00+02:00
+            # Remove timezone info for MySQL compatibility
+            timestamp_clean = re.sub(r'[+-]\d{2}:\d{2}$', '', file_creation_timestamp)
+            file_creation_timestamp = datetime.fromisoformat(timestamp_clean.replace('T', ' '))
+        except:
+            file_creation_timestamp = None
+
+    return (
+        file_id, "receipt",
+        file_category, file_suffix,
+        merchant_name, orgnr, purchase_datetime,
+        gross_amount, net_amount, filename,
+        original_file_id, original_file_name, file_creation_timestamp,
+        original_file_size, mime_type, ai_status, content_hash
+    )
+
+
+def _location_row(file_id: str, location: Dict[str, Any]) -> Optional[tuple]:
+    # Try new JSON format first (latitude/longitude)
+    lat = location.get('latitude') or location.get('lat')
+    lon = location.get('longitude') or location.get('lon')
+    acc = location.get('acc')
+
+    # Convert string coordinates to float if needed
+    if isinstance(lat, str):
+        lat = float(lat)
+    if isinstance(lon, str):
+        lon = float(lon)
+    if lat is None or lon is None:
+        return None
+    return (file_id, lat, lon, acc)
+
+
 def _insert_unified_file(
     file_id: str,
     filename: str,
-    metadata: Dict[str, Any]
-) -> None:
-    """Insert file record with complete metadata"""
+    metadata: Dict[str, Any],
+    content_hash: Optional[str] = None,
+) -> bool:
+    """Insert file record with complete metadata; returns whether the row was written.
+
+    A duplicate-entry error (same content_hash ingested concurrently) is re-raised
+    so the caller can link the file to the existing row.
+    """
     if db_cursor is None:
-        return
+        return True
 
     try:
-        file_suffix = _get_file_suffix(filename)
-        file_category = _get_file_category(file_suffix)
-
-        # Extract metadata fields (old format)
-        merchant_name = metadata.get('merchant_name')
-        orgnr = metadata.get('orgnr')
-        purchase_datetime = metadata.get('purchase_datetime')
-        gross_amount = metadata.get('gross_amount')
-        net_amount = metadata.get('net_amount')
-
-        # Extract new JSON format fields
-        original_file_id = metadata.get('file_id')
-        original_file_name = metadata.get('original_name')
-        file_creation_timestamp = metadata.get('timestamp')
-        original_file_size = metadata.get('file_size')
-        mime_type = metadata.get('file_type')
-
-        # Convert datetime strings to datetime objects if needed
-        if purchase_datetime and isinstance(purchase_datetime, str):
-            try:
-                purchase_datetime = datetime.strptime(purchase_datetime, '%Y-%m-%d %H:%M:%S')
-            except:
-                purchase_datetime = None
-
-        if file_creation_timestamp and isinstance(file_creation_timestamp, str):
-            try:
-                # Handle ISO format with timezone: 2025-09-07T19:33:00+02:00
-                # Remove timezone info for MySQL compatibility
-                timestamp_clean = re.sub(r'[+-]\d{2}:\d{2}$', '', file_creation_timestamp)
-                file_creation_timestamp = datetime.fromisoformat(timestamp_clean.replace('T', ' '))
-            except:
-                file_creation_timestamp = None
-
+        file_category = _get_file_category(_get_file_suffix(filename))
         with db_cursor() as cur:
             cur.execute(
-                """
-                INSERT INTO unified_files (
-                    id, file_type, created_at,
-                    file_category, file_suffix,
-                    merchant_name, orgnr, purchase_datetime,
-                    gross_amount, net_amount, original_filename,
-                    original_file_id, original_file_name, file_creation_timestamp,
-                    original_file_size, mime_type
-                ) VALUES (
-                    %s, %s, NOW(),
-                    %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s
-                )
-                """,
-                (
-                    file_id, "receipt",
-                    file_category, file_suffix,
-                    merchant_name, orgnr, purchase_datetime,
-                    gross_amount, net_amount, filename,
-                    original_file_id, original_file_name, file_creation_timestamp,
-                    original_file_size, mime_type
-                )
+                UNIFIED_FILE_INSERT_SQL,
+                _unified_file_row(file_id, filename, metadata, file_category, content_hash=content_hash),
             )
             logger.info(f"Inserted unified_file {file_id} with metadata")
+        return True
     except Exception as e:
+        if is_duplicate_entry(e):
+            raise
         logger.error(f"Error inserting unified file: {e}")
+        return False
 
 
 def _insert_file_location(file_id: str, location: Dict[str, Any]) -> None:
@@ -166,27 +217,11 @@ def _insert_file_location(file_id: str, location: Dict[str, Any]) -> None:
         return
 
     try:
-        # Try new JSON format first (latitude/longitude)
-        lat = location.get('latitude') or location.get('lat')
-        lon = location.get('longitude') or location.get('lon')
-        acc = location.get('acc')
-
-        # Convert string coordinates to float if needed
-        if isinstance(lat, str):
-            lat = float(lat)
-        if isinstance(lon, str):
-            lon = float(lon)
-
-        if lat is not None and lon is not None:
+        row = _location_row(file_id, location)
+        if row is not None:
             with db_cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO file_locations (file_id, lat, lon, acc, created_at)
-                    VALUES (%s, %s, %s, %s, NOW())
-                    """,
-                    (file_id, lat, lon, acc)
-                )
-            logger.info(f"Inserted location for file {file_id}: lat={lat}, lon={lon}")
+                cur.execute(FILE_LOCATION_INSERT_SQL, row)
+            logger.info(f"Inserted location for file {file_id}: lat={row[1]}, lon={row[2]}")
     except Exception as e:
         logger.error(f"Error inserting file location: {e}")
 
@@ -202,13 +237,7 @@ def _insert_file_tags(file_id: str, tags: List[Any]) -> None:
                 try:
                     # Convert tag ID to string if it's numeric
                     tag_str = str(tag)
-                    cur.execute(
-                        """
-                        INSERT INTO file_tags (file_id, tag, created_at)
-                        VALUES (%s, %s, NOW())
-                        """,
-                        (file_id, tag_str)
-                    )
+                    cur.execute(FILE_TAG_INSERT_SQL, (file_id, tag_str))
                 except Exception as e:
                     logger.warning(f"Could not insert tag {tag} for file {file_id}: {e}")
         logger.info(f"Inserted {len(tags)} tags for file {file_id}")
@@ -221,6 +250,22 @@ def _storage() -> FileStorage:
     return FileStorage(base)
 
 
+def _move_processed(p: Path, move_dir: Optional[str]) -> None:
+    """Move an ingested inbox file (and its JSON metadata) to ``move_dir`` if configured."""
+    if not move_dir:
+        return
+    dst_dir = Path(move_dir)
+    dst_dir.mkdir(parents=True, exist_ok=True)
+
+    # Move the file
+    p.rename(dst_dir / p.name)
+
+    # Move the JSON metadata file if it exists
+    json_path = Path(str(p) + '.json')
+    if json_path.exists():
+        json_path.rename(dst_dir / json_path.name)
+
+
 def fetch_from_local_inbox() -> FetchResult:
     """Fetch files from local inbox directory with metadata support"""
     inbox = os.getenv("FTP_LOCAL_DIR")
@@ -237,6 +282,7 @@ def fetch_from_local_inbox() -> FetchResult:
     downloaded: List[Tuple[str, str]] = []
     skipped: List[str] = []
     errors: List[str] = []
+    duplicates: List[Tuple[str, str]] = []
     fs = _storage()
 
     # Process files (skip JSON metadata files)
@@ -254,212 +300,489 @@ def fetch_from_local_inbox() -> FetchResult:
 
         try:
             file_id = str(uuid.uuid4())
-            data = p.read_bytes()
 
             # Load metadata from JSON file if it exists
             metadata = _load_metadata(p)
 
-            # Save file to storage
-            fs.save(file_id, p.name, data)
+            # Save file to storage, hashing it on the way
+            with p.open("rb") as src, fs.writer(file_id, p.name) as dst:
+                content_hash = copy_hashing(src, dst)
 
-            # Insert file record with metadata
-            _insert_unified_file(file_id, p.name, metadata)
+            _fresh, dups = split_duplicates([(file_id, content_hash)])
+            if dups:
+                fs.purge(file_id)
+                duplicates.append((p.name, dups[0][1]))
+                logger.info(f"LOCAL DEBUG: {p.name} duplicates {dups[0][1]}, not ingested again")
+            else:
+                # Insert file record with metadata
+                try:
+                    inserted = _insert_unified_file(file_id, p.name, metadata, content_hash)
+                except Exception as e:
+                    original = existing_for(e, content_hash)
+                    if original is None:
+                        raise
+                    fs.purge(file_id)
+                    duplicates.append((p.name, original))
+                    logger.info(f"LOCAL DEBUG: {p.name} duplicates {original}, not ingested again")
+                    _move_processed(p, move_dir)
+                    continue
+                if not inserted:
+                    # Keep the inbox file so the next poll retries it
+                    fs.purge(file_id)
+                    errors.append(f"{p.name}: could not record file")
+                    continue
 
-            # Insert location data if available
-            if 'location' in metadata:
-                _insert_file_location(file_id, metadata['location'])
+                # Insert location data if available
+                if 'location' in metadata:
+                    _insert_file_location(file_id, metadata['location'])
 
-            # Insert tags if available
-            if 'tags' in metadata:
-                _insert_file_tags(file_id, metadata['tags'])
+                # Insert tags if available
+                if 'tags' in metadata:
+                    _insert_file_tags(file_id, metadata['tags'])
 
-            # Set AI status and trigger OCR automatically
-            set_ai_status(file_id, "new")
+                # Set AI status and trigger OCR automatically
+                set_ai_status(file_id, "new")
 
-            # Auto-trigger OCR processing
-            try:
-                from services.tasks import process_ocr
-                if process_ocr is not None:
-                    set_ai_status(file_id, "queued")
-                    process_ocr.delay(file_id)
-                    logger.info(f"LOCAL DEBUG: OCR queued for {p.name}")
-            except Exception as e:
-                logger.warning(f"LOCAL DEBUG: Could not queue OCR for {p.name}: {e}")
+                # Auto-trigger OCR processing
+                try:
+                    from services.tasks import process_ocr
+                    if process_ocr is not None:
+                        set_ai_status(file_id, "queued")
+                        process_ocr.delay(file_id)
+                        logger.info(f"LOCAL DEBUG: OCR queued for {p.name}")
+                except Exception as e:
+                    logger.warning(f"LOCAL DEBUG: Could not queue OCR for {p.name}: {e}")
 
-            downloaded.append((file_id, p.name))
+                downloaded.append((file_id, p.name))
 
             # Move files if configured
-            if move_dir:
-                dst_dir = Path(move_dir)
-                dst_dir.mkdir(parents=True, exist_ok=True)
-
-                # Move the file
-                p.rename(dst_dir / p.name)
-
-                # Move the JSON metadata file if it exists
-                json_path = Path(str(p) + '.json')
-                if json_path.exists():
-                    json_path.rename(dst_dir / json_path.name)
+            _move_processed(p, move_dir)
 
         except Exception as e:
             errors.append(f"{p.name}: {e}")
 
-    return FetchResult(downloaded=downloaded, skipped=skipped, errors=errors)
+    return FetchResult(downloaded=downloaded, skipped=skipped, errors=errors, duplicates=duplicates)
 
 
-def fetch_from_ftp() -> FetchResult:
-    """Fetch files from FTP server with metadata support"""
-    host = os.getenv("FTP_HOST")
-    logger.info(f"FTP DEBUG: Starting fetch_from_ftp, host={host}")
+@dataclass
+class FtpConfig:
+    host: Optional[str]
+    port: int = 21
+    user: str = "anonymous"
+    password: str = "anonymous@"
+    passive: bool = True
+    remote_dir: str = "/"
+    use_tls: bool = False
+    allowed_exts: List[str] = field(default_factory=lambda: ["pdf", "jpg", "jpeg", "png"])
+    delete_after: bool = False
+    sessions: int = 4
+    blocksize: int = 64 * 1024
+    incremental: bool = True
+
+    @property
+    def source(self) -> str:
+        """Manifest key for this server directory."""
+        return f"{self.host}:{self.port}{self.remote_dir or '/'}"
+
+    @classmethod
+    def from_env(cls) -> "FtpConfig":
+        try:
+            sessions = max(int(os.getenv("FTP_SESSIONS", "4")), 1)
+        except ValueError:
+            sessions = 4
+        return cls(
+            host=os.getenv("FTP_HOST"),
+            port=int(os.getenv("FTP_PORT", "21")),
+            user=os.getenv("FTP_USER", "anonymous"),
+            password=os.getenv("FTP_PASS", "anonymous@"),
+            passive=os.getenv("FTP_PASSIVE", "true").lower() not in {"false", "0", "no"},
+            remote_dir=os.getenv("FTP_REMOTE_DIR", "/"),
+            use_tls=os.getenv("FTP_TLS", "false").lower() in {"1", "true", "yes"},
+            allowed_exts=[e.strip() for e in (os.getenv("FTP_ALLOWED_EXT", "pdf,jpg,jpeg,png").split(",")) if e.strip()],
+            delete_after=os.getenv("FTP_DELETE_AFTER", "false").lower() in {"1", "true", "yes"},
+            sessions=sessions,
+            incremental=os.getenv("FTP_SYNC_MODE", "incremental").lower() != "full",
+        )
+
+
+def _connect(cfg: FtpConfig) -> FTP:
+    """Open, log in and cwd one FTP session."""
+    if cfg.use_tls:
+        ftp: FTP = FTP_TLS()
+        ftp.context = ssl.create_default_context()  # type: ignore[attr-defined]
+    else:
+        ftp = FTP()
+    try:
+        ftp.connect(host=cfg.host or "", port=cfg.port, timeout=20)
+        ftp.login(user=cfg.user, passwd=cfg.password)
+        if cfg.use_tls and isinstance(ftp, FTP_TLS):
+            ftp.prot_p()
+        ftp.set_pasv(cfg.passive)
+        if cfg.remote_dir:
+            ftp.cwd(cfg.remote_dir)
+    except Exception:
+        _quit(ftp)
+        raise
+    return ftp
 
-    if not host:
-        logger.info("FTP DEBUG: No host configured, falling back to local inbox mode")
-        return fetch_from_local_inbox()
 
-    port = int(os.getenv("FTP_PORT", "21"))
-    user = os.getenv("FTP_USER", "anonymous")
-    password = os.getenv("FTP_PASS", "anonymous@")
-    passive = os.getenv("FTP_PASSIVE", "true").lower() not in {"false", "0", "no"}
-    remote_dir = os.getenv("FTP_REMOTE_DIR", "/")
-    use_tls = os.getenv("FTP_TLS", "false").lower() in {"1", "true", "yes"}
-    allowed_exts = [e.strip() for e in (os.getenv("FTP_ALLOWED_EXT", "pdf,jpg,jpeg,png").split(",")) if e.strip()]
-    delete_after = os.getenv("FTP_DELETE_AFTER", "false").lower() in {"1", "true", "yes"}
+def _quit(ftp: FTP) -> None:
+    try:
+        ftp.quit()
+    except Exception:
+        try:
+            ftp.close()
+        except Exception:
+            pass
 
-    logger.info(f"FTP DEBUG: Config - host={host}, port={port}, user={user}, remote_dir={remote_dir}")
-    logger.info(f"FTP DEBUG: Config - use_tls={use_tls}, passive={passive}, allowed_exts={allowed_exts}")
 
-    downloaded: List[Tuple[str, str]] = []
-    skipped: List[str] = []
-    errors: List[str] = []
-    metadata_cache: Dict[str, Dict[str, Any]] = {}
+class FtpSessions:
+    """One FTP session per thread, opened on first use and reused for every transfer."""
+
+    def __init__(self, cfg: FtpConfig) -> None:
+        self.cfg = cfg
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open: List[FTP] = []
+
+    def get(self) -> FTP:
+        ftp = getattr(self._local, "ftp", None)
+        if ftp is None:
+            ftp = _connect(self.cfg)
+            self._local.ftp = ftp
+            with self._lock:
+                self._open.append(ftp)
+        return ftp
+
+    def reset(self) -> None:
+        """Drop this thread's session (after a transfer error) so the next get() reconnects."""
+        ftp = getattr(self._local, "ftp", None)
+        self._local.ftp = None
+        if ftp is not None:
+            with self._lock:
+                if ftp in self._open:
+                    self._open.remove(ftp)
+            _quit(ftp)
+
+    def call(self, fn):
+        """Run ``fn(ftp)`` on this thread's session, reconnecting once on a connection error."""
+        try:
+            return fn(self.get())
+        except error_perm:
+            raise
+        except all_errors:
+            self.reset()
+            return fn(self.get())
 
-    fs = _storage()
-    ftp = None
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._open = self._open, []
+        for ftp in sessions:
+            _quit(ftp)
+
+
+# name -> (size, modification time as sent by the server)
+RemoteEntry = Tuple[Optional[int], Optional[str]]
+
+
+def _stat(ftp: FTP, name: str) -> RemoteEntry:
+    """SIZE and MDTM for one file, for servers without MLSD; either may be None."""
+    size: Optional[int] = None
+    modified: Optional[str] = None
     try:
-        logger.info("FTP DEBUG: Creating FTP connection...")
-        if use_tls:
-            ftp = FTP_TLS()
-            ftp.context = ssl.create_default_context()
-            logger.info("FTP DEBUG: Using FTP_TLS")
-        else:
-            ftp = FTP()
-            logger.info("FTP DEBUG: Using regular FTP")
-
-        logger.info(f"FTP DEBUG: Connecting to {host}:{port}")
-        ftp.connect(host=host, port=port, timeout=20)
-        logger.info("FTP DEBUG: Connection established, attempting login...")
-
-        ftp.login(user=user, passwd=password)
-        logger.info("FTP DEBUG: Login successful")
-
-        if use_tls and isinstance(ftp, FTP_TLS):
-            logger.info("FTP DEBUG: Setting TLS protection mode")
-            ftp.prot_p()
+        ftp.voidcmd("TYPE I")
+        size = ftp.size(name)
+    except all_errors:
+        pass
+    try:
+        modified = ftp.sendcmd(f"MDTM {name}").split()[-1]
+    except all_errors:
+        pass
+    return size, modified
+
+
+def _list_remote(sessions: FtpSessions) -> Tuple[Dict[str, RemoteEntry], bool]:
+    """One directory listing; returns ``({name: (size, modified)}, has_facts)``.
+
+    MLSD carries size and modification time for every file in one round trip.
+    Servers without it fall back to NLST, where the facts have to be fetched per
+    file (see _stat) and ``has_facts`` is False.
+    """
+    def mlsd(ftp: FTP) -> Dict[str, RemoteEntry]:
+        entries: Dict[str, RemoteEntry] = {}
+        for name, facts in ftp.mlsd(facts=["type", "size", "modify"]):
+            if facts.get("type", "file").lower() != "file":
+                continue
+            size = facts.get("size")
+            entries[name] = (int(size) if size and size.isdigit() else None, facts.get("modify"))
+        return entries
 
-        ftp.set_pasv(passive)
-        logger.info(f"FTP DEBUG: Set passive mode to {passive}")
+    try:
+        return sessions.call(mlsd), True
+    except error_perm as e:
+        logger.info(f"FTP DEBUG: MLSD not supported ({e}), using NLST")
+    return {name: (None, None) for name in sessions.call(lambda ftp: ftp.nlst())}, False
 
-        if remote_dir:
-            logger.info(f"FTP DEBUG: Changing to directory: {remote_dir}")
-            ftp.cwd(remote_dir)
-            logger.info(f"FTP DEBUG: Successfully changed to directory: {remote_dir}")
 
-        logger.info("FTP DEBUG: Getting file list...")
-        names = ftp.nlst()
-        logger.info(f"FTP DEBUG: Found {len(names)} files: {names[:10]}...")
+def _changed(entry: RemoteEntry, known: Optional[RemoteEntry]) -> bool:
+    if known is None:
+        return True
+    # Without any facts on either side the name alone says "already synced".
+    return entry != known and any(value is not None for value in entry)
 
-        # First, download all JSON metadata files
-        for name in names:
-            if name.lower().endswith('.json'):
-                try:
-                    buf = bytearray()
-                    ftp.retrbinary(f"RETR {name}", buf.extend)
-                    metadata = json.loads(buf.decode('utf-8'))
-                    base_name = name[:-5]  # Remove .json extension
-                    metadata_cache[base_name] = metadata
-                    logger.info(f"FTP DEBUG: Loaded metadata for {base_name}")
-                except Exception as e:
-                    logger.error(f"FTP DEBUG: Error loading metadata {name}: {e}")
 
-        # Process actual files
-        for name in names:
-            logger.info(f"FTP DEBUG: Checking file: {name}")
+def _fetch_one(
+    sessions: FtpSessions, fs: FileStorage, name: str, has_metadata: bool
+) -> Tuple[str, Dict[str, Any], str]:
+    """Read ``name``'s JSON metadata (if listed), then stream the file into storage under a new id.
 
-            # Skip JSON metadata files
-            if name.lower().endswith('.json'):
-                continue
+    Returns ``(file_id, metadata, content_hash)``; the hash is computed as the bytes arrive.
+    """
+    metadata: Dict[str, Any] = {}
+    if has_metadata:
+        def read_metadata(ftp: FTP) -> bytes:
+            buf = bytearray()
+            ftp.retrbinary(f"RETR {name}.json", buf.extend)
+            return bytes(buf)
 
-            if not _allowed(name, allowed_exts):
-                logger.info(f"FTP DEBUG: SKIPPED (extension): {name}")
-                skipped.append(name)
-                continue
+        try:
+            metadata = json.loads(sessions.call(read_metadata).decode('utf-8'))
+        except Exception as e:
+            logger.error(f"FTP DEBUG: Error loading metadata {name}.json: {e}")
 
-            logger.info(f"FTP DEBUG: ALLOWED: {name}")
+    file_id = str(uuid.uuid4())
+
+    def retrieve(ftp: FTP) -> str:
+        with fs.writer(file_id, name) as fh:
+            writer = HashingWriter(fh)
+            ftp.retrbinary(f"RETR {name}", writer.write, blocksize=sessions.cfg.blocksize)
+        return writer.hexdigest()
+
+    return file_id, metadata, sessions.call(retrieve)
+
+
+def _file_categories() -> Dict[str, Optional[int]]:
+    """file_suffix.file_ending -> file_type, read once per fetch cycle."""
+    if db_cursor is None:
+        return {}
+    try:
+        with db_cursor() as cur:
+            cur.execute("SELECT LOWER(file_ending), file_type FROM file_suffix")
+            return {str(ending): file_type for ending, file_type in cur.fetchall() or []}
+    except Exception as e:
+        logger.error(f"Error loading file categories: {e}")
+        return {}
+
+
+def _ingest_batch(
+    files: List[Tuple[str, str, Dict[str, Any], Optional[str]]], ai_status: str
+) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """Insert unified_files, file_locations and file_tags for a fetch cycle in one transaction.
+
+    If the batch fails (one bad row), rows are retried one file at a time so the
+    rest of the cycle is still recorded. Returns ``(duplicates, failed)``: files that
+    lost the content_hash unique index as ``(file_id, existing_id)``, and ids whose
+    row could not be written. Neither has a unified_files row of its own.
+    """
+    duplicates: List[Tuple[str, str]] = []
+    failed: List[str] = []
+    if db_cursor is None or not files:
+        return duplicates, failed
+    categories = _file_categories()
+    file_rows = []
+    location_rows = []
+    tag_rows = []
+    for file_id, name, metadata, content_hash in files:
+        file_rows.append(
+            _unified_file_row(file_id, name, metadata, categories.get(_get_file_suffix(name)), ai_status, content_hash)
+        )
+        try:
+            location = _location_row(file_id, metadata.get('location') or {})
+        except Exception as e:
+            logger.warning(f"Ignoring location for file {file_id}: {e}")
+            location = None
+        if location is not None:
+            location_rows.append(location)
+        tag_rows.extend((file_id, str(tag)) for tag in metadata.get('tags') or [])
+    try:
+        with db_transaction():
+            with db_cursor() as cur:
+                cur.executemany(UNIFIED_FILE_INSERT_SQL, file_rows)
+                if location_rows:
+                    cur.executemany(FILE_LOCATION_INSERT_SQL, location_rows)
+                if tag_rows:
+                    cur.executemany(FILE_TAG_INSERT_SQL, tag_rows)
+        logger.info(f"Inserted {len(file_rows)} files, {len(location_rows)} locations, {len(tag_rows)} tags")
+    except Exception as e:
+        logger.error(f"Batch insert of {len(file_rows)} files failed, inserting one by one: {e}")
+        for file_id, name, metadata, content_hash in files:
             try:
-                file_id = str(uuid.uuid4())
-                logger.info(f"FTP DEBUG: Downloading {name} with file_id {file_id}")
-                buf = bytearray()
-                ftp.retrbinary(f"RETR {name}", buf.extend)
-                logger.info(f"FTP DEBUG: Downloaded {len(buf)} bytes for {name}")
+                inserted = _insert_unified_file(file_id, name, metadata, content_hash)
+            except Exception as dup:
+                original = existing_for(dup, content_hash)
+                if original is None:
+                    failed.append(file_id)
+                else:
+                    duplicates.append((file_id, original))
+                continue
+            if not inserted:
+                failed.append(file_id)
+                continue
+            if 'location' in metadata:
+                _insert_file_location(file_id, metadata['location'])
+            if 'tags' in metadata:
+                _insert_file_tags(file_id, metadata['tags'])
+            set_ai_status(file_id, ai_status)
+    return duplicates, failed
 
-                # Get metadata if available
-                metadata = metadata_cache.get(name, {})
 
-                # Save file to storage
-                fs.save(file_id, name, bytes(buf))
+def _delete_remote(sessions: FtpSessions, names: List[str]) -> None:
+    for name in names:
+        try:
+            sessions.call(lambda ftp: ftp.delete(name))
+            logger.info(f"FTP DEBUG: Deleted {name} from FTP server")
+        except error_perm:
+            logger.info(f"FTP DEBUG: Could not delete {name} - permission denied")
+        except Exception as e:
+            logger.warning(f"FTP DEBUG: Could not delete {name}: {e}")
 
-                # Insert file record with metadata
-                _insert_unified_file(file_id, name, metadata)
 
-                # Insert location data if available
-                if 'location' in metadata:
-                    _insert_file_location(file_id, metadata['location'])
+def fetch_from_ftp() -> FetchResult:
+    """Fetch files from FTP server with metadata support.
 
-                # Insert tags if available
-                if 'tags' in metadata:
-                    _insert_file_tags(file_id, metadata['tags'])
+    Files are downloaded in parallel over ``FTP_SESSIONS`` reused sessions and
+    streamed straight to their storage path; the database rows for the whole
+    cycle are written in one batch afterwards, then OCR is queued.
 
-                # Set AI status and trigger OCR automatically
-                set_ai_status(file_id, "new")
+    In incremental mode (``FTP_SYNC_MODE``, default) one MLSD listing is compared
+    with the ``ftp_manifest`` table and only new or changed files are fetched, each
+    with its ``.json`` metadata; ``full`` fetches every listed file.
+    """
+    cfg = FtpConfig.from_env()
+    logger.info(f"FTP DEBUG: Starting fetch_from_ftp, host={cfg.host}")
 
-                # Auto-trigger OCR processing
+    if not cfg.host:
+        logger.info("FTP DEBUG: No host configured, falling back to local inbox mode")
+        return fetch_from_local_inbox()
+
+    logger.info(f"FTP DEBUG: Config - host={cfg.host}, port={cfg.port}, user={cfg.user}, remote_dir={cfg.remote_dir}")
+    logger.info(
+        f"FTP DEBUG: Config - use_tls={cfg.use_tls}, passive={cfg.passive}, "
+        f"allowed_exts={cfg.allowed_exts}, sessions={cfg.sessions}, incremental={cfg.incremental}"
+    )
+
+    downloaded: List[Tuple[str, str]] = []
+    skipped: List[str] = []
+    errors: List[str] = []
+    duplicates: List[Tuple[str, str]] = []
+
+    manifest: Optional[Dict[str, RemoteEntry]] = None
+    if cfg.incremental and manifest_store is not None:
+        try:
+            manifest = manifest_store.load(cfg.source)
+        except Exception as e:
+            logger.warning(f"FTP DEBUG: Manifest unavailable, fetching everything: {e}")
+
+    fs = _storage()
+    sessions = FtpSessions(cfg)
+    try:
+        listing, has_facts = _list_remote(sessions)
+        logger.info(f"FTP DEBUG: Found {len(listing)} files: {list(listing)[:10]}...")
+
+        candidates: List[str] = []
+        for name in listing:
+            # Skip JSON metadata files
+            if name.lower().endswith('.json'):
+                continue
+            if not _allowed(name, cfg.allowed_exts):
+                skipped.append(name)
+                continue
+            candidates.append(name)
+
+        with ThreadPoolExecutor(max_workers=cfg.sessions, thread_name_prefix="ftp-fetch") as pool:
+            if manifest is not None and not has_facts:
+                # NLST only: size and time have to be asked for file by file.
+                stats = pool.map(lambda name: sessions.call(lambda ftp: _stat(ftp, name)), candidates)
+                listing.update(zip(candidates, stats))
+            targets = candidates
+            if manifest is not None:
+                targets = [name for name in candidates if _changed(listing[name], manifest.get(name))]
+                logger.info(f"FTP DEBUG: {len(candidates) - len(targets)} unchanged, {len(targets)} new or changed")
+
+            futures = {
+                name: pool.submit(_fetch_one, sessions, fs, name, f"{name}.json" in listing)
+                for name in targets
+            }
+            received: List[Tuple[str, str, Dict[str, Any], str]] = []
+            for name, future in futures.items():
                 try:
-                    from services.tasks import process_ocr
-                    if process_ocr is not None:
-                        set_ai_status(file_id, "queued")
-                        process_ocr.delay(file_id)
-                        logger.info(f"FTP DEBUG: OCR queued for {name}")
+                    file_id, metadata, content_hash = future.result()
                 except Exception as e:
-                    logger.warning(f"FTP DEBUG: Could not queue OCR for {name}: {e}")
+                    logger.error(f"FTP DEBUG: Error processing {name}: {e}")
+                    errors.append(f"{name}: {e}")
+                    continue
+                received.append((file_id, name, metadata, content_hash))
+        logger.info(f"FTP DEBUG: Downloaded {len(received)} files over {cfg.sessions} sessions")
+
+        # Files whose bytes were already ingested are linked to the existing row, not stored twice.
+        names = {file_id: name for file_id, name, _, _ in received}
+        fresh, dups = split_duplicates([(file_id, content_hash) for file_id, _, _, content_hash in received])
+        fresh_ids = {file_id for file_id, _ in fresh}
+        fetched = [item for item in received if item[0] in fresh_ids]
+        for file_id, original in dups:
+            fs.purge(file_id)
+            duplicates.append((names[file_id], original))
+        if dups:
+            logger.info(f"FTP DEBUG: {len(dups)} duplicates of already ingested files")
 
-                downloaded.append((file_id, name))
-                logger.info(f"FTP DEBUG: Successfully saved {name}")
-
-                if delete_after:
-                    try:
-                        ftp.delete(name)
-                        # Also delete metadata file if it exists
-                        if name in metadata_cache:
-                            try:
-                                ftp.delete(name + '.json')
-                            except:
-                                pass
-                        logger.info(f"FTP DEBUG: Deleted {name} from FTP server")
-                    except error_perm:
-                        logger.info(f"FTP DEBUG: Could not delete {name} - permission denied")
+        try:
+            from services.tasks import process_ocr
+        except Exception as e:
+            logger.warning(f"FTP DEBUG: Could not load OCR task: {e}")
+            process_ocr = None  # type: ignore
+
+        late_dups, failed = _ingest_batch(fetched, "queued" if process_ocr is not None else "new")
+        # Lost the unique-index race to a concurrent ingest, or could not be recorded at all
+        unrecorded = set(failed) | {file_id for file_id, _ in late_dups}
+        for file_id, original in late_dups:
+            fs.purge(file_id)
+            duplicates.append((names[file_id], original))
+        for file_id in failed:
+            fs.purge(file_id)
+            errors.append(f"{names[file_id]}: could not record file")
+        fetched = [item for item in fetched if item[0] not in unrecorded]
+        for file_id, name, _metadata, _hash in fetched:
+            # Auto-trigger OCR processing
+            if process_ocr is not None:
+                try:
+                    process_ocr.delay(file_id)
+                except Exception as e:
+                    logger.warning(f"FTP DEBUG: Could not queue OCR for {name}: {e}")
+            downloaded.append((file_id, name))
+
+        if cfg.delete_after:
+            remove: List[str] = []
+            for name in [name for _, name, _, _ in fetched] + [name for name, _ in duplicates]:
+                remove.append(name)
+                # Also delete metadata file if it exists
+                if f"{name}.json" in listing:
+                    remove.append(name + '.json')
+            _delete_remote(sessions, remove)
+        elif manifest is not None:
+            try:
+                manifest_store.record(
+                    cfg.source,
+                    [(name, listing[name][0], listing[name][1], file_id) for file_id, name, _, _ in fetched]
+                    + [(name, listing[name][0], listing[name][1], original) for name, original in duplicates],
+                )
             except Exception as e:
-                logger.error(f"FTP DEBUG: Error processing {name}: {e}")
-                errors.append(f"{name}: {e}")
+                logger.error(f"FTP DEBUG: Could not update manifest: {e}")
     except Exception as e:
         logger.error(f"FTP DEBUG: Connection error: {e}")
         errors.append(str(e))
     finally:
-        try:
-            if ftp is not None:
-                logger.info("FTP DEBUG: Closing FTP connection")
-                ftp.quit()
-        except Exception:
-            pass
+        logger.info("FTP DEBUG: Closing FTP connections")
+        sessions.close()
 
     logger.info(f"FTP DEBUG: Fetch complete - downloaded: {len(downloaded)}, skipped: {len(skipped)}, errors: {len(errors)}")
-    return FetchResult(downloaded=downloaded, skipped=skipped, errors=errors)
\ No newline at end of file
+    return FetchResult(downloaded=downloaded, skipped=skipped, errors=errors, duplicates=duplicates)
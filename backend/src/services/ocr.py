@@ -1,24 +1,42 @@
 from __future__ import annotations
 
+import io
 import json
+import multiprocessing
 import os
-import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from decimal import Decimal, InvalidOperation
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
 except Exception:  # pragma: no cover
     Image = None  # type: ignore
+    ImageOps = None  # type: ignore
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
 
 try:
     from paddleocr import PaddleOCR  # type: ignore
 except Exception:  # pragma: no cover
     PaddleOCR = None  # type: ignore
 
+from services.ocr_cache import content_hash, get_ocr_cache
+from services.ocr_fields import extract_fields
+from services.ocr_preprocess import PreprocessOptions, prepare_page
+
 
 _OCR_ENGINE: Optional["PaddleOCR"] = None
+_ENGINE_LOCK = threading.Lock()
+_ENGINE_WARM = False
+_ENGINE_SIGNATURE: Optional[str] = None
 
 
 def _receipt_dir(base: str | Path, receipt_id: str) -> Path:
@@ -52,7 +70,11 @@ def _get_ocr_engine() -> Optional["PaddleOCR"]:
     logger = logging.getLogger(__name__)
 
     global _OCR_ENGINE
-    if _OCR_ENGINE is None and PaddleOCR is not None:
+    if _OCR_ENGINE is not None or PaddleOCR is None:
+        return _OCR_ENGINE
+    with _ENGINE_LOCK:
+        if _OCR_ENGINE is not None:
+            return _OCR_ENGINE
         lang = os.getenv("OCR_LANG", "sv+en")
         use_angle_cls = os.getenv("OCR_USE_ANGLE_CLS", "true").lower() in ("true", "1", "t")
         show_log = os.getenv("OCR_SHOW_LOG", "false").lower() in ("true", "1", "t")
@@ -71,120 +93,335 @@ def _get_ocr_engine() -> Optional["PaddleOCR"]:
     return _OCR_ENGINE
 
 
-def _extract_text_from_images(images: List[Path]) -> Dict[str, Any]:
+def _ready_file() -> Optional[Path]:
+    path = os.getenv("OCR_READY_FILE", "")
+    return Path(path) if path else None
+
+
+def clear_ocr_ready() -> None:
+    """Remove a stale readiness marker left by a previous worker run."""
+    path = _ready_file()
+    if path is not None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception:
+            pass
+
+
+def ocr_engine_ready() -> bool:
+    return _ENGINE_WARM
+
+
+def warm_ocr_engine(run_inference: bool = True) -> bool:
+    """Load the OCR engine ahead of the first task and mark the process ready.
+
+    ``run_inference`` pushes one tiny blank page through the engine so lazily
+    initialised predictor state is built too. Skip it when warming in a parent
+    process that is about to fork: only the read-only weights should be shared
+    with the children, not any inference threads.
+
+    Once a page has been through the engine, readiness is exposed through
+    :func:`ocr_engine_ready` and, when OCR_READY_FILE is set, by touching that
+    file (used as a container healthcheck).
+    """
     import logging
     logger = logging.getLogger(__name__)
 
-    full_text: List[str] = []
-    boxes: List[Dict[str, Any]] = []
-
+    global _ENGINE_WARM
+    started = time.monotonic()
     engine = _get_ocr_engine()
-    if not images or Image is None:
-        logger.warning(f"OCR: No images or PIL not available. Images: {len(images) if images else 0}")
-        return {"text": "", "boxes": []}
-
     if engine is None:
-        logger.error("OCR: PaddleOCR engine not available - cannot process images")
-        return {"text": "", "boxes": []}
+        logger.warning("OCR: warm-up skipped, PaddleOCR engine not available")
+        return False
+    if run_inference:
+        if np is not None:
+            _ocr_batch(engine, [np.full((32, 96, 3), 255, dtype=np.uint8)])
+        _ENGINE_WARM = True
+        path = _ready_file()
+        if path is not None:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.touch()
+            except Exception as e:
+                logger.warning(f"OCR: could not write readiness file {path}: {e}")
+    logger.info(f"OCR: engine warm in {time.monotonic() - started:.2f}s (inference={run_inference})")
+    return True
 
-    logger.info(f"OCR: Processing {len(images)} images")
-    for img_path in images:
-        logger.info(f"OCR: Processing image {img_path}")
+
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_EXECUTOR_PID: Optional[int] = None
+_EXECUTOR_LOCK = threading.Lock()
+_EXECUTOR_DISABLED = False
+
+
+def ocr_executor_workers() -> int:
+    """OCR_EXECUTOR_WORKERS: size of the dedicated OCR process pool (0 = OCR inline in the task)."""
+    if _EXECUTOR_DISABLED:
+        return 0
+    try:
+        return max(int(os.getenv("OCR_EXECUTOR_WORKERS", "0")), 0)
+    except ValueError:
+        return 0
+
+
+def _parse_cpus(spec: str) -> List[int]:
+    cpus: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def _executor_cpus(workers: int) -> List[int]:
+    """Cores the OCR executor is pinned to: OCR_EXECUTOR_CPUS, else the first ``workers`` allowed cores."""
+    spec = os.getenv("OCR_EXECUTOR_CPUS", "")
+    try:
+        if spec:
+            return _parse_cpus(spec)
+    except ValueError:
+        pass
+    if not hasattr(os, "sched_getaffinity"):
+        return []
+    return sorted(os.sched_getaffinity(0))[:workers]
+
+
+def _init_executor_process(cpus: List[int]) -> None:
+    if cpus and hasattr(os, "sched_setaffinity"):
         try:
-            with Image.open(img_path) as image:
-                width, height = image.size
-                logger.info(f"OCR: Image size {width}x{height}")
+            os.sched_setaffinity(0, cpus)
+        except OSError:
+            pass
+    warm_ocr_engine(run_inference=True)
+
+
+def _executor_ping() -> int:
+    return os.getpid()
+
+
+def _ocr_executor() -> Optional[ProcessPoolExecutor]:
+    """Return the process-wide OCR executor, or ``None`` when OCR runs inline.
+
+    The executor decouples OCR parallelism from the Celery pool: run the OCR worker
+    with ``--pool=threads`` and many slots, and every slot hands its pages to the
+    same N pinned processes while the thread itself is free for DB/Redis I/O.
+    Processes are spawned (not forked) so they never inherit worker threads or sockets.
+    """
+    global _EXECUTOR, _EXECUTOR_PID
+    workers = ocr_executor_workers()
+    if workers <= 0:
+        return None
+    if _EXECUTOR is not None and _EXECUTOR_PID == os.getpid():
+        return _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None or _EXECUTOR_PID != os.getpid():
+            _EXECUTOR = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_executor_process,
+                initargs=(_executor_cpus(workers),),
+            )
+            _EXECUTOR_PID = os.getpid()
+        return _EXECUTOR
+
+
+def start_ocr_executor(timeout: float = 300.0) -> bool:
+    """Start every executor process (each warms its engine) before the first task arrives."""
+    executor = _ocr_executor()
+    if executor is None:
+        return False
+    futures = [executor.submit(_executor_ping) for _ in range(ocr_executor_workers())]
+    try:
+        for future in futures:
+            future.result(timeout=timeout)
+    except Exception:
+        import logging
+        logging.getLogger(__name__).exception("OCR: executor failed to start")
+        shutdown_ocr_executor()
+        return False
+    return True
+
+
+def disable_ocr_executor() -> None:
+    """Run OCR inline in this process, and in processes forked from it, whatever OCR_EXECUTOR_WORKERS says."""
+    global _EXECUTOR_DISABLED
+    _EXECUTOR_DISABLED = True
+    shutdown_ocr_executor()
+
+
+def shutdown_ocr_executor() -> None:
+    global _EXECUTOR, _EXECUTOR_PID
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR, _EXECUTOR_PID = _EXECUTOR, None, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _engine_signature() -> str:
+    """Identify the OCR engine build and options; part of every OCR cache key."""
+    global _ENGINE_SIGNATURE
+    if _ENGINE_SIGNATURE is None:
+        try:
+            from importlib.metadata import version
+
+            engine_version = version("paddleocr")
+        except Exception:
+            engine_version = "unknown"
+        _ENGINE_SIGNATURE = "paddleocr={};lang={};angle_cls={};prep={}".format(
+            engine_version,
+            os.getenv("OCR_LANG", "sv+en"),
+            os.getenv("OCR_USE_ANGLE_CLS", "true").lower() in ("true", "1", "t"),
+            PreprocessOptions.from_env().signature(),
+        )
+    return _ENGINE_SIGNATURE
+
+
+def _batch_size() -> int:
+    try:
+        return max(int(os.getenv("OCR_BATCH_SIZE", "4")), 1)
+    except ValueError:
+        return 4
+
+
+def _load_page(img_path: Path, data: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+    """Decode and normalise an image once; return the engine input plus its raw pixel size.
+
+    The page goes through the preprocessing stage (EXIF orientation, downscale,
+    grayscale, contrast, optional deskew; see services.ocr_preprocess) and is fed
+    to the engine as a BGR array. ``to_source`` maps engine coordinates back to the
+    oriented original, and width/height stay the raw PIL size used for
+    normalisation, so boxes.json is unchanged by preprocessing.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+    try:
+        source = io.BytesIO(data) if data is not None else img_path
+        with Image.open(source) as image:
+            width, height = image.size
+            logger.info(f"OCR: Image size {width}x{height}")
+            if np is None:
+                return {"path": img_path, "input": str(img_path), "width": width, "height": height}
+            prepared = prepare_page(img_path, image)
+            array = np.asarray(prepared.image.convert("RGB"))[:, :, ::-1]
+            return {
+                "path": img_path,
+                "input": np.ascontiguousarray(array),
+                "width": width,
+                "height": height,
+                "to_source": prepared.to_source,
+            }
+    except Exception as e:
+        logger.error(f"OCR: Failed to open image {img_path}: {e}")
+        return None
+
+
+def _ocr_batch(engine: Any, inputs: List[Any]) -> List[Optional[List[Any]]]:
+    """Run the engine over a batch of pages; returns one raw result list per page."""
+    import logging
+    logger = logging.getLogger(__name__)
+
+    predict = getattr(engine, "predict", None)
+    if callable(predict) and len(inputs) > 1:
+        try:
+            results = list(predict(inputs) or [])
+            if len(results) == len(inputs):
+                return [[item] for item in results]
+            logger.warning(
+                f"OCR: Batched predict returned {len(results)} results for {len(inputs)} pages; retrying per page"
+            )
         except Exception as e:
-            logger.error(f"OCR: Failed to open image {img_path}: {e}")
-            continue
+            logger.warning(f"OCR: Batched predict failed ({e}); retrying per page")
 
+    outputs: List[Optional[List[Any]]] = []
+    for item in inputs:
         try:
-            logger.info(f"OCR: About to call engine.ocr() on {img_path}")
-            ocr_result = engine.ocr(str(img_path)) or []
-            logger.info(f"OCR: Got {len(ocr_result)} results from engine")
+            outputs.append(engine.ocr(item) or [])
         except Exception as e:
-            logger.error(f"OCR: Failed to run OCR on {img_path}: {e}")
+            logger.error(f"OCR: Failed to run OCR on page: {e}")
             import traceback
             logger.error(f"OCR: Full traceback: {traceback.format_exc()}")
-            continue
+            outputs.append(None)
+    return outputs
 
 
+def _parse_page_result(
+    ocr_result: List[Any],
+    width: int,
+    height: int,
+    to_source: Optional[Callable[[float, float], Tuple[float, float]]] = None,
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    full_text: List[str] = []
+    boxes: List[Dict[str, Any]] = []
 
-        def append_detection(text_value, polygon, confidence):
-            if text_value is None or polygon is None:
-                return
-            try:
-                text_str = str(text_value).strip()
-            except Exception:
-                text_str = str(text_value)
-            if not text_str:
-                return
-            points = []
-            for pt in polygon:
-                if isinstance(pt, (list, tuple)) and len(pt) >= 2:
-                    try:
-                        px = float(pt[0])
-                        py = float(pt[1])
-                    except (TypeError, ValueError):
-                        continue
-                    points.append((px, py))
-            if len(points) < 2 or not width or not height:
-                return
-            xs = [p[0] for p in points]
-            ys = [p[1] for p in points]
-            min_x, max_x = min(xs), max(xs)
-            min_y, max_y = min(ys), max(ys)
-            if max_x <= min_x or max_y <= min_y:
-                return
-
-            x_norm = min_x / width
-            y_norm = min_y / height
-            w_norm = (max_x - min_x) / width
-            h_norm = (max_y - min_y) / height
-
-            if width > height:
-                rotated_x = y_norm
-                rotated_y = 1.0 - x_norm - w_norm
-                rotated_w = h_norm
-                rotated_h = w_norm
-                x_norm, y_norm, w_norm, h_norm = rotated_x, rotated_y, rotated_w, rotated_h
-
-            x_norm = max(min(x_norm, 1.0), 0.0)
-            y_norm = max(min(y_norm, 1.0), 0.0)
-            w_norm = max(min(w_norm, 1.0), 0.0)
-            h_norm = max(min(h_norm, 1.0), 0.0)
-
-            full_text.append(text_str)
-            boxes.append(
-                {
-                    "field": text_str,
-                    "confidence": float(confidence) if confidence is not None else None,
-                    "x": x_norm,
-                    "y": y_norm,
-                    "w": w_norm,
-                    "h": h_norm,
-                }
-            )
-
-        for ocr_result_item in ocr_result:
-            handled = False
-            if hasattr(ocr_result_item, 'json'):
-                result_data = getattr(ocr_result_item, 'json', None)
-                if result_data and isinstance(result_data, dict):
-                    res = result_data.get('res')
-                    if isinstance(res, dict):
-                        rec_texts = res.get('rec_texts', [])
-                        rec_polys = res.get('rec_polys', [])
-                        rec_scores = res.get('rec_scores', [])
-                        for i, text_value in enumerate(rec_texts):
-                            if i >= len(rec_polys):
-                                continue
-                            polygon = rec_polys[i]
-                            confidence = rec_scores[i] if i < len(rec_scores) else None
-                            append_detection(text_value, polygon, confidence)
-                        handled = True
-            if not handled and isinstance(ocr_result_item, dict):
-                res = ocr_result_item.get('res')
+    def append_detection(text_value, polygon, confidence):
+        if text_value is None or polygon is None:
+            return
+        try:
+            text_str = str(text_value).strip()
+        except Exception:
+            text_str = str(text_value)
+        if not text_str:
+            return
+        points = []
+        for pt in polygon:
+            if isinstance(pt, (list, tuple)) and len(pt) >= 2:
+                try:
+                    px = float(pt[0])
+                    py = float(pt[1])
+                except (TypeError, ValueError):
+                    continue
+                points.append(to_source(px, py) if to_source is not None else (px, py))
+        if len(points) < 2 or not width or not height:
+            return
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        min_x, max_x = min(xs), max(xs)
+        min_y, max_y = min(ys), max(ys)
+        if max_x <= min_x or max_y <= min_y:
+            return
+
+        x_norm = min_x / width
+        y_norm = min_y / height
+        w_norm = (max_x - min_x) / width
+        h_norm = (max_y - min_y) / height
+
+        if width > height:
+            rotated_x = y_norm
+            rotated_y = 1.0 - x_norm - w_norm
+            rotated_w = h_norm
+            rotated_h = w_norm
+            x_norm, y_norm, w_norm, h_norm = rotated_x, rotated_y, rotated_w, rotated_h
+
+        x_norm = max(min(x_norm, 1.0), 0.0)
+        y_norm = max(min(y_norm, 1.0), 0.0)
+        w_norm = max(min(w_norm, 1.0), 0.0)
+        h_norm = max(min(h_norm, 1.0), 0.0)
+
+        full_text.append(text_str)
+        boxes.append(
+            {
+                "field": text_str,
+                "confidence": float(confidence) if confidence is not None else None,
+                "x": x_norm,
+                "y": y_norm,
+                "w": w_norm,
+                "h": h_norm,
+            }
+        )
+
+    for ocr_result_item in ocr_result:
+        handled = False
+        if hasattr(ocr_result_item, 'json'):
+            result_data = getattr(ocr_result_item, 'json', None)
+            if result_data and isinstance(result_data, dict):
+                res = result_data.get('res')
                 if isinstance(res, dict):
                     rec_texts = res.get('rec_texts', [])
                     rec_polys = res.get('rec_polys', [])
@@ -196,140 +433,190 @@ def _extract_text_from_images(images: List[Path]) -> Dict[str, Any]:
                         confidence = rec_scores[i] if i < len(rec_scores) else None
                         append_detection(text_value, polygon, confidence)
                     handled = True
-            if handled:
+        if not handled and isinstance(ocr_result_item, dict):
+            res = ocr_result_item.get('res')
+            if isinstance(res, dict):
+                rec_texts = res.get('rec_texts', [])
+                rec_polys = res.get('rec_polys', [])
+                rec_scores = res.get('rec_scores', [])
+                for i, text_value in enumerate(rec_texts):
+                    if i >= len(rec_polys):
+                        continue
+                    polygon = rec_polys[i]
+                    confidence = rec_scores[i] if i < len(rec_scores) else None
+                    append_detection(text_value, polygon, confidence)
+                handled = True
+        if handled:
+            continue
+
+        sequence = []
+        if isinstance(ocr_result_item, (list, tuple)):
+            sequence = list(ocr_result_item)
+        elif isinstance(ocr_result_item, dict):
+            maybe_sequence = ocr_result_item.get('data') or ocr_result_item.get('result')
+            if isinstance(maybe_sequence, (list, tuple)):
+                sequence = list(maybe_sequence)
+
+        for entry in sequence:
+            polygon = None
+            text_value = None
+            confidence = None
+
+            if isinstance(entry, dict):
+                polygon = entry.get('box') or entry.get('points') or entry.get('poly')
+                text_value = entry.get('text') or entry.get('value') or entry.get('field')
+                confidence = entry.get('score') or entry.get('confidence')
+            elif isinstance(entry, (list, tuple)) and len(entry) >= 2:
+                polygon = entry[0]
+                info = entry[1]
+                if isinstance(info, (list, tuple)):
+                    if info:
+                        text_value = info[0]
+                    if len(info) > 1:
+                        confidence = info[1]
+                elif isinstance(info, dict):
+                    text_value = info.get('text') or info.get('value') or info.get('field')
+                    confidence = info.get('score') or info.get('confidence')
+                else:
+                    text_value = info
+            append_detection(text_value, polygon, confidence)
+
+    return full_text, boxes
+
+
+PageOutput = Optional[Tuple[List[str], List[Dict[str, Any]]]]
+
+
+def _infer_chunk(items: List[Tuple[str, bytes]]) -> List[PageOutput]:
+    """Decode and OCR one batch of (path, image bytes); runs inline or in the OCR executor."""
+    import logging
+    logger = logging.getLogger(__name__)
+
+    outputs: List[PageOutput] = [None] * len(items)
+    loaded = []
+    for index, (path, data) in enumerate(items):
+        page = _load_page(Path(path), data)
+        if page:
+            loaded.append((index, page))
+    if not loaded:
+        return outputs
+
+    engine = _get_ocr_engine()
+    if engine is None:
+        logger.error("OCR: PaddleOCR engine not available - cannot process images")
+        return outputs
+    logger.info(f"OCR: Running batch of {len(loaded)} pages")
+    results = _ocr_batch(engine, [page["input"] for _, page in loaded])
+    for (index, page), ocr_result in zip(loaded, results):
+        if ocr_result is None:
+            continue
+        logger.info(f"OCR: Got {len(ocr_result)} results from engine for {page['path']}")
+        outputs[index] = _parse_page_result(ocr_result, page["width"], page["height"], page.get("to_source"))
+    return outputs
+
+
+def _ocr_pages(images: List[Path]) -> List[Tuple[Path, List[str], List[Dict[str, Any]]]]:
+    """OCR pages in batches of OCR_BATCH_SIZE; one (path, texts, boxes) per readable page.
+
+    Each page's bytes are hashed first; pages already in the OCR cache are served
+    from it and only the misses are decoded and sent to the engine. With an OCR
+    executor configured, every batch is submitted up front so the executor's
+    processes work on them in parallel while this thread waits.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    cache = get_ocr_cache()
+    signature = _engine_signature() if cache is not None else ""
+    batch_size = _batch_size()
+    executor = _ocr_executor()
+    parsed: List[Tuple[Path, List[str], List[Dict[str, Any]]]] = []
+    submitted: List[Tuple[List[Tuple[Optional[str], Path]], Any]] = []
+
+    def collect(misses: List[Tuple[Optional[str], Path]], outputs: List[PageOutput]) -> None:
+        for (key, img_path), output in zip(misses, outputs):
+            if output is None:
+                continue
+            page_texts, page_boxes = output
+            if cache is not None and key:
+                cache.put(key, {"texts": page_texts, "boxes": page_boxes})
+            parsed.append((img_path, page_texts, page_boxes))
+
+    for offset in range(0, len(images), batch_size):
+        misses: List[Tuple[Optional[str], Path]] = []
+        items: List[Tuple[str, bytes]] = []
+        for img_path in images[offset:offset + batch_size]:
+            logger.info(f"OCR: Processing image {img_path}")
+            try:
+                data = img_path.read_bytes()
+            except Exception as e:
+                logger.error(f"OCR: Failed to read image {img_path}: {e}")
                 continue
+            key = cache.key(content_hash(data), signature) if cache is not None else None
+            cached = cache.get(key) if cache is not None and key else None
+            if cached is not None:
+                logger.info(f"OCR: Cache hit for {img_path}")
+                parsed.append((img_path, list(cached.get("texts") or []), list(cached.get("boxes") or [])))
+                continue
+            misses.append((key, img_path))
+            items.append((str(img_path), data))
+        if not items:
+            continue
+        if executor is None:
+            collect(misses, _infer_chunk(items))
+        else:
+            submitted.append((misses, executor.submit(_infer_chunk, items)))
+
+    for misses, future in submitted:
+        try:
+            outputs = future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"OCR: executor process died, resetting pool: {e}")
+            shutdown_ocr_executor()
+            outputs = [None] * len(misses)
+        except Exception as e:
+            logger.error(f"OCR: executor batch failed: {e}")
+            outputs = [None] * len(misses)
+        collect(misses, outputs)
+
+    order = {path: index for index, path in enumerate(images)}
+    parsed.sort(key=lambda item: order[item[0]])
+    return parsed
 
-            sequence = []
-            if isinstance(ocr_result_item, (list, tuple)):
-                sequence = list(ocr_result_item)
-            elif isinstance(ocr_result_item, dict):
-                maybe_sequence = ocr_result_item.get('data') or ocr_result_item.get('result')
-                if isinstance(maybe_sequence, (list, tuple)):
-                    sequence = list(maybe_sequence)
-
-            for entry in sequence:
-                polygon = None
-                text_value = None
-                confidence = None
-
-                if isinstance(entry, dict):
-                    polygon = entry.get('box') or entry.get('points') or entry.get('poly')
-                    text_value = entry.get('text') or entry.get('value') or entry.get('field')
-                    confidence = entry.get('score') or entry.get('confidence')
-                elif isinstance(entry, (list, tuple)) and len(entry) >= 2:
-                    polygon = entry[0]
-                    info = entry[1]
-                    if isinstance(info, (list, tuple)):
-                        if info:
-                            text_value = info[0]
-                        if len(info) > 1:
-                            confidence = info[1]
-                    elif isinstance(info, dict):
-                        text_value = info.get('text') or info.get('value') or info.get('field')
-                        confidence = info.get('score') or info.get('confidence')
-                    else:
-                        text_value = info
-                append_detection(text_value, polygon, confidence)
 
+def _build_extraction(full_text: List[str], boxes: List[Dict[str, Any]]) -> Dict[str, Any]:
     combined_text = "\n".join(full_text)
-    merchant = _extract_merchant(combined_text)
-    purchase_date = _extract_date(combined_text)
-    total_amount = _extract_amount(combined_text)
-    vat_breakdown = _extract_vat_breakdown(combined_text)
-    line_items = _extract_line_items(combined_text, total_amount)
+    fields = extract_fields(combined_text)
 
     return {
         "text": combined_text,
         "boxes": boxes,
-        "merchant": merchant,
-        "gross": total_amount,
-        "purchase_datetime": purchase_date,
-        "vat_breakdown": vat_breakdown,
-        "line_items": line_items,
+        "merchant": fields.merchant,
+        "gross": fields.gross,
+        "purchase_datetime": fields.purchase_datetime,
+        "vat_breakdown": fields.vat_breakdown,
+        "line_items": fields.line_items,
     }
 
 
-def _extract_merchant(text: str) -> Optional[str]:
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    for line in lines[:5]:
-        lower = line.lower()
-        if any(keyword in lower for keyword in ["receipt", "order", "total", "amount", "date", "invoice"]):
-            continue
-        if len(line.split()) <= 8:
-            return line
-    return lines[0] if lines else None
-
-
-def _extract_date(text: str) -> Optional[str]:
-    patterns = [
-        r"(20\d{2}[-/](0[1-9]|1[0-2])[-/](0[1-9]|[12]\d|3[01]))",
-        r"((0[1-9]|[12]\d|3[01])[-/](0[1-9]|1[0-2])[-/](20\d{2}))",
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            return match.group(1).replace('/', '-')
-    return None
-
-
-def _extract_amount(text: str) -> Optional[float]:
-    matches = re.findall(r"(?<!\d)(\d{1,6}[\.,]\d{2})(?!\d)", text)
-    if not matches:
-        return None
-    try:
-        values = [float(m.replace(',', '.')) for m in matches]
-    except ValueError:
-        return None
-    return max(values) if values else None
-
-
-def _extract_vat_breakdown(text: str) -> Dict[int, float]:
-    vat_breakdown = {}
-    pattern = re.compile(r"(moms|vat|tax)d*s*\(?s*(25|12|6|0)s*\)?s*[:s]*([\d\s.,]+)", re.IGNORECASE)
-    for match in pattern.finditer(text):
-        try:
-            rate = int(match.group(2))
-            amount_str = match.group(3).replace(' ', '').replace(',', '.')
-            amount = float(amount_str)
-            if rate in {25, 12, 6, 0}:
-                vat_breakdown[rate] = vat_breakdown.get(rate, 0.0) + amount
-        except (ValueError, IndexError):
-            continue
-    return vat_breakdown
-
+def _extract_text_from_images(images: List[Path]) -> Dict[str, Any]:
+    import logging
+    logger = logging.getLogger(__name__)
 
-def _extract_line_items(text: str, total_amount: Optional[float]) -> List[Dict[str, Any]]:
-    line_items = []
-    line_pattern = re.compile(r"^((?!total|summa|subtotal|moms|vat|tax|netto|brutto).+?)\s+([\d\s.,]+[.,]\d{2})$", re.IGNORECASE | re.MULTILINE)
-    for match in line_pattern.finditer(text):
-        try:
-            desc = match.group(1).strip()
-            amount_str = match.group(2).replace(' ', '').replace(',', '.')
-            amount = float(amount_str)
-            if total_amount is not None and amount > total_amount:
-                continue
-            if len(desc) > 2 and len(desc) < 50:
-                line_items.append({
-                    "description": desc,
-                    "quantity": 1,
-                    "unit_price": amount,
-                    "total": amount,
-                    "vat_rate": 0,
-                })
-        except (ValueError, IndexError):
-            continue
-    return line_items
+    if not images or Image is None:
+        logger.warning(f"OCR: No images or PIL not available. Images: {len(images) if images else 0}")
+        return {"text": "", "boxes": []}
 
+    logger.info(f"OCR: Processing {len(images)} images")
+    full_text: List[str] = []
+    boxes: List[Dict[str, Any]] = []
+    for _path, texts, page_boxes in _ocr_pages(images):
+        full_text.extend(texts)
+        boxes.extend(page_boxes)
+    return _build_extraction(full_text, boxes)
 
-def run_ocr(receipt_id: str, storage_dir: str | Path | None = None) -> Dict[str, Any]:
-    """Perform OCR/extraction using PaddleOCR (with graceful fallback)."""
-    base = storage_dir or os.getenv("STORAGE_DIR", "/data/storage")
-    base_path = Path(base)
-    receipt_path = _receipt_dir(base_path, receipt_id)
-    receipt_path.mkdir(parents=True, exist_ok=True)
-    images = _list_images(base_path, receipt_id)
 
-    ocr_result = _extract_text_from_images(images)
+def _finalize_result(base_path: Path, receipt_id: str, ocr_result: Dict[str, Any]) -> Dict[str, Any]:
     boxes = ocr_result.get("boxes", [])
     _write_boxes(base_path, receipt_id, boxes)
 
@@ -371,3 +658,54 @@ def run_ocr(receipt_id: str, storage_dir: str | Path | None = None) -> Dict[str,
         "vat_breakdown": vat_breakdown,
         "line_items": line_items,
     }
+
+
+def run_ocr(receipt_id: str, storage_dir: str | Path | None = None) -> Dict[str, Any]:
+    """Perform OCR/extraction using PaddleOCR (with graceful fallback)."""
+    base = storage_dir or os.getenv("STORAGE_DIR", "/data/storage")
+    base_path = Path(base)
+    receipt_path = _receipt_dir(base_path, receipt_id)
+    receipt_path.mkdir(parents=True, exist_ok=True)
+    images = _list_images(base_path, receipt_id)
+
+    ocr_result = _extract_text_from_images(images)
+    return _finalize_result(base_path, receipt_id, ocr_result)
+
+
+def run_ocr_batch(receipt_ids: Iterable[str], storage_dir: str | Path | None = None) -> Dict[str, Dict[str, Any]]:
+    """OCR many receipts at once, batching pages across receipts.
+
+    Pages of all receipts are fed to the engine OCR_BATCH_SIZE at a time and the
+    results are regrouped per receipt, so each entry has exactly the shape
+    :func:`run_ocr` returns for that receipt.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    base = storage_dir or os.getenv("STORAGE_DIR", "/data/storage")
+    base_path = Path(base)
+    ids = list(dict.fromkeys(receipt_ids))
+    owners: Dict[Path, str] = {}
+    for receipt_id in ids:
+        _receipt_dir(base_path, receipt_id).mkdir(parents=True, exist_ok=True)
+        for img in _list_images(base_path, receipt_id):
+            owners[img] = receipt_id
+
+    texts: Dict[str, List[str]] = {rid: [] for rid in ids}
+    boxes: Dict[str, List[Dict[str, Any]]] = {rid: [] for rid in ids}
+    if owners and Image is not None:
+        logger.info(f"OCR: Batch processing {len(owners)} pages for {len(ids)} receipts")
+        for path, page_texts, page_boxes in _ocr_pages(list(owners)):
+            texts[owners[path]].extend(page_texts)
+            boxes[owners[path]].extend(page_boxes)
+    elif owners:
+        logger.error("OCR: PIL not available - cannot process images")
+
+    return {
+        rid: _finalize_result(
+            base_path,
+            rid,
+            _build_extraction(texts[rid], boxes[rid]) if texts[rid] else {"text": "", "boxes": []},
+        )
+        for rid in ids
+    }
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    from observability.metrics import OCR_CACHE_EVICTIONS, OCR_CACHE_REQUESTS
+except Exception:  # pragma: no cover - metrics are optional
+    OCR_CACHE_EVICTIONS = None  # type: ignore
+    OCR_CACHE_REQUESTS = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached page payload changes shape so stale entries are ignored.
+CACHE_SCHEMA = 1
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _record(result: str) -> None:
+    if OCR_CACHE_REQUESTS is None:
+        return
+    try:
+        OCR_CACHE_REQUESTS.labels(result=result).inc()
+    except Exception:
+        pass
+
+
+class OcrCache:
+    """Content-addressed, size-bounded on-disk cache of per-page OCR output.
+
+    Entries live at ``<root>/<hh>/<key>.json`` where ``key`` is a SHA-256 over the
+    image bytes and the engine signature (version, language, options). Reads bump
+    the file mtime, and writes evict the least recently used entries once the
+    store grows past ``max_bytes``.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.max_bytes = max(int(max_bytes), 0)
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    def key(self, image_hash: str, signature: str) -> str:
+        return hashlib.sha256(f"{CACHE_SCHEMA}:{signature}:{image_hash}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            _record("miss")
+            return None
+        except Exception as exc:
+            logger.warning(f"OCR cache: dropping unreadable entry {path.name}: {exc}")
+            self._remove(path)
+            _record("miss")
+            return None
+        try:
+            os.utime(path, None)
+        except Exception:
+            pass
+        _record("hit")
+        return payload
+
+    def put(self, key: str, payload: Dict[str, Any]) -> None:
+        path = self._path(key)
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+        except Exception as exc:
+            logger.warning(f"OCR cache: failed to store entry: {exc}")
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - previous
+            if self.max_bytes and self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _remove(self, path: Path) -> int:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            return size
+        except FileNotFoundError:
+            return 0
+        except Exception:
+            return 0
+
+    def _evict(self) -> None:
+        # Trim to 90% of the budget so we do not rescan on every write.
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, _, path in entries:
+            if total <= target:
+                break
+            total -= self._remove(path)
+            evicted += 1
+        self._size = total
+        if evicted and OCR_CACHE_EVICTIONS is not None:
+            try:
+                OCR_CACHE_EVICTIONS.inc(evicted)
+            except Exception:
+                pass
+
+
+_CACHE: Optional[OcrCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def cache_enabled() -> bool:
+    return os.getenv("OCR_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+
+def get_ocr_cache() -> Optional[OcrCache]:
+    """Return the process-wide cache, or ``None`` when OCR_CACHE_ENABLED is off."""
+    global _CACHE
+    if not cache_enabled():
+        return None
+    root = Path(
+        os.getenv("OCR_CACHE_DIR")
+        or Path(os.getenv("STORAGE_DIR", "/data/storage")) / "ocr_cache"
+    )
+    try:
+        max_bytes = int(float(os.getenv("OCR_CACHE_MAX_MB", "512")) * 1024 * 1024)
+    except ValueError:
+        max_bytes = 512 * 1024 * 1024
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE.root != root or _CACHE.max_bytes != max_bytes:
+            _CACHE = OcrCache(root, max_bytes)
+        return _CACHE
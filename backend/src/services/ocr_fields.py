@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# Patterns are compiled once at import. The text is scanned once by _AMOUNT_LINE_RE,
+# which yields every line ending in an amount (description, amount); that shared
+# index feeds totals, VAT and line items. Dates get one search each.
+_AMOUNT = r"\d{1,3}(?:[ .]\d{3})+[.,]\d{2}|\d{1,6}[.,]\d{2}"
+_AMOUNT_RE = re.compile(rf"(?<![\d.,])({_AMOUNT})(?![.,]?\d)")
+_AMOUNT_LINE_RE = re.compile(
+    rf"^[ \t]*([^\n]*?)[ \t]+({_AMOUNT})[ \t]*(?:kr|sek|:-)?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_TIME = r"(?:[ \t]+|T)([01]\d|2[0-3])[:.]([0-5]\d)(?::([0-5]\d))?"
+_ISO_DATE_RE = re.compile(rf"(?<!\d)(20\d{{2}})[-/.](0[1-9]|1[0-2])[-/.](0[1-9]|[12]\d|3[01])(?!\d)(?:{_TIME})?")
+_DMY_DATE_RE = re.compile(rf"(?<!\d)(0[1-9]|[12]\d|3[01])[-/.](0[1-9]|1[0-2])[-/.](20\d{{2}})(?!\d)(?:{_TIME})?")
+_SUMMARY_RE = re.compile(r"total|summa|moms|vat|tax|netto|brutto|betala|belopp|amount", re.IGNORECASE)
+_VAT_RATE_RE = re.compile(r"\b(?:moms|vat|tax)\b[^\d\n]{0,12}?(25|12|6|0)(?:[.,]0+)?(?!\d)", re.IGNORECASE)
+_TOTAL_RE = re.compile(r"total|summa|att betala|belopp|amount", re.IGNORECASE)
+_SUBTOTAL_RE = re.compile(r"subtotal|delsumma|netto", re.IGNORECASE)
+_MERCHANT_SKIP_RE = re.compile(r"receipt|order|total|amount|date|invoice", re.IGNORECASE)
+
+
+def parse_amount(raw: str) -> Optional[float]:
+    """Parse ``99,00`` / ``1 234,50`` / ``1.234,50`` / ``1,234.50`` into a float."""
+    if " " not in raw and (raw.count(",") + raw.count(".")) == 1:
+        try:
+            return float(raw.replace(",", "."))
+        except ValueError:
+            return None
+    value = raw.replace(" ", "")
+    decimal_sep = max(value.rfind(","), value.rfind("."))
+    if decimal_sep >= 0 and len(value) - decimal_sep - 1 == 2:
+        whole = value[:decimal_sep].replace(",", "").replace(".", "")
+        value = f"{whole}.{value[decimal_sep + 1:]}"
+    else:
+        value = value.replace(",", "").replace(".", "")
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+@dataclass
+class ReceiptFields:
+    merchant: Optional[str] = None
+    gross: Optional[float] = None
+    purchase_datetime: Optional[str] = None
+    vat_breakdown: Dict[int, float] = field(default_factory=dict)
+    line_items: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def extract_fields(text: str) -> ReceiptFields:
+    """Extract merchant, total, purchase date, VAT per rate and line items from OCR text.
+
+    Lines ending in an amount are classified once: VAT lines (``Moms 25% 47,78``)
+    feed the VAT breakdown, total lines (``Totalt``, ``Summa``, ``Att betala``) the
+    gross amount, and other non-summary lines become line items.
+    """
+    fields = ReceiptFields(merchant=_pick_merchant(text), purchase_datetime=_pick_date(text))
+    totals: List[float] = []
+    items: List[Tuple[str, float]] = []
+    for desc, raw in _AMOUNT_LINE_RE.findall(text):
+        amount = parse_amount(raw)
+        if amount is None:
+            continue
+        if _SUMMARY_RE.search(desc) is None:
+            items.append((desc, amount))
+            continue
+        vat = _VAT_RATE_RE.search(desc)
+        if vat is not None:
+            rate = int(vat.group(1))
+            fields.vat_breakdown[rate] = fields.vat_breakdown.get(rate, 0.0) + amount
+        elif _TOTAL_RE.search(desc) is not None and _SUBTOTAL_RE.search(desc) is None:
+            totals.append(amount)
+
+    if totals:
+        fields.gross = max(totals)
+    else:
+        values = [value for value in map(parse_amount, _AMOUNT_RE.findall(text)) if value is not None]
+        fields.gross = max(values) if values else None
+
+    for desc, amount in items:
+        if fields.gross is not None and amount > fields.gross:
+            continue
+        if 2 < len(desc) < 50:
+            fields.line_items.append({
+                "description": desc,
+                "quantity": 1,
+                "unit_price": amount,
+                "total": amount,
+                "vat_rate": 0,
+            })
+    return fields
+
+
+def _pick_merchant(text: str) -> Optional[str]:
+    first: Optional[str] = None
+    seen = 0
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        if first is None:
+            first = line
+        if not _MERCHANT_SKIP_RE.search(line) and len(line.split()) <= 8:
+            return line
+        seen += 1
+        if seen == 5:
+            break
+    return first
+
+
+def _pick_date(text: str) -> Optional[str]:
+    """First ISO date (else first day-month-year date) as ISO, with the time printed next to it."""
+    match = _ISO_DATE_RE.search(text)
+    if match:
+        year, month, day, hour, minute, second = match.groups()
+    else:
+        match = _DMY_DATE_RE.search(text)
+        if not match:
+            return None
+        day, month, year, hour, minute, second = match.groups()
+    value = f"{year}-{month}-{day}"
+    if hour is not None:
+        value += f"T{hour}:{minute}:{second or '00'}"
+    return value
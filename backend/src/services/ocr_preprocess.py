@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except Exception:  # pragma: no cover
+    Image = None  # type: ignore
+    ImageOps = None  # type: ignore
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Normalised pages are cached in a hidden sidecar directory next to the original,
+# so receipt image listings (which only look at files in the receipt dir) never see them.
+SIDECAR_DIR = ".ocr"
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in {"1", "true", "yes"}
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    enabled: bool = True
+    max_long_edge: int = 2000
+    target_dpi: int = 0
+    grayscale: bool = True
+    autocontrast: bool = True
+    deskew: bool = False
+    max_skew: float = 5.0
+    cache: bool = True
+
+    @classmethod
+    def from_env(cls) -> "PreprocessOptions":
+        def _int(name: str, default: int) -> int:
+            try:
+                return max(int(os.getenv(name, str(default))), 0)
+            except ValueError:
+                return default
+
+        try:
+            max_skew = abs(float(os.getenv("OCR_DESKEW_MAX_ANGLE", "5")))
+        except ValueError:
+            max_skew = 5.0
+        return cls(
+            enabled=_flag("OCR_PREPROCESS", "true"),
+            max_long_edge=_int("OCR_MAX_LONG_EDGE", 2000),
+            target_dpi=_int("OCR_TARGET_DPI", 0),
+            grayscale=_flag("OCR_GRAYSCALE", "true"),
+            autocontrast=_flag("OCR_AUTOCONTRAST", "true"),
+            deskew=_flag("OCR_DESKEW", "false"),
+            max_skew=max_skew,
+            cache=_flag("OCR_PREPROCESS_CACHE", "true"),
+        )
+
+    def signature(self) -> str:
+        """Stable tag for everything that changes the normalised image (not the cache flag)."""
+        if not self.enabled:
+            return "raw"
+        data = asdict(self)
+        data.pop("cache")
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class PreparedPage:
+    """A normalised page plus what is needed to map its coordinates back.
+
+    ``scale`` is prepared pixels per oriented source pixel; ``angle`` is the deskew
+    rotation (degrees, counter-clockwise) applied about the prepared image centre.
+    """
+
+    image: "Image.Image"
+    scale: float = 1.0
+    angle: float = 0.0
+
+    def to_source(self, x: float, y: float) -> Tuple[float, float]:
+        if self.angle:
+            cx, cy = self.image.width / 2.0, self.image.height / 2.0
+            theta = math.radians(self.angle)
+            dx, dy = x - cx, y - cy
+            x = cx + dx * math.cos(theta) - dy * math.sin(theta)
+            y = cy + dx * math.sin(theta) + dy * math.cos(theta)
+        if self.scale and self.scale != 1.0:
+            x, y = x / self.scale, y / self.scale
+        return x, y
+
+
+def _target_scale(image: "Image.Image", options: PreprocessOptions) -> float:
+    scale = 1.0
+    long_edge = max(image.size)
+    if options.max_long_edge and long_edge > options.max_long_edge:
+        scale = options.max_long_edge / float(long_edge)
+    if options.target_dpi:
+        dpi = image.info.get("dpi")
+        try:
+            source_dpi = float(dpi[0]) if dpi else 0.0
+        except (TypeError, ValueError, IndexError):
+            source_dpi = 0.0
+        if source_dpi > options.target_dpi:
+            scale = min(scale, options.target_dpi / source_dpi)
+    return scale
+
+
+def estimate_skew(image: "Image.Image", max_angle: float = 5.0, step: float = 0.5) -> float:
+    """Estimate text skew in degrees with a projection profile on a small binarised copy.
+
+    Returns the counter-clockwise rotation that best straightens the text rows.
+    """
+    if np is None or max_angle <= 0:
+        return 0.0
+    small = image.convert("L")
+    small.thumbnail((800, 800))
+    inverted = ImageOps.invert(small) if ImageOps is not None else small
+    arr = np.asarray(inverted, dtype=np.float32)
+    threshold = arr.mean() + arr.std()
+    binary = Image.fromarray(((arr > threshold) * 255).astype(np.uint8))
+
+    best_angle, best_score = 0.0, -1.0
+    steps = int(round(max_angle / step))
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        rows = np.asarray(binary.rotate(angle, resample=Image.NEAREST), dtype=np.float32).sum(axis=1)
+        score = float(np.square(np.diff(rows)).sum())
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess(image: "Image.Image", options: PreprocessOptions) -> PreparedPage:
+    """EXIF-orient, downscale, grayscale, normalise contrast and optionally deskew a page."""
+    if ImageOps is not None:
+        try:
+            image = ImageOps.exif_transpose(image)
+        except Exception:
+            pass
+    if not options.enabled:
+        return PreparedPage(image=image.convert("RGB"))
+
+    scale = _target_scale(image, options)
+    if scale < 1.0:
+        source_width = image.width
+        size = (max(int(round(image.width * scale)), 1), max(int(round(image.height * scale)), 1))
+        image = image.resize(size, Image.LANCZOS)
+        scale = size[0] / float(source_width)
+    else:
+        scale = 1.0
+
+    image = image.convert("L") if options.grayscale else image.convert("RGB")
+    if options.autocontrast and ImageOps is not None:
+        image = ImageOps.autocontrast(image, cutoff=1)
+
+    angle = 0.0
+    if options.deskew:
+        angle = estimate_skew(image, options.max_skew)
+        if angle:
+            fill = 255 if image.mode == "L" else (255, 255, 255)
+            image = image.rotate(angle, resample=Image.BICUBIC, fillcolor=fill)
+    return PreparedPage(image=image, scale=scale, angle=angle)
+
+
+def _sidecar_paths(img_path: Path, options: PreprocessOptions) -> Tuple[Path, Path]:
+    stem = f"{img_path.stem}.{options.signature()}"
+    root = img_path.parent / SIDECAR_DIR
+    return root / f"{stem}.png", root / f"{stem}.json"
+
+
+def _load_sidecar(img_path: Path, options: PreprocessOptions) -> Optional[PreparedPage]:
+    image_path, meta_path = _sidecar_paths(img_path, options)
+    try:
+        if image_path.stat().st_mtime < img_path.stat().st_mtime:
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        with Image.open(image_path) as cached:
+            cached.load()
+            return PreparedPage(image=cached.copy(), scale=float(meta["scale"]), angle=float(meta["angle"]))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"OCR: ignoring unreadable normalised image for {img_path.name}: {e}")
+        return None
+
+
+def _store_sidecar(img_path: Path, options: PreprocessOptions, page: PreparedPage) -> None:
+    image_path, meta_path = _sidecar_paths(img_path, options)
+    try:
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = image_path.parent / f"{image_path.name}.{os.getpid()}.tmp"
+        page.image.save(tmp, format="PNG")
+        meta_path.write_text(json.dumps({"scale": page.scale, "angle": page.angle}), encoding="utf-8")
+        os.replace(tmp, image_path)
+    except Exception as e:
+        logger.warning(f"OCR: could not cache normalised image for {img_path.name}: {e}")
+
+
+def prepare_page(img_path: Path, image: "Image.Image", options: Optional[PreprocessOptions] = None) -> PreparedPage:
+    """Return the normalised page for ``img_path``, reusing the cached sidecar when fresh."""
+    options = options or PreprocessOptions.from_env()
+    use_cache = options.enabled and options.cache and img_path.exists()
+    if use_cache:
+        cached = _load_sidecar(img_path, options)
+        if cached is not None:
+            return cached
+    page = preprocess(image, options)
+    if use_cache:
+        _store_sidecar(img_path, options, page)
+    return page
@@ -5,6 +5,10 @@ try:  # Optional dependency in unit-test context
     from celery import Celery as _Celery
 except Exception:  # pragma: no cover
     _Celery = None
+try:
+    from kombu import Queue as _Queue
+except Exception:  # pragma: no cover
+    _Queue = None
 
 
 class _StubConf:
@@ -42,6 +46,48 @@ def _redis_url() -> str:
     return f"redis://{host}:{port}/{db}"
 
 
+# One queue per pipeline stage so cheap stages never wait behind CPU-heavy OCR.
+# Workers pick queues with ``-Q``; see the celery-worker-* services in docker-compose.yml.
+DEFAULT_QUEUE = "default"
+PIPELINE_QUEUES = ("ocr", "classify", "validate", "accounting", "matching", "export")
+
+TASK_ROUTES = {
+    "services.tasks.process_ocr": {"queue": "ocr"},
+    "services.tasks.process_ocr_batch": {"queue": "ocr"},
+    "services.tasks.process_classification": {"queue": "classify"},
+    "services.tasks.process_receipt_pipeline": {"queue": "classify"},
+    "services.tasks.process_validation": {"queue": "validate"},
+    "services.tasks.process_accounting_proposal": {"queue": "accounting"},
+    "services.tasks.process_matching": {"queue": "matching"},
+    "services.tasks.process_invoice_document": {"queue": "matching"},
+    "services.tasks.process_statement_pdf": {"queue": "matching"},
+    "services.tasks.process_export": {"queue": "export"},
+}
+
+
+def _prune_interval_seconds() -> float:
+    try:
+        return float(os.getenv("CAPTURE_UPLOAD_PRUNE_MINUTES", "60")) * 60
+    except ValueError:
+        return 3600.0
+
+
+# Periodic maintenance, sent by ``celery beat`` (the celery-beat service in docker-compose.yml).
+BEAT_SCHEDULE = {
+    "prune-capture-uploads": {
+        "task": "services.tasks.prune_capture_uploads",
+        "schedule": _prune_interval_seconds(),
+    },
+}
+
+
+def _task_queues():
+    names = (DEFAULT_QUEUE,) + PIPELINE_QUEUES
+    if _Queue is None:
+        return names
+    return tuple(_Queue(name, routing_key=name) for name in names)
+
+
 BROKER_URL = _redis_url()
 BACKEND_URL = BROKER_URL
 
@@ -55,12 +101,14 @@ celery_app.conf.update(
     broker_transport_options={
         "visibility_timeout": 3600,  # 1 hour
     },
-    task_default_queue="default",
-    task_queues={
-        # Default queue; additional queues could be added (ocr, classification, matching)
-    },
+    task_default_queue=DEFAULT_QUEUE,
+    task_queues=_task_queues(),
+    task_routes=TASK_ROUTES,
+    beat_schedule=BEAT_SCHEDULE,
     task_default_retry_delay=5,  # seconds
     task_time_limit=300,  # seconds
+    # Pool processes may warm the OCR engine on start (OCR_PRELOAD); allow for model loading.
+    worker_proc_alive_timeout=float(os.getenv("CELERY_PROC_ALIVE_TIMEOUT", "60")),
 )
 
 
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# Columns covered by the ft_unified_files_search FULLTEXT index (migration 0013).
+# MATCH() must name exactly these, in this order, for MySQL to use the index.
+SEARCH_COLUMNS = "merchant_name, ocr_raw"
+MATCH_SQL = f"MATCH({SEARCH_COLUMNS}) AGAINST (%s IN BOOLEAN MODE)"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_MAX_TERMS = 8
+
+
+def _min_token() -> int:
+    # Mirrors innodb_ft_min_token_size; shorter words are not in the index.
+    try:
+        return max(int(os.getenv("RECEIPTS_SEARCH_MIN_TOKEN", "3")), 1)
+    except ValueError:
+        return 3
+
+
+@dataclass
+class SearchQuery:
+    """A user query reduced to indexable terms.
+
+    ``boolean`` is the MySQL boolean-mode string (every term required, prefix
+    matched) and ``pattern`` finds the same terms in text for highlighting.
+    """
+
+    text: str
+    terms: List[str] = field(default_factory=list)
+    boolean: str = ""
+    pattern: Optional["re.Pattern[str]"] = None
+
+
+def parse_query(text: str) -> SearchQuery:
+    """Tokenise ``text``; boolean operators typed by the user are dropped, not interpreted."""
+    minimum = _min_token()
+    terms: List[str] = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if len(token) >= minimum and token not in terms:
+            terms.append(token)
+        if len(terms) == _MAX_TERMS:
+            break
+    query = SearchQuery(text=text, terms=terms)
+    if terms:
+        query.boolean = " ".join(f"+{term}*" for term in terms)
+        alternatives = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+        query.pattern = re.compile(rf"(?<!\w)(?:{alternatives})\w*", re.IGNORECASE)
+    return query
+
+
+def highlight(text: Optional[str], query: SearchQuery) -> List[List[int]]:
+    """``[start, end)`` offsets of every word in ``text`` matching a query term."""
+    if not text or query.pattern is None:
+        return []
+    return [[m.start(), m.end()] for m in query.pattern.finditer(text)]
+
+
+def snippet(text: Optional[str], query: SearchQuery, width: int = 160) -> Optional[str]:
+    """About ``width`` characters of ``text`` around the first match, on one line."""
+    if not text:
+        return None
+    match = query.pattern.search(text) if query.pattern is not None else None
+    start = 0
+    if match is not None and match.start() > width // 4:
+        # Start on a word boundary a little before the hit so it is never cut in half.
+        start = match.start() - width // 4
+        space = text.find(" ", start, match.start())
+        if space >= 0:
+            start = space + 1
+    end = min(start + width, len(text))
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+    return " ".join(text[start:end].split())
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    from services.db.connection import db_cursor, db_transaction
+except Exception:  # pragma: no cover - allow running without DB
+    db_cursor = None  # type: ignore
+    db_transaction = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany; mysql-connector folds each call into one multi-row INSERT.
+INSERT_BATCH = 1000
+# invoice_documents progress is written after this many pages.
+PROGRESS_EVERY_PAGES = 5
+
+INSERT_DOCUMENT_SQL = (
+    "INSERT INTO invoice_documents (id, invoice_type, period_start, period_end, status) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+INSERT_LINE_SQL = (
+    "INSERT INTO invoice_lines (invoice_id, transaction_date, amount, merchant_name, description) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+_LINE_RE = re.compile(r'(20\d{2}-\d{2}-\d{2})\s+(.+?)\s+(-?\d+[\.,]\d{2})')
+_PERIOD_RE = re.compile(r'Period\s*:?\s*(20\d{2}-\d{2}-\d{2})\s*(?:to|-)\s*(20\d{2}-\d{2}-\d{2})', re.IGNORECASE)
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def statement_dir() -> Path:
+    """Uploaded statement PDFs, shared by the API and the matching worker."""
+    return Path(os.getenv("STORAGE_DIR", "/data/storage")) / "statements"
+
+
+def pdf_path(document_id: str) -> Path:
+    return statement_dir() / f"{_UNSAFE_RE.sub('_', document_id)}.pdf"
+
+
+def save_pdf(document_id: str, pdf_bytes: bytes) -> Path:
+    path = pdf_path(document_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".pdf.tmp")
+    tmp.write_bytes(pdf_bytes)
+    os.replace(tmp, path)
+    return path
+
+
+def parse_lines(text: str) -> List[Dict[str, Any]]:
+    lines: List[Dict[str, Any]] = []
+    for match in _LINE_RE.finditer(text):
+        tx_date, merchant, amount = match.groups()
+        lines.append(
+            {
+                "transaction_date": tx_date,
+                "merchant_name": merchant.strip(),
+                "amount": float(amount.replace(',', '.')),
+                "description": merchant.strip(),
+            }
+        )
+    return lines
+
+
+def iter_pdf_pages(path: Path) -> Iterator[str]:
+    """Text of each page, extracted one page at a time.
+
+    Files pdfminer cannot open (or a missing pdfminer) are read as plain text,
+    as the synchronous import always did.
+    """
+    try:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+    except Exception:
+        extract_pages = None  # type: ignore
+    started = False
+    if extract_pages is not None:
+        try:
+            for page in extract_pages(str(path)):
+                started = True
+                yield "".join(el.get_text() for el in page if isinstance(el, LTTextContainer))
+            return
+        except Exception:
+            if started:
+                raise
+    yield path.read_bytes().decode('utf-8', errors='ignore')
+
+
+def parse_pages(
+    pages: Iterable[str],
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """Collect lines and the statement period from page texts; ``progress(pages, lines)`` after each page."""
+    lines: List[Dict[str, Any]] = []
+    period_start: Optional[str] = None
+    period_end: Optional[str] = None
+    count = 0
+    for count, text in enumerate(pages, start=1):
+        lines.extend(parse_lines(text))
+        if period_start is None:
+            period_match = _PERIOD_RE.search(text)
+            if period_match:
+                period_start, period_end = period_match.groups()
+        if progress is not None:
+            progress(count, len(lines))
+    return {"period_start": period_start, "period_end": period_end, "lines": lines, "pages": count}
+
+
+def _line_row(document_id: str, ln: Dict[str, Any]) -> tuple:
+    return (
+        document_id,
+        ln.get("transaction_date"),
+        ln.get("amount"),
+        (ln.get("merchant_name") or ln.get("merchant") or None),
+        ln.get("description"),
+    )
+
+
+def insert_lines(cur: Any, document_id: str, lines: Sequence[Dict[str, Any]]) -> int:
+    """Insert statement lines ``INSERT_BATCH`` rows per statement on ``cur``."""
+    rows = [_line_row(document_id, ln) for ln in lines if isinstance(ln, dict)]
+    for start in range(0, len(rows), INSERT_BATCH):
+        cur.executemany(INSERT_LINE_SQL, rows[start:start + INSERT_BATCH])
+    return len(rows)
+
+
+def import_statement(
+    document_id: str,
+    period_start: Optional[str],
+    period_end: Optional[str],
+    lines: Sequence[Dict[str, Any]],
+) -> int:
+    """Create the document and all its lines in one transaction; returns the line count."""
+    with db_transaction():
+        with db_cursor() as cur:
+            cur.execute(INSERT_DOCUMENT_SQL, (document_id, "company_card", period_start, period_end, "imported"))
+            return insert_lines(cur, document_id, lines)
+
+
+def create_pending(document_id: str, period_start: Optional[str], period_end: Optional[str]) -> None:
+    """Register a statement whose PDF is parsed later; its lines appear when status turns 'imported'."""
+    with db_cursor() as cur:
+        cur.execute(INSERT_DOCUMENT_SQL, (document_id, "company_card", period_start, period_end, "queued"))
+        cur.execute(
+            "UPDATE invoice_documents SET metadata_json=%s WHERE id=%s",
+            (json.dumps({"source": "pdf"}), document_id),
+        )
+
+
+def set_progress(document_id: str, status: str, **metadata: Any) -> None:
+    """Best-effort status update outside any transaction, so pollers see it immediately."""
+    try:
+        with db_cursor() as cur:
+            cur.execute(
+                "UPDATE invoice_documents SET status=%s, metadata_json=%s WHERE id=%s",
+                (status, json.dumps({"source": "pdf", **metadata}), document_id),
+            )
+    except Exception:
+        pass
+
+
+def _stale_after_seconds() -> float:
+    """STATEMENT_IMPORT_STALE_SECONDS: a 'parsing' claim older than this belonged to a dead run.
+
+    Keep it above the Celery task_time_limit (300 s) so a live import is never taken over.
+    """
+    try:
+        return float(os.getenv("STATEMENT_IMPORT_STALE_SECONDS", "600"))
+    except ValueError:
+        return 600.0
+
+
+class _ClaimLost(Exception):
+    """Another run took the statement over (our claim was considered stale)."""
+
+
+def _claim(document_id: str) -> Optional[Dict[str, Any]]:
+    """Move a statement to 'parsing' for this run; returns the claim, or None if another run has it.
+
+    Queued and failed statements are taken, and so is one left in 'parsing' by a run
+    that died (worker killed, time limit) more than STATEMENT_IMPORT_STALE_SECONDS ago.
+    """
+    now = time.time()
+    claim = {"claim": uuid.uuid4().hex, "claimed_at": now}
+    with db_cursor() as cur:
+        cur.execute(
+            "UPDATE invoice_documents SET status='parsing', metadata_json=%s "
+            "WHERE id=%s AND (status IN ('queued', 'failed') OR (status='parsing' "
+            "AND COALESCE(JSON_EXTRACT(metadata_json, '$.claimed_at'), 0) < %s))",
+            (json.dumps({"source": "pdf", "pages": 0, "lines": 0, **claim}), document_id, now - _stale_after_seconds()),
+        )
+        return claim if cur.rowcount > 0 else None
+
+
+def import_pdf(document_id: str) -> Dict[str, Any]:
+    """Parse the stored PDF of a queued statement and bulk-insert its lines.
+
+    ``invoice_documents.status`` moves queued -> parsing (with pages/lines parsed so
+    far in ``metadata_json``) -> imported, or failed with the error. Each run claims the
+    statement first (see :func:`_claim`) and only commits its lines while it still holds
+    the claim, so a redelivered task never inserts them twice.
+    """
+    path = pdf_path(document_id)
+    try:
+        claim = _claim(document_id)
+    except Exception as e:
+        logger.error(f"statement import {document_id} could not start: {e}")
+        return {"document_id": document_id, "status": "failed", "error": str(e)}
+    if claim is None:
+        logger.info(f"statement import {document_id}: already parsing or imported, skipping")
+        return {"document_id": document_id, "status": "skipped"}
+
+    def progress(pages: int, found: int) -> None:
+        if pages % PROGRESS_EVERY_PAGES == 0:
+            set_progress(document_id, "parsing", pages=pages, lines=found, **claim)
+
+    try:
+        parsed = parse_pages(iter_pdf_pages(path), progress=progress)
+        with db_transaction():
+            with db_cursor() as cur:
+                inserted = insert_lines(cur, document_id, parsed["lines"])
+                cur.execute(
+                    (
+                        "UPDATE invoice_documents SET status='imported', metadata_json=%s, "
+                        "period_start=COALESCE(period_start, %s), period_end=COALESCE(period_end, %s) "
+                        "WHERE id=%s AND status='parsing' "
+                        "AND JSON_UNQUOTE(JSON_EXTRACT(metadata_json, '$.claim'))=%s"
+                    ),
+                    (
+                        json.dumps({"source": "pdf", "pages": parsed["pages"], "lines": inserted}),
+                        parsed["period_start"],
+                        parsed["period_end"],
+                        document_id,
+                        claim["claim"],
+                    ),
+                )
+                if cur.rowcount == 0:
+                    # Roll the lines back; the run that took over inserts them
+                    raise _ClaimLost()
+    except _ClaimLost:
+        logger.warning(f"statement import {document_id}: claim taken over by another run, discarding")
+        return {"document_id": document_id, "status": "skipped"}
+    except Exception as e:
+        logger.error(f"statement import {document_id} failed: {e}")
+        set_progress(document_id, "failed", error=str(e)[:500])
+        return {"document_id": document_id, "status": "failed", "error": str(e)}
+    return {"document_id": document_id, "status": "imported", "pages": parsed["pages"], "lines": inserted}
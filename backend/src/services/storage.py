@@ -1,8 +1,24 @@
 from __future__ import annotations
 
 import os
+import shutil
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, Iterator, List, Optional
+
+
+def fsync_dir(path: Path) -> None:
+    """Persist a rename in ``path`` (best-effort; not every platform can open directories)."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 
 class FileStorage:
@@ -23,15 +39,53 @@ class FileStorage:
             raise ValueError("Unsafe path detected")
         return p
 
+    def path(self, receipt_id: str, filename: str) -> Path:
+        """Validated location of a stored file (its receipt directory is created)."""
+        return self._safe_path(receipt_id, filename)
+
     def save(self, receipt_id: str, filename: str, data: bytes) -> Path:
         p = self._safe_path(receipt_id, filename)
         p.write_bytes(data)
         return p
 
+    @contextmanager
+    def writer(self, receipt_id: str, filename: str, durable: bool = False) -> Iterator[BinaryIO]:
+        """Write a stored file in pieces; it appears under its name only once complete.
+
+        With ``durable`` the data and the rename are fsynced before returning.
+        """
+        p = self._safe_path(receipt_id, filename)
+        tmp = p.with_name(p.name + ".part")
+        try:
+            with tmp.open("wb") as fh:
+                yield fh
+                if durable:
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            os.replace(tmp, p)
+            if durable:
+                fsync_dir(p.parent)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
     def load(self, receipt_id: str, filename: str) -> bytes:
         p = self._safe_path(receipt_id, filename)
         return p.read_bytes()
 
+    def open(self, receipt_id: str, filename: str) -> BinaryIO:
+        """Open a stored file for reading in chunks instead of loading it whole."""
+        p = self._safe_path(receipt_id, filename)
+        return p.open("rb")
+
+    def purge(self, receipt_id: str) -> None:
+        """Delete a receipt's directory with everything in it, subdirectories such as ``.ocr`` included."""
+        root = self._safe_path(receipt_id, "_").parent.resolve()
+        # rmtree must only ever reach a receipt directory directly under the base
+        if root.parent != self.base:
+            raise ValueError("Unsafe path detected")
+        shutil.rmtree(root, ignore_errors=False)
+
     def list(self, receipt_id: str) -> List[str]:
         root = (self.base / receipt_id)
         if not root.exists():
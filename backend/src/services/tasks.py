@@ -1,28 +1,51 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
+from contextlib import nullcontext
 from datetime import datetime, timezone
 from decimal import Decimal
 from pathlib import Path
 from typing import Any, List, Optional
 
 try:
-    from services.db.connection import db_cursor
+    from services.db.connection import db_cursor, db_transaction
 except Exception:  # pragma: no cover
     db_cursor = None  # type: ignore
+    db_transaction = None  # type: ignore
 
 
 from services.queue_manager import get_celery
 from observability.metrics import track_task
-from services.ocr import run_ocr
+from services.ocr import (
+    clear_ocr_ready,
+    disable_ocr_executor,
+    ocr_executor_workers,
+    run_ocr,
+    run_ocr_batch,
+    start_ocr_executor,
+    warm_ocr_engine,
+)
 from services.enrichment import enrich_receipt, provider_from_env
 from services.validation import validate_receipt
 from services.accounting import propose_accounting_entries
+from services.exports import run_job as run_export_job
+from services.statement_import import import_pdf as import_statement_pdf
+from services import capture_uploads
 from models.accounting import AccountingRule
 from models.receipts import AccountingEntry, Receipt, ReceiptStatus
 
+try:
+    from celery.signals import worker_init, worker_process_init
+    from celery.concurrency import get_implementation as get_pool_implementation
+except Exception:  # pragma: no cover
+    worker_init = None  # type: ignore
+    worker_process_init = None  # type: ignore
+    get_pool_implementation = None  # type: ignore
+
 celery_app = get_celery()
+logger = logging.getLogger(__name__)
 
 
 INSERT_HISTORY_SQL = (
@@ -62,12 +85,43 @@ def _update_file_status(file_id: str, status: str, confidence: float | None = No
         return False
 
 
+def _finish_stage(file_id: str, job: str, status: str, confidence: float | None = None) -> bool:
+    """Update ai_status and append the matching history row using one pooled connection."""
+    if db_cursor is None:
+        return False
+    ok = False
+    try:
+        with db_cursor() as cur:
+            if confidence is None:
+                cur.execute(
+                    "UPDATE unified_files SET ai_status=%s, updated_at=NOW() WHERE id=%s",
+                    (status, file_id),
+                )
+            else:
+                cur.execute(
+                    "UPDATE unified_files SET ai_status=%s, ai_confidence=%s, updated_at=NOW() "
+                    "WHERE id=%s",
+                    (status, confidence, file_id),
+                )
+            ok = cur.rowcount > 0
+            try:
+                cur.execute(INSERT_HISTORY_SQL, (file_id, job, "success" if ok else "error"))
+            except Exception:
+                # best-effort history
+                pass
+    except Exception:
+        _history(file_id, job=job, status="error")
+        return False
+    return ok
+
+
 def _update_file_fields(
     file_id: str,
     merchant: str | None = None,
     gross: float | None = None,
     purchase_iso: str | None = None,
     ocr_raw: str | None = None,
+    line_item_count: int | None = None,
 ) -> bool:
     if db_cursor is None:
         return False
@@ -86,6 +140,9 @@ def _update_file_fields(
         if ocr_raw is not None:
             sets.append("ocr_raw=%s")
             vals.append(ocr_raw)
+        if line_item_count is not None:
+            sets.append("line_item_count=%s")
+            vals.append(line_item_count)
         if not sets:
             return False
         sets.append("updated_at=NOW()")
@@ -97,104 +154,104 @@ def _update_file_fields(
         return False
 
 
-def _load_receipt_model(file_id: str) -> Optional[Receipt]:
+LOAD_CONTEXT_SQL = (
+    "SELECT id, submitted_by, created_at, merchant_name, orgnr, purchase_datetime, "
+    "gross_amount, net_amount, ai_confidence, file_type "
+    "FROM unified_files WHERE id=%s"
+)
+# Tags come back as rows: GROUP_CONCAT is cut at group_concat_max_len and cannot
+# carry a separator that may itself appear inside a tag.
+LOAD_TAGS_SQL = "SELECT tag FROM file_tags WHERE file_id=%s ORDER BY tag"
+
+
+def _iso(value: Any) -> Any:
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _load_file_context(file_id: str) -> Optional[dict[str, Any]]:
+    """Load the receipt row, its tags and file type with one pooled cursor.
+
+    The result is JSON-serialisable so it can be handed from one pipeline task to
+    the next (``process_classification.delay(file_id, context)``) instead of each
+    stage re-querying ``unified_files``.
+    """
     if db_cursor is None:
         return None
     try:
         with db_cursor() as cur:
-            cur.execute(
-                (
-                    "SELECT id, submitted_by, created_at, merchant_name, orgnr, purchase_datetime, "
-                    "gross_amount, net_amount, ai_confidence FROM unified_files WHERE id=%s"
-                ),
-                (file_id,),
-            )
+            cur.execute(LOAD_CONTEXT_SQL, (file_id,))
             row = cur.fetchone()
-        if not row:
-            return None
-        (
-            rid,
-            submitted_by,
-            created_at,
-            merchant_name,
-            orgnr,
-            purchase_dt,
-            gross,
-            net,
-            ai_conf,
-        ) = row
-
-        tags: List[str] = []
+            if not row:
+                return None
+            cur.execute(LOAD_TAGS_SQL, (file_id,))
+            tags = [tag for (tag,) in cur.fetchall() or [] if tag]
+    except Exception:
+        return None
+    (
+        rid,
+        submitted_by,
+        created_at,
+        merchant_name,
+        orgnr,
+        purchase_dt,
+        gross,
+        net,
+        ai_conf,
+        file_type,
+    ) = row
+    return {
+        "id": rid,
+        "submitted_by": submitted_by,
+        "created_at": _iso(created_at),
+        "merchant_name": merchant_name,
+        "orgnr": orgnr,
+        "purchase_datetime": _iso(purchase_dt),
+        "gross_amount": (str(gross) if gross is not None else None),
+        "net_amount": (str(net) if net is not None else None),
+        "ai_confidence": (float(ai_conf) if ai_conf is not None else None),
+        "file_type": file_type,
+        "tags": tags,
+    }
+
+
+def _as_utc(value: Any) -> Optional[datetime]:
+    if isinstance(value, str):
         try:
-            with db_cursor() as cur:
-                cur.execute("SELECT tag FROM file_tags WHERE file_id=%s", (file_id,))
-                tags = [tag for (tag,) in cur.fetchall() or []]
+            value = datetime.fromisoformat(value)
         except Exception:
-            tags = []
-
-        submitted_at = created_at or datetime.now(timezone.utc)
-        if isinstance(submitted_at, datetime):
-            if submitted_at.tzinfo is None:
-                submitted_at = submitted_at.replace(tzinfo=timezone.utc)
-        else:
-            submitted_at = datetime.now(timezone.utc)
-
-        if isinstance(purchase_dt, datetime):
-            purchase_at: Optional[datetime] = (
-                purchase_dt if purchase_dt.tzinfo is not None else purchase_dt.replace(tzinfo=timezone.utc)
-            )
-        elif isinstance(purchase_dt, str):
-            try:
-                parsed = datetime.fromisoformat(purchase_dt)
-                if parsed.tzinfo is None:
-                    parsed = parsed.replace(tzinfo=timezone.utc)
-                purchase_at = parsed
-            except Exception:
-                purchase_at = None
-        else:
-            purchase_at = None
+            return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+    return None
 
-        gross_dec = Decimal(str(gross)) if gross is not None else None
-        net_dec = Decimal(str(net)) if net is not None else None
-        confidence = float(ai_conf) if ai_conf is not None else None
 
+def _receipt_from_context(context: Optional[dict[str, Any]]) -> Optional[Receipt]:
+    if not context:
+        return None
+    try:
+        gross = context.get("gross_amount")
+        net = context.get("net_amount")
+        confidence = context.get("ai_confidence")
         return Receipt(
-            id=rid,
-            submitted_by=submitted_by,
-            submitted_at=submitted_at,
-            merchant_name=merchant_name,
-            orgnr=orgnr,
-            purchase_datetime=purchase_at,
-            gross_amount=gross_dec,
-            net_amount=net_dec,
+            id=context.get("id"),
+            submitted_by=context.get("submitted_by"),
+            submitted_at=_as_utc(context.get("created_at")) or datetime.now(timezone.utc),
+            merchant_name=context.get("merchant_name"),
+            orgnr=context.get("orgnr"),
+            purchase_datetime=_as_utc(context.get("purchase_datetime")),
+            gross_amount=Decimal(str(gross)) if gross is not None else None,
+            net_amount=Decimal(str(net)) if net is not None else None,
             vat_breakdown={},
-            tags=tags,
+            tags=list(context.get("tags") or []),
             location_opt_in=False,
             company_card_flag=False,
             status=ReceiptStatus.PROCESSING,
-            confidence_summary=confidence,
+            confidence_summary=float(confidence) if confidence is not None else None,
         )
     except Exception:
         return None
 
 
-
-
-def _get_file_type(file_id: str) -> Optional[str]:
-    if db_cursor is None:
-        return None
-    try:
-        with db_cursor() as cur:
-            cur.execute("SELECT file_type FROM unified_files WHERE id=%s", (file_id,))
-            row = cur.fetchone()
-            if row:
-                (file_type,) = row
-                return file_type
-    except Exception:
-        return None
-    return None
-
-
 def _collect_text_hints(file_id: str) -> str:
     base = Path(os.getenv("STORAGE_DIR", "/data/storage"))
     hints: List[str] = []
@@ -259,6 +316,10 @@ def _infer_document_type(
     return "other"
 
 
+def _fused_pipeline_enabled() -> bool:
+    return os.getenv("PIPELINE_FUSED", "false").lower() in {"1", "true", "yes"}
+
+
 def _rules_file() -> Path:
     return Path(os.getenv("RULES_FILE", "/data/storage/rules.json"))
 
@@ -321,16 +382,12 @@ def _save_accounting_entries(file_id: str, entries: List[AccountingEntry]) -> bo
         return False
 
 
-@celery_app.task
-@track_task("process_ocr")
-def process_ocr(file_id: str) -> dict[str, Any]:
-    enable_real = (os.getenv("ENABLE_REAL_OCR", "false").lower() in {"1", "true", "yes"})
-    result: dict[str, Any] | None = None
-    if enable_real:
-        try:
-            result = run_ocr(file_id, os.getenv("STORAGE_DIR", "/data/storage"))
-        except Exception:
-            result = None
+def _real_ocr_enabled() -> bool:
+    return os.getenv("ENABLE_REAL_OCR", "false").lower() in {"1", "true", "yes"}
+
+
+def _complete_ocr(file_id: str, result: dict[str, Any] | None) -> dict[str, Any]:
+    """Persist an OCR result and hand the receipt to the next pipeline stage."""
     if result:
         _update_file_fields(
             file_id,
@@ -338,73 +395,189 @@ def process_ocr(file_id: str) -> dict[str, Any]:
             gross=float(result["gross_amount"]) if result.get("gross_amount") is not None else None,
             purchase_iso=result.get("purchase_datetime"),
             ocr_raw=result.get("text"),  # Save the raw OCR text
+            # run_ocr only rewrites line_items/<id>.json when it found items
+            line_item_count=len(result["line_items"]) if result.get("line_items") else None,
         )
-        ok = _update_file_status(file_id, status="ocr_done", confidence=float(result.get("confidence") or 0.9))
+        ok = _finish_stage(file_id, "ocr", "ocr_done", confidence=float(result.get("confidence") or 0.9))
     else:
-        ok = _update_file_status(file_id, status="ocr_done", confidence=0.5)
-    _history(file_id, job="ocr", status="success" if ok else "error")
+        ok = _finish_stage(file_id, "ocr", "ocr_done", confidence=0.5)
+    context = _load_file_context(file_id)
+    next_task = process_receipt_pipeline if _fused_pipeline_enabled() else process_classification
     try:
-        process_classification.delay(file_id)  # type: ignore[attr-defined]
+        next_task.delay(file_id, context)  # type: ignore[attr-defined]
     except Exception:
         try:
-            process_classification.run(file_id)
+            next_task.run(file_id, context)
         except Exception:
             pass
     return {"file_id": file_id, "status": "ocr_done", "ok": ok, "real": bool(result)}
 
 
 @celery_app.task
-@track_task("process_classification")
-def process_classification(file_id: str) -> dict[str, Any]:
-    file_type = _get_file_type(file_id)
-    receipt_model = _load_receipt_model(file_id)
-    merchant = receipt_model.merchant_name if receipt_model else None
-    tags = receipt_model.tags if receipt_model else []
-    gross_decimal = receipt_model.gross_amount if receipt_model else None
+@track_task("process_ocr")
+def process_ocr(file_id: str) -> dict[str, Any]:
+    result: dict[str, Any] | None = None
+    if _real_ocr_enabled():
+        try:
+            result = run_ocr(file_id, os.getenv("STORAGE_DIR", "/data/storage"))
+        except Exception:
+            result = None
+    return _complete_ocr(file_id, result)
+
+
+@celery_app.task
+@track_task("process_ocr_batch")
+def process_ocr_batch(file_ids: List[str]) -> dict[str, Any]:
+    """OCR several receipts in one task so the engine can batch their pages (bulk reprocessing)."""
+    results: dict[str, dict[str, Any]] = {}
+    if _real_ocr_enabled():
+        try:
+            results = run_ocr_batch(file_ids, os.getenv("STORAGE_DIR", "/data/storage"))
+        except Exception:
+            results = {}
+    items = [_complete_ocr(file_id, results.get(file_id)) for file_id in dict.fromkeys(file_ids)]
+    return {"count": len(items), "items": items}
+
+
+def _worker_consumes_ocr() -> bool:
+    try:
+        return "ocr" in celery_app.amqp.queues.consume_from
+    except Exception:
+        return True
 
+
+def _ocr_preload_mode() -> str:
+    """OCR_PRELOAD: ``off`` (lazy, default), ``child`` (each pool process) or ``parent``.
+
+    Workers that do not consume the ``ocr`` queue never preload.
+    """
+    mode = os.getenv("OCR_PRELOAD", "off").strip().lower()
+    if mode not in {"child", "parent"} or not _real_ocr_enabled() or not _worker_consumes_ocr():
+        return "off"
+    return mode
+
+
+def _uses_prefork_pool(worker: Any) -> bool:
+    """Whether ``worker`` (the worker_init sender) runs tasks in forked pool processes."""
+    pool = getattr(worker, "pool_cls", None)
+    if pool is None or get_pool_implementation is None:
+        return False
+    try:
+        pool = get_pool_implementation(pool)
+    except Exception:
+        return False
+    return getattr(pool, "__module__", "") == "celery.concurrency.prefork"
+
+
+def _preload_ocr_in_parent(sender: Any = None, **_kwargs: Any) -> None:
+    """Load model weights in the main worker process before the prefork pool starts.
+
+    Children inherit the loaded engine copy-on-write, so the read-only weights are
+    shared instead of being loaded once per child.
+
+    The OCR executor is per process: under the prefork pool every child would start
+    its own OCR_EXECUTOR_WORKERS processes and the one warmed here would go unused,
+    so it is switched off (OCR runs inline in the children) with a warning.
+
+    Pools without child processes (``threads``, ``solo``) never send
+    worker_process_init, so both preload modes warm the engine fully here instead.
+    """
+    if ocr_executor_workers() > 0 and _worker_consumes_ocr() and _uses_prefork_pool(sender):
+        logger.warning(
+            "OCR_EXECUTOR_WORKERS is ignored with the prefork pool (each child would start its own "
+            "executor); run the OCR worker with --pool=threads to use it"
+        )
+        disable_ocr_executor()
+    mode = _ocr_preload_mode()
+    if mode == "off":
+        return
+    clear_ocr_ready()
+    if ocr_executor_workers() > 0:
+        # The engine lives in the OCR executor's processes; start and warm those instead.
+        start_ocr_executor()
+    elif not _uses_prefork_pool(sender):
+        warm_ocr_engine(run_inference=True)
+    elif mode == "parent":
+        warm_ocr_engine(run_inference=False)
+
+
+def _preload_ocr_in_child(**_kwargs: Any) -> None:
+    """Warm the engine in each pool process before it accepts its first task."""
+    if _ocr_preload_mode() != "off" and ocr_executor_workers() <= 0:
+        warm_ocr_engine(run_inference=True)
+
+
+if worker_init is not None:
+    worker_init.connect(_preload_ocr_in_parent, weak=False)
+if worker_process_init is not None:
+    worker_process_init.connect(_preload_ocr_in_child, weak=False)
+
+
+def _is_company_card(merchant: Optional[str]) -> bool:
     merchants_cfg = os.getenv("COMPANY_CARD_MERCHANTS", "")
     cc_merchants = {m.strip().lower() for m in merchants_cfg.split(",") if m.strip()}
-    company_card = (merchant or "").lower() in cc_merchants if merchant else False
+    return (merchant or "").lower() in cc_merchants if merchant else False
+
+
+def _lookup_company_name(file_id: str, context: Optional[dict[str, Any]]) -> Optional[str]:
+    """Legal name for the receipt's orgnr from the enrichment provider, if any.
 
-    enriched_name = None
+    The provider may call an external registry over HTTP, so this must not run
+    while a DB transaction is open.
+    """
+    orgnr_val = context.get("orgnr") if context else None
+    if not orgnr_val:
+        return None
+    merchant = context.get("merchant_name") if context else None
+    gross_raw = context.get("gross_amount") if context else None
     try:
-        orgnr_val = None
-        if db_cursor is not None:
-            with db_cursor() as cur:
-                cur.execute("SELECT orgnr FROM unified_files WHERE id=%s", (file_id,))
-                row = cur.fetchone()
-                if row:
-                    (orgnr_val,) = row
-        if orgnr_val:
-            company = enrich_receipt(
-                Receipt(
-                    id=file_id,
-                    submitted_by=None,
-                    submitted_at=datetime.now(timezone.utc),
-                    pages=[],
-                    tags=[],
-                    location_opt_in=False,
-                    merchant_name=merchant,
-                    orgnr=str(orgnr_val),
-                    purchase_datetime=None,
-                    gross_amount=gross_decimal,
-                    net_amount=None,
-                    vat_breakdown={},
-                    company_card_flag=company_card,
-                    status=ReceiptStatus.PROCESSING,
-                    confidence_summary=None,
-                ),
-                provider_from_env(),
-            )
-            if company:
-                enriched_name = company.legal_name
+        company = enrich_receipt(
+            Receipt(
+                id=file_id,
+                submitted_by=None,
+                submitted_at=datetime.now(timezone.utc),
+                pages=[],
+                tags=[],
+                location_opt_in=False,
+                merchant_name=merchant,
+                orgnr=str(orgnr_val),
+                purchase_datetime=None,
+                gross_amount=Decimal(str(gross_raw)) if gross_raw is not None else None,
+                net_amount=None,
+                vat_breakdown={},
+                company_card_flag=_is_company_card(merchant),
+                status=ReceiptStatus.PROCESSING,
+                confidence_summary=None,
+            ),
+            provider_from_env(),
+        )
     except Exception:
-        pass
+        return None
+    return company.legal_name if company else None
+
+
+@track_task("process_classification")
+def _run_classification(
+    file_id: str,
+    context: Optional[dict[str, Any]],
+    enriched_name: Optional[str] = None,
+    lookup: bool = True,
+) -> dict[str, Any]:
+    """Classify a file; ``lookup=False`` uses ``enriched_name`` fetched by the caller instead."""
+    file_type = context.get("file_type") if context else None
+    merchant = context.get("merchant_name") if context else None
+    tags = list(context.get("tags") or []) if context else []
+    company_card = _is_company_card(merchant)
+
+    if lookup:
+        enriched_name = _lookup_company_name(file_id, context)
 
     if enriched_name:
         try:
             _update_file_fields(file_id, merchant=enriched_name)
             merchant = enriched_name
+            if context is not None:
+                context["merchant_name"] = enriched_name
         except Exception:
             pass
 
@@ -418,38 +591,44 @@ def process_classification(file_id: str) -> dict[str, Any]:
     }
     status_value = status_map.get(document_type, "classified_other")
 
-    ok = _update_file_status(file_id, status=status_value)
-    _history(file_id, job="classification", status="success" if ok else "error")
+    ok = _finish_stage(file_id, "classification", status_value)
+    return {
+        "file_id": file_id,
+        "status": status_value,
+        "document_type": document_type,
+        "ok": ok,
+        "company_card": company_card,
+    }
+
+
+@celery_app.task
+def process_classification(file_id: str, context: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    if context is None:
+        context = _load_file_context(file_id)
+    result = _run_classification(file_id, context)
 
     validation_triggered = False
-    if document_type == "receipt":
+    if result["document_type"] == "receipt":
         try:
-            process_validation.delay(file_id)  # type: ignore[attr-defined]
+            process_validation.delay(file_id, context)  # type: ignore[attr-defined]
             validation_triggered = True
         except Exception:
             try:
-                process_validation.run(file_id)
+                process_validation.run(file_id, context)
                 validation_triggered = True
             except Exception:
                 validation_triggered = False
 
-    return {
-        "file_id": file_id,
-        "status": status_value,
-        "document_type": document_type,
-        "ok": ok,
-        "company_card": company_card,
-        "validation_triggered": validation_triggered,
-    }
+    result["validation_triggered"] = validation_triggered
+    return result
 
 
-@celery_app.task
 @track_task("process_validation")
-def process_validation(file_id: str) -> dict[str, Any]:
-    receipt = _load_receipt_model(file_id)
+def _run_validation(file_id: str, context: Optional[dict[str, Any]]) -> dict[str, Any]:
+    receipt = _receipt_from_context(context)
     if receipt is None:
         _history(file_id, job="validation", status="error")
-        return {"file_id": file_id, "status": "error", "ok": False}
+        return {"file_id": file_id, "status": "error", "ok": False, "passed": False}
 
     report = validate_receipt(receipt)
     status_map = {
@@ -458,29 +637,41 @@ def process_validation(file_id: str) -> dict[str, Any]:
         ReceiptStatus.FAILED: "failed",
     }
     new_status = status_map.get(report.status, "manual_review")
-    ok = _update_file_status(file_id, status=new_status)
-    _history(file_id, job="validation", status="success" if ok else "error")
-
-    if report.status == ReceiptStatus.PASSED:
-        try:
-            process_accounting_proposal.delay(file_id)  # type: ignore[attr-defined]
-        except Exception:
-            try:
-                process_accounting_proposal.run(file_id)
-            except Exception:
-                pass
+    ok = _finish_stage(file_id, "validation", new_status)
 
     messages = [
         {"message": msg.message, "severity": getattr(msg.severity, "value", str(msg.severity)), "field": msg.field_ref}
         for msg in report.messages
     ]
-    return {"file_id": file_id, "status": new_status, "ok": ok, "messages": messages}
+    return {
+        "file_id": file_id,
+        "status": new_status,
+        "ok": ok,
+        "messages": messages,
+        "passed": report.status == ReceiptStatus.PASSED,
+    }
 
 
 @celery_app.task
+def process_validation(file_id: str, context: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    if context is None:
+        context = _load_file_context(file_id)
+    result = _run_validation(file_id, context)
+
+    if result.pop("passed"):
+        try:
+            process_accounting_proposal.delay(file_id, context)  # type: ignore[attr-defined]
+        except Exception:
+            try:
+                process_accounting_proposal.run(file_id, context)
+            except Exception:
+                pass
+    return result
+
+
 @track_task("process_accounting_proposal")
-def process_accounting_proposal(file_id: str) -> dict[str, Any]:
-    receipt = _load_receipt_model(file_id)
+def _run_accounting_proposal(file_id: str, context: Optional[dict[str, Any]]) -> dict[str, Any]:
+    receipt = _receipt_from_context(context)
     if receipt is None:
         _history(file_id, job="accounting_proposal", status="error")
         return {"file_id": file_id, "status": "error", "ok": False}
@@ -498,6 +689,47 @@ def process_accounting_proposal(file_id: str) -> dict[str, Any]:
     }
 
 
+@celery_app.task
+def process_accounting_proposal(file_id: str, context: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    if context is None:
+        context = _load_file_context(file_id)
+    return _run_accounting_proposal(file_id, context)
+
+
+@celery_app.task
+@track_task("process_receipt_pipeline")
+def process_receipt_pipeline(file_id: str, context: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """Fused fast path: classification, validation and accounting in one task.
+
+    Enabled with PIPELINE_FUSED=true; ``process_ocr`` then enqueues this task instead
+    of ``process_classification``. Each stage still records its own task metrics and
+    ai_processing_history row, but all stages share one DB transaction and the
+    context loaded after OCR. The company lookup, which may be an external HTTP call,
+    runs before the transaction is opened so it never holds locks or a connection.
+    """
+    if context is None:
+        context = _load_file_context(file_id)
+    enriched_name = _lookup_company_name(file_id, context)
+    transaction = db_transaction() if db_transaction is not None else nullcontext()
+    stages: dict[str, Any] = {}
+    with transaction:
+        classification = _run_classification(file_id, context, enriched_name=enriched_name, lookup=False)
+        stages["classification"] = classification
+        if classification["document_type"] == "receipt":
+            validation = _run_validation(file_id, context)
+            passed = validation.pop("passed")
+            stages["validation"] = validation
+            if passed:
+                stages["accounting_proposal"] = _run_accounting_proposal(file_id, context)
+    last = list(stages.values())[-1]
+    return {
+        "file_id": file_id,
+        "status": last.get("status"),
+        "ok": all(stage.get("ok") for stage in stages.values()),
+        "stages": stages,
+    }
+
+
 @celery_app.task
 @track_task("process_invoice_document")
 def process_invoice_document(document_id: str) -> dict[str, Any]:
@@ -524,6 +756,29 @@ def process_matching(statement_id: str) -> dict[str, Any]:
     return {"statement_id": statement_id, "file_id": file_id, "matched": matched}
 
 
+@celery_app.task
+@track_task("process_statement_pdf")
+def process_statement_pdf(document_id: str) -> dict[str, Any]:
+    """Parse a queued company-card statement PDF page by page and bulk-insert its lines."""
+    return import_statement_pdf(document_id)
+
+
+@celery_app.task
+@track_task("process_export")
+def process_export(job_id: str) -> dict[str, Any]:
+    """Render a queued export (see services.exports) into the on-disk result cache."""
+    return run_export_job(job_id)
+
+
+@celery_app.task
+def prune_capture_uploads() -> dict[str, Any]:
+    """Remove abandoned resumable capture uploads (scheduled by celery beat)."""
+    removed = capture_uploads.prune_sessions()
+    if removed:
+        logger.info(f"capture uploads: pruned {removed} abandoned session(s)")
+    return {"removed": removed}
+
+
 @celery_app.task
 def hello(name):
     print(f"Hello, {name}!")
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Formats that are already compressed; deflating them costs CPU and saves nothing.
+STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif", ".zip", ".gz"}
+CHUNK_SIZE = 256 * 1024
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer drained by the generator after each write.
+
+    ZipFile detects that it cannot seek and writes data descriptors after each
+    member instead of patching local headers, so nothing has to be held back.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+@dataclass
+class ZipMember:
+    """One archive entry: in-memory ``data`` or a file produced by ``opener``."""
+
+    arcname: str
+    data: Optional[bytes] = None
+    opener: Optional[Callable[[], BinaryIO]] = None
+
+
+def _info(arcname: str) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+    info.external_attr = 0o644 << 16
+    if PurePosixPath(arcname).suffix.lower() in STORED_SUFFIXES:
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def stream_zip(members: Iterable[ZipMember], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a zip archive of ``members`` piece by piece.
+
+    File members are copied ``chunk_size`` bytes at a time, so peak memory is about
+    one chunk plus the compressor state regardless of archive size. Members whose
+    file cannot be opened are skipped with a warning.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for member in members:
+            source: Optional[BinaryIO] = None
+            if member.data is None:
+                if member.opener is None:
+                    continue
+                try:
+                    source = member.opener()
+                except Exception as e:
+                    logger.warning(f"zip: skipping {member.arcname}: {e}")
+                    continue
+            info = _info(member.arcname)
+            if source is not None:
+                # A known size lets ZipFile decide on ZIP64 up front.
+                try:
+                    info.file_size = os.fstat(source.fileno()).st_size
+                except Exception:
+                    pass
+            try:
+                with zf.open(info, mode="w") as dest:
+                    if source is None:
+                        dest.write(member.data or b"")
+                    else:
+                        while True:
+                            chunk = source.read(chunk_size)
+                            if not chunk:
+                                break
+                            dest.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+            finally:
+                if source is not None:
+                    source.close()
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()
+    if data:
+        yield data
@@ -1,7 +1,7 @@
 import sys
 from pathlib import Path
 from types import SimpleNamespace
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 
 
 def import_app(monkeypatch):
@@ -40,12 +40,12 @@ class FakeDB:
         s = " ".join(str(sql).split()).lower()
         p = params or ()
         if s.startswith("insert into invoice_documents"):
-            doc_id, inv_type, ps, pe = p
+            doc_id, inv_type, ps, pe, status = p
             self.documents[doc_id] = {
                 "invoice_type": inv_type,
                 "period_start": ps,
                 "period_end": pe,
-                "status": "imported",
+                "status": status,
                 "uploaded_at": "2025-09-20",
             }
             self._lastrowid += 1
@@ -64,28 +64,28 @@ class FakeDB:
                     "match_status": None,
                 }
             )
-        elif s.startswith("select id, transaction_date, amount from invoice_lines"):
+        elif s.startswith("select id, transaction_date, amount, merchant_name from invoice_lines"):
             invoice_id = p[0]
             rows = [
-                (ln["id"], ln["transaction_date"], ln["amount"])
+                (ln["id"], ln["transaction_date"], ln["amount"], ln["merchant_name"])
                 for ln in self.lines
                 if ln["invoice_id"] == invoice_id and ln["matched_file_id"] is None
             ]
             self._results = rows
-        elif s.startswith("select id from unified_files"):
-            # Simulate a matching receipt id for our test
-            self._results = [("receipt-1",)]
+        elif s.startswith("select u.id, u.purchase_datetime"):
+            # Simulate a matching receipt for our test
+            self._results = [("receipt-1", "2025-09-10 12:00:00", 112.00, "2025-09-10 12:05:00", "Demo Cafe")]
+        elif s.startswith("select id from invoice_lines where id in"):
+            self._results = [(ln["id"],) for ln in self.lines if ln["id"] in p and ln["matched_file_id"] is None]
         elif s.startswith("update invoice_lines set matched_file_id"):
-            file_id, score, line_id = p
-            for ln in self.lines:
-                if ln["id"] == line_id:
-                    ln["matched_file_id"] = file_id
-                    ln["match_status"] = "auto"
-                    break
-        elif s.startswith("insert into invoice_line_history"):
-            line_id, new_file_id = p
-            self.history.append({"line": line_id, "new": new_file_id})
-            self._lastrowid += 1
+            # CASE id WHEN line THEN file ... (pairs), then scores, then the IN list
+            n = len(p) // 5
+            for line_id, file_id in zip(p[0:2 * n:2], p[1:2 * n:2]):
+                for ln in self.lines:
+                    if ln["id"] == line_id:
+                        ln["matched_file_id"] = file_id
+                        ln["match_status"] = "auto"
+                        break
         elif s.startswith("update invoice_documents set status='matched'"):
             doc_id = p[0]
             if doc_id in self.documents:
@@ -105,6 +105,16 @@ class FakeDB:
             # Default: no results
             self._results = []
 
+    def executemany(self, sql, rows):
+        s = " ".join(str(sql).split()).lower()
+        for row in rows:
+            if s.startswith("insert into invoice_line_history"):
+                line_id, _by, new_file_id, _reason = row
+                self.history.append({"line": line_id, "new": new_file_id})
+                self._lastrowid += 1
+            else:
+                self.execute(sql, row)
+
     def fetchone(self):
         if not self._results:
             return None
@@ -131,8 +141,12 @@ def test_firstcard_import_match_confirm(monkeypatch):
     def fake_db_cursor():
         return fake.cursor()
 
-    # Overwrite the module-level db_cursor used by the blueprint
+    # Overwrite the module-level db_cursor used by the blueprint and its services
     mod.db_cursor = fake_db_cursor  # type: ignore
+    for name in ("services.card_matching", "services.statement_import"):
+        service = import_module(name)
+        monkeypatch.setattr(service, "db_cursor", fake_db_cursor)
+        monkeypatch.setattr(service, "db_transaction", nullcontext)
 
     # 1) Import statement with a single line
     body = {
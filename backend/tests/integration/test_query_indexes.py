@@ -0,0 +1,141 @@
+"""EXPLAIN checks for the hot query shapes against a migrated MySQL.
+
+Each query must be able to use its index (``possible_keys``), and on tables big
+enough for the optimizer to care it must not fall back to a full scan.
+Skipped when the database is not reachable.
+"""
+
+import os
+
+import pytest
+
+# Below this many rows MySQL may prefer a full scan even with a usable index.
+MIN_ROWS = int(os.environ.get("EXPLAIN_MIN_ROWS", "1000"))
+
+HOT_QUERIES = [
+    (
+        "receipts_cursor_page",
+        "unified_files",
+        "idx_unified_files_created_id",
+        "SELECT id FROM unified_files WHERE created_at <= %s AND (created_at < %s OR id < %s) "
+        "ORDER BY created_at DESC, id DESC LIMIT 51",
+        ("2025-09-01 12:00:00", "2025-09-01 12:00:00", "R1"),
+    ),
+    (
+        "receipts_by_status",
+        "unified_files",
+        "idx_unified_files_status_created",
+        "SELECT id FROM unified_files WHERE ai_status = %s ORDER BY created_at DESC, id DESC LIMIT 51",
+        ("completed",),
+    ),
+    (
+        "receipts_by_purchase_date",
+        "unified_files",
+        "idx_unified_files_purchase_dt",
+        "SELECT id FROM unified_files WHERE purchase_datetime >= %s AND purchase_datetime <= %s",
+        ("2025-08-01", "2025-08-31"),
+    ),
+    (
+        "receipts_search",
+        "unified_files",
+        "ft_unified_files_search",
+        "SELECT id, MATCH(merchant_name, ocr_raw) AGAINST (%s IN BOOLEAN MODE) AS score FROM unified_files "
+        "WHERE MATCH(merchant_name, ocr_raw) AGAINST (%s IN BOOLEAN MODE) "
+        "ORDER BY score DESC, created_at DESC, id DESC LIMIT 51",
+        ("+kaffe*", "+kaffe*"),
+    ),
+    (
+        "receipts_by_orgnr",
+        "unified_files",
+        "idx_unified_files_orgnr",
+        "SELECT id FROM unified_files WHERE orgnr = %s",
+        ("556677-8899",),
+    ),
+    (
+        "receipts_tag_subquery",
+        "file_tags",
+        "idx_file_tags_tag",
+        "SELECT file_id FROM file_tags WHERE tag IN (%s, %s)",
+        ("meal", "travel"),
+    ),
+    (
+        "list_unprocessed",
+        "unified_files",
+        "idx_unified_files_status_created",
+        "SELECT id FROM unified_files WHERE ai_status IS NULL OR ai_status IN ('new','queued') "
+        "ORDER BY created_at DESC LIMIT 50",
+        (),
+    ),
+    (
+        "company_card_match_candidates",
+        "unified_files",
+        "idx_unified_files_purchase_dt",
+        "SELECT u.id, u.purchase_datetime, u.gross_amount FROM unified_files u "
+        "WHERE u.purchase_datetime >= %s AND u.purchase_datetime < %s + INTERVAL 1 DAY "
+        "AND u.gross_amount IS NOT NULL "
+        "AND NOT EXISTS (SELECT 1 FROM invoice_lines il WHERE il.matched_file_id = u.id)",
+        ("2025-08-01", "2025-08-31"),
+    ),
+    (
+        "invoice_lines_by_invoice",
+        "invoice_lines",
+        "idx_invoice_lines_invoice_date",
+        "SELECT id, transaction_date, amount FROM invoice_lines WHERE invoice_id=%s ORDER BY transaction_date ASC, id ASC",
+        ("DOC-1",),
+    ),
+    (
+        "invoice_lines_unmatched",
+        "invoice_lines",
+        "idx_invoice_lines_matched_file",
+        "SELECT COUNT(1) FROM invoice_lines WHERE matched_file_id IS NULL",
+        (),
+    ),
+    (
+        "company_card_documents",
+        "invoice_documents",
+        "idx_invoice_documents_type_uploaded",
+        "SELECT id, uploaded_at, status FROM invoice_documents WHERE invoice_type='company_card' "
+        "ORDER BY uploaded_at DESC LIMIT 100",
+        (),
+    ),
+    (
+        "processing_history_by_file",
+        "ai_processing_history",
+        "idx_ai_processing_history_file",
+        "SELECT job_type, status FROM ai_processing_history WHERE file_id=%s ORDER BY created_at",
+        ("F1",),
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def db():
+    try:
+        from services.db.connection import get_connection
+
+        cnx = get_connection()
+    except Exception as exc:
+        pytest.skip(f"database not reachable: {exc}")
+    yield cnx
+    cnx.close()
+
+
+def _explain(cnx, sql, params):
+    cur = cnx.cursor()
+    try:
+        cur.execute("EXPLAIN " + sql, params)
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+    finally:
+        cur.close()
+
+
+@pytest.mark.parametrize("name,table,index,sql,params", HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_index(db, name, table, index, sql, params):
+    plan = [row for row in _explain(db, sql, params) if row.get("table") == table]
+    assert plan, f"{name}: {table} missing from plan"
+    for row in plan:
+        possible = (row.get("possible_keys") or "").split(",")
+        assert index in possible or row.get("key") == index, f"{name}: {index} not usable: {row}"
+        if int(row.get("rows") or 0) >= MIN_ROWS:
+            assert row.get("type") != "ALL", f"{name}: full scan of {table}: {row}"
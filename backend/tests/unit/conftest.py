@@ -0,0 +1,158 @@
+import sys
+from contextlib import contextmanager
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+
+class CaptureDB:
+    """In-memory stand-in for the tables the capture endpoints write.
+
+    ``hashes`` presets content_hash -> file id rows; ``fail_insert`` is raised by
+    the unified_files INSERT (e.g. a duplicate-entry or connection error).
+    """
+
+    def __init__(self, hashes=None, fail_insert=None):
+        self.hashes = dict(hashes or {})
+        self.fail_insert = fail_insert
+        self.log = []
+        self.rows = []
+        self.tags = []
+        self.queries = 0
+        self.transactions = 0
+        self.in_tx = False
+
+    @contextmanager
+    def cursor(self):
+        db = self
+
+        class Cur:
+            def execute(self, sql, params=()):
+                db.log.append((sql, params, db.in_tx))
+                self._rows = []
+                if "content_hash IN" in sql:
+                    db.queries += 1
+                    self._rows = [(h, db.hashes[h]) for h in params if h in db.hashes]
+                elif sql.startswith("INSERT INTO unified_files"):
+                    if db.fail_insert is not None:
+                        raise db.fail_insert
+                    db.rows.append(params)
+                    if params[-1] is not None:
+                        db.hashes[params[-1]] = params[0]
+
+            def executemany(self, sql, rows):
+                rows = list(rows)
+                db.log.append((sql, rows, db.in_tx))
+                if sql.startswith("INSERT INTO file_tags"):
+                    db.tags.extend(rows)
+
+            def fetchall(self):
+                return self._rows
+
+        yield Cur()
+
+    @contextmanager
+    def transaction(self):
+        self.transactions += 1
+        self.in_tx = True
+        try:
+            yield
+        finally:
+            self.in_tx = False
+
+
+class FakeCursor:
+    """Records ``(sql, params)`` per execute and answers with canned rows.
+
+    ``rows`` is what fetchall returns, ``stream`` is handed out by fetchmany, and
+    fetchone answers ``(total,)`` (the number of ``rows`` unless set). ``fetched``
+    keeps the SQL each fetchall answered.
+    """
+
+    def __init__(self, rows=(), total=None, stream=()):
+        self.rows = list(rows)
+        self.total = total
+        self.stream = list(stream)
+        self.executed = []
+        self.fetched = []
+        self.fetchmany_calls = 0
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return (len(self.rows) if self.total is None else self.total,)
+
+    def fetchall(self):
+        self.fetched.append(self.executed[-1][0])
+        return self.rows
+
+    def fetchmany(self, size):
+        self.fetchmany_calls += 1
+        batch, self.stream = self.stream[:size], self.stream[size:]
+        return batch
+
+
+@pytest.fixture
+def fake_cursor():
+    """An empty :class:`FakeCursor`; tests fill in ``rows``/``total``/``stream``."""
+    return FakeCursor()
+
+
+@pytest.fixture
+def blueprint_client(monkeypatch, fake_cursor):
+    """Factory for a Flask test client serving one blueprint.
+
+    ``blueprint_client(bp, module)`` patches ``module.db_cursor`` to yield
+    ``fake_cursor``, or the ``cursor`` passed in.
+    """
+    from flask import Flask
+
+    def make(blueprint, module, cursor=None):
+        current = fake_cursor if cursor is None else cursor
+
+        @contextmanager
+        def db_cursor():
+            yield current
+
+        monkeypatch.setattr(module, "db_cursor", db_cursor)
+        app = Flask(__name__)
+        app.register_blueprint(blueprint)
+        return app.test_client()
+
+    return make
+
+
+@pytest.fixture
+def capture_db(request):
+    """A :class:`CaptureDB`; parametrise indirectly with its keyword arguments."""
+    return CaptureDB(**getattr(request, "param", {}))
+
+
+@pytest.fixture
+def capture_client(monkeypatch, tmp_path, capture_db):
+    """Flask test client for the ingest blueprint, storing under ``tmp_path``.
+
+    Returns ``(client, queued)``; ``queued`` collects the receipt ids sent to OCR.
+    """
+    from flask import Flask
+
+    capture = import_module("services.capture")
+    dedup = import_module("services.dedup")
+    ingest = import_module("api.ingest")
+
+    queued = []
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(dedup, "db_cursor", capture_db.cursor)
+    monkeypatch.setattr(capture, "db_cursor", capture_db.cursor)
+    monkeypatch.setattr(capture, "db_transaction", capture_db.transaction)
+    monkeypatch.setattr(ingest, "process_ocr", type("Task", (), {"delay": staticmethod(queued.append)}))
+    app = Flask(__name__)
+    app.register_blueprint(ingest.ingest_bp)
+    return app.test_client(), queued
@@ -0,0 +1,181 @@
+import io
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+import pytest  # noqa: E402
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+capture = import_module("services.capture")
+ingest = import_module("api.ingest")
+storage = import_module("services.storage")
+
+JPEG = b"\xff\xd8\xff\xe0\x00\x10JFIF" + b"\x00" * 64
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def test_sniff_recognises_common_capture_formats():
+    assert capture.sniff(JPEG) == (".jpg", "image/jpeg")
+    assert capture.sniff(PNG) == (".png", "image/png")
+    assert capture.sniff(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == (".webp", "image/webp")
+    assert capture.sniff(b"\x00\x00\x00\x18ftypheic") == (".heic", "image/heic")
+    assert capture.sniff(b"%PDF-1.7") == (".pdf", "application/pdf")
+    assert capture.sniff(b"abc") is None
+
+
+def test_page_writer_streams_to_disk_and_renames_on_commit(tmp_path):
+    fs = storage.FileStorage(tmp_path)
+    page = capture.PageWriter(fs, "R1", 1)
+    for start in range(0, len(PNG), 5):
+        page.write(PNG[start:start + 5])
+    assert (tmp_path / "R1" / "page-1.part").exists()
+
+    assert page.commit("photo.jpg") == "page-1.png"
+    assert (tmp_path / "R1" / "page-1.png").read_bytes() == PNG
+    assert not (tmp_path / "R1" / "page-1.part").exists()
+    assert page.kind == (".png", "image/png") and page.size == len(PNG)
+
+    unknown = capture.PageWriter(fs, "R1", 2)
+    unknown.write(b"abc")
+    assert unknown.commit("scan.tiff") == "page-2.tiff"
+
+
+def test_capture_upload_stores_sniffed_pages_and_writes_rows_in_one_transaction(capture_client, capture_db, tmp_path):
+    client, queued = capture_client
+    data = {
+        "tags": json.dumps(["travel", "", 7, " food ", "travel", "x" * 100]),
+        "location": json.dumps({"lat": 59.3, "lon": 18.0, "acc": 5}),
+        "images": [(io.BytesIO(PNG), "IMG_1.jpg"), (io.BytesIO(JPEG), "IMG_2.jpg")],
+    }
+
+    resp = client.post("/capture/upload", data=data, content_type="multipart/form-data")
+
+    body = resp.get_json()
+    rid = body["receipt_id"]
+    assert body["saved"] == ["page-1.png", "page-2.jpg"]
+    assert sorted(p.name for p in (tmp_path / rid).iterdir()) == ["page-1.png", "page-2.jpg"]
+    assert (tmp_path / rid / "page-2.jpg").read_bytes() == JPEG
+    assert queued == [rid]
+
+    writes = [entry for entry in capture_db.log if not entry[0].startswith("SELECT")]
+    assert capture_db.transactions == 1 and all(in_tx for _, _, in_tx in writes)
+    (row_sql, row, _), (tag_sql, tags, _), (loc_sql, loc, _) = writes
+    assert row[:5] == (rid, "receipt", "anonymous", "IMG_1.jpg", "image/png")
+    assert tags == [(rid, "travel"), (rid, "food"), (rid, "x" * capture.TAG_MAX_LENGTH)]
+    assert loc == (rid, 59.3, 18.0, 5)
+
+
+@pytest.mark.parametrize("location", [{"lat": "north", "lon": 18.0}, {"lat": 91, "lon": 0}, {"lon": 1}, [1, 2]])
+def test_capture_upload_drops_an_unusable_location(capture_client, capture_db, location):
+    client, queued = capture_client
+    data = {"location": json.dumps(location), "images": [(io.BytesIO(JPEG), "IMG_1.jpg")]}
+
+    resp = client.post("/capture/upload", data=data, content_type="multipart/form-data")
+
+    assert resp.status_code == 200 and queued == [resp.get_json()["receipt_id"]]
+    assert not any("file_locations" in sql for sql, _, _ in capture_db.log)
+
+
+@pytest.mark.parametrize("capture_db", [{"fail_insert": RuntimeError("Lost connection")}], indirect=True)
+def test_capture_upload_that_cannot_be_recorded_fails_and_keeps_nothing(capture_client, tmp_path):
+    client, queued = capture_client
+    data = {"images": [(io.BytesIO(JPEG), "IMG_1.jpg")]}
+
+    resp = client.post("/capture/upload", data=data, content_type="multipart/form-data")
+
+    assert resp.status_code == 500 and resp.get_json() == {"ok": False, "error": "record_failed"}
+    assert list(tmp_path.iterdir()) == [] and queued == []
+
+
+def test_capture_upload_without_images_leaves_nothing_behind(capture_client, capture_db, tmp_path):
+    client, _queued = capture_client
+    data = {"other": (io.BytesIO(b"x"), "x.bin")}
+
+    resp = client.post("/capture/upload", data=data, content_type="multipart/form-data")
+
+    assert resp.status_code == 400 and resp.get_json()["error"] == "no_images"
+    assert list(tmp_path.iterdir()) == [] and capture_db.log == []
+
+
+def test_capture_upload_keeps_the_multipart_part_limit(capture_client, capture_db, tmp_path):
+    client, queued = capture_client
+    client.application.config["MAX_FORM_PARTS"] = 3
+    data = {"images": [(io.BytesIO(JPEG), f"p{i}.jpg") for i in range(5)]}
+
+    resp = client.post("/capture/upload", data=data, content_type="multipart/form-data")
+
+    assert resp.status_code == 413
+    assert list(tmp_path.iterdir()) == [] and capture_db.log == [] and queued == []
+
+
+class _LazyMultipart(io.RawIOBase):
+    """A multipart body with one large image, generated as it is read."""
+
+    BOUNDARY = "capture-boundary"
+    FILLER = bytes(range(256)) * 256
+
+    def __init__(self, image_size):
+        head = (
+            f"--{self.BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="images"; filename="big.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + JPEG
+        self._parts = [head, None, f"\r\n--{self.BOUNDARY}--\r\n".encode()]
+        self._filler = image_size - len(JPEG)
+        self.length = len(head) + self._filler + len(self._parts[2])
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while self._parts:
+            part = self._parts[0]
+            if part is None:
+                if self._filler <= 0:
+                    self._parts.pop(0)
+                    continue
+                n = min(len(buf), self._filler, len(self.FILLER))
+                buf[:n] = self.FILLER[:n]
+                self._filler -= n
+                return n
+            if not part:
+                self._parts.pop(0)
+                continue
+            n = min(len(buf), len(part))
+            buf[:n] = part[:n]
+            self._parts[0] = part[n:]
+            return n
+        return 0
+
+
+def test_capture_upload_memory_does_not_grow_with_image_size(capture_client, tmp_path):
+    client, _queued = capture_client
+    size = 16 * 1024 * 1024
+    body = _LazyMultipart(size)
+
+    environ = EnvironBuilder(path="/capture/upload", method="POST").get_environ()
+    environ.update({
+        "wsgi.input": body,
+        "CONTENT_LENGTH": str(body.length),
+        "CONTENT_TYPE": f"multipart/form-data; boundary={body.BOUNDARY}",
+    })
+
+    tracemalloc.start()
+    try:
+        with client.application.request_context(environ):
+            resp, _status = ingest.capture_upload()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    rid = resp.get_json()["receipt_id"]
+    assert (tmp_path / rid / "page-1.jpg").stat().st_size == size
+    assert peak < 2 * 1024 * 1024
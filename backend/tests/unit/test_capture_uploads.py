@@ -0,0 +1,143 @@
+import fcntl
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+dedup = import_module("services.dedup")
+capture_uploads = import_module("services.capture_uploads")
+
+JPEG = b"\xff\xd8\xff\xe0\x00\x10JFIF" + bytes(range(256)) * 4
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 2
+
+
+def _create(client, *pages, **extra):
+    body = {"pages": [{"size": len(p), "filename": f"IMG_{i}.jpg"} for i, p in enumerate(pages, 1)], **extra}
+    resp = client.post("/capture/uploads", json=body)
+    assert resp.status_code == 201, resp.data
+    return resp.get_json()["upload_id"]
+
+
+def _put(client, upload_id, page, offset, data):
+    return client.put(f"/capture/uploads/{upload_id}/pages/{page}?offset={offset}", data=data)
+
+
+def test_resumed_upload_only_resends_missing_bytes(capture_client, capture_db, tmp_path):
+    client, queued = capture_client
+    upload_id = _create(client, JPEG, PNG, tags=["travel"], location={"lat": 59.3, "lon": 18.0})
+
+    assert _put(client, upload_id, 1, 0, JPEG).get_json()["received"] == len(JPEG)
+    assert _put(client, upload_id, 2, 0, PNG[:100]).get_json()["received"] == 100
+    # The connection drops; the client asks where to continue.
+    state = client.get(f"/capture/uploads/{upload_id}").get_json()
+    assert [(p["index"], p["received"]) for p in state["pages"]] == [(1, len(JPEG)), (2, 100)]
+    assert state["complete"] is False
+    assert client.post(f"/capture/uploads/{upload_id}/finalize").status_code == 409
+
+    # A stale offset is refused with the real one rather than duplicating bytes.
+    stale = _put(client, upload_id, 2, 50, PNG[50:])
+    assert stale.status_code == 409 and stale.get_json()["received"] == 100
+    assert _put(client, upload_id, 2, 100, PNG[100:]).status_code == 200
+
+    result = client.post(f"/capture/uploads/{upload_id}/finalize").get_json()
+
+    rid = result["receipt_id"]
+    assert result["saved"] == ["page-1.jpg", "page-2.png"]
+    assert (tmp_path / rid / "page-2.png").read_bytes() == PNG
+    assert queued == [rid]
+    [row] = capture_db.rows
+    assert row[:5] == (rid, "receipt", "anonymous", "IMG_1.jpg", "image/jpeg")
+    assert row[-1] == dedup.combine([hashlib.sha256(JPEG).hexdigest(), hashlib.sha256(PNG).hexdigest()])
+    assert capture_db.tags == [(rid, "travel")]
+
+    # Finalising again (lost response) returns the same receipt without another OCR job.
+    assert client.post(f"/capture/uploads/{upload_id}/finalize").get_json() == result
+    assert queued == [rid]
+    assert _put(client, upload_id, 1, 0, b"x").status_code == 409
+
+
+def test_chunk_beyond_declared_size_is_rejected(capture_client, tmp_path):
+    client, _queued = capture_client
+    upload_id = _create(client, b"1234")
+
+    resp = _put(client, upload_id, 1, 0, b"123456")
+
+    assert resp.status_code == 413
+    assert client.get(f"/capture/uploads/{upload_id}").get_json()["pages"][0]["received"] == 0
+
+
+def test_create_validates_pages(capture_client, monkeypatch):
+    client, _queued = capture_client
+    monkeypatch.setenv("CAPTURE_UPLOAD_MAX_PAGE_MB", "1")
+
+    assert client.post("/capture/uploads", json={"pages": []}).get_json()["error"] == "no_images"
+    assert client.post("/capture/uploads", json={"pages": [{"size": "x"}]}).status_code == 400
+    assert client.post("/capture/uploads", json={"pages": [{"size": 2 * 1024 * 1024}]}).status_code == 413
+    assert client.get("/capture/uploads/../../etc").status_code == 404
+    assert client.get("/capture/uploads/" + "0" * 32).status_code == 404
+
+
+def test_abandoned_sessions_are_pruned(capture_client, tmp_path):
+    client, _queued = capture_client
+    old = _create(client, b"1234")
+    _put(client, old, 1, 0, b"12")
+    stamp = time.time() - 25 * 3600
+    os.utime(tmp_path / "uploads" / old / "session.json", (stamp, stamp))
+
+    fresh = _create(client, b"1234")
+
+    assert sorted(p.name for p in (tmp_path / "uploads").iterdir()) == [fresh]
+    assert client.get(f"/capture/uploads/{old}").status_code == 404
+
+
+def test_prune_skips_a_session_whose_lock_is_held(capture_client, tmp_path):
+    client, _queued = capture_client
+    busy = _create(client, b"1234")
+    idle = _create(client, b"1234")
+    stamp = time.time() - 25 * 3600
+    for upload_id in (busy, idle):
+        os.utime(tmp_path / "uploads" / upload_id / "session.json", (stamp, stamp))
+
+    with (tmp_path / "uploads" / busy / ".lock").open("a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        assert capture_uploads.prune_sessions() == 1
+
+    assert [p.name for p in (tmp_path / "uploads").iterdir()] == [busy]
+    assert capture_uploads.prune_sessions() == 1
+    assert list((tmp_path / "uploads").iterdir()) == []
+
+
+def test_abort_removes_session(capture_client, tmp_path):
+    client, _queued = capture_client
+    upload_id = _create(client, b"1234")
+    assert client.delete(f"/capture/uploads/{upload_id}").status_code == 200
+    assert list((tmp_path / "uploads").iterdir()) == []
+
+
+def test_finalize_that_cannot_be_recorded_keeps_the_session_open(capture_client, capture_db, tmp_path):
+    client, queued = capture_client
+    upload_id = _create(client, JPEG, PNG)
+    _put(client, upload_id, 1, 0, JPEG)
+    _put(client, upload_id, 2, 0, PNG)
+    capture_db.fail_insert = RuntimeError("Lost connection")
+
+    resp = client.post(f"/capture/uploads/{upload_id}/finalize")
+
+    assert resp.status_code == 500 and resp.get_json()["error"] == "record_failed"
+    assert queued == [] and [p.name for p in tmp_path.iterdir()] == ["uploads"]
+    state = client.get(f"/capture/uploads/{upload_id}").get_json()
+    assert state["status"] == "open" and state["complete"] is True
+
+    # The retry once the database is back goes through with the same bytes.
+    capture_db.fail_insert = None
+    result = client.post(f"/capture/uploads/{upload_id}/finalize").get_json()
+    assert (tmp_path / result["receipt_id"] / "page-2.png").read_bytes() == PNG
+    assert queued == [result["receipt_id"]]
@@ -0,0 +1,174 @@
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+cm = import_module("services.card_matching")
+
+
+def test_to_ore_rounds_half_up_and_rejects_garbage():
+    assert cm.to_ore(Decimal("125.00")) == 12500
+    assert cm.to_ore(99.995) == 10000
+    assert cm.to_ore("12,5") is None
+    assert cm.to_ore(None) is None
+
+
+def test_merchant_similarity_ignores_case_accents_numbers_and_legal_forms():
+    assert cm.normalize_merchant("ICA Nära Södermalm 1234 AB") == "ica nara sodermalm"
+    assert cm.merchant_similarity("ICA NARA SODERMALM", "ICA Nära Södermalm AB") == 1.0
+    assert cm.merchant_similarity("SumUp *Espresso House 123", "Espresso House") == 1.0
+    assert cm.merchant_similarity("Shell", "Circle K") == 0.0
+    assert cm.merchant_similarity("Shell", None) is None
+    assert 0 < cm.merchant_similarity("Espresso House Odenplan", "Espresso House") < 1
+
+
+def test_match_scored_tolerates_posting_delay_and_fx_difference():
+    lines = [cm.StatementLine(1, date(2025, 9, 2), 10150, "AMAZON EU SARL")]
+    receipts = [
+        cm.CandidateReceipt("fx", date(2025, 8, 31), 10000, merchant="Amazon EU"),
+        cm.CandidateReceipt("too-late", date(2025, 8, 20), 10150, merchant="Amazon EU"),
+        cm.CandidateReceipt("too-far", date(2025, 9, 2), 20000, merchant="Amazon EU"),
+    ]
+    matches = cm.match_scored(lines, receipts)
+    assert [(m.line_id, m.file_id) for m in matches] == [(1, "fx")]
+    assert cm.min_score() <= matches[0].score < 1
+
+
+def test_match_scored_prefers_exact_day_amount_and_merchant():
+    day = date(2025, 8, 31)
+    lines = [cm.StatementLine(1, day, 12500, "Espresso House")]
+    receipts = [
+        cm.CandidateReceipt("other-merchant", day, 12500, merchant="Pressbyrån"),
+        cm.CandidateReceipt("same", day, 12500, merchant="ESPRESSO HOUSE 17"),
+        cm.CandidateReceipt("day-before", day - timedelta(days=1), 12500, merchant="Espresso House"),
+    ]
+    [match] = cm.match_scored(lines, receipts)
+    assert match.file_id == "same" and match.score == 1.0
+
+
+def test_min_score_is_configurable(monkeypatch):
+    lines = [cm.StatementLine(1, date(2025, 9, 3), 10100, "Shell")]
+    receipts = [cm.CandidateReceipt("r", date(2025, 8, 31), 10000, merchant="Circle K")]
+    assert cm.match_scored(lines, receipts) == []
+    monkeypatch.setenv("CARD_MATCH_MIN_SCORE", "0.4")
+    assert [m.file_id for m in cm.match_scored(lines, receipts)] == ["r"]
+
+
+def test_assign_resolves_conflicts_globally_not_greedily():
+    # Greedy would give line 1 receipt A (0.9) and leave line 2 unmatched.
+    edges = [(1, "A", 0.9), (1, "B", 0.85), (2, "A", 0.88)]
+    assert [(m.line_id, m.file_id) for m in cm.assign(edges)] == [(1, "B"), (2, "A")]
+    # More lines than receipts: the weaker claim is left unmatched.
+    edges = [(1, "A", 0.7), (2, "A", 0.95), (3, "B", 0.8)]
+    assert [(m.line_id, m.file_id) for m in cm.assign(edges)] == [(2, "A"), (3, "B")]
+
+
+def test_assign_falls_back_to_greedy_for_huge_components(monkeypatch):
+    monkeypatch.setattr(cm, "MAX_ASSIGNMENT_SIZE", 1)
+    edges = [(1, "A", 0.9), (1, "B", 0.85), (2, "A", 0.88)]
+    assert [(m.line_id, m.file_id) for m in cm.assign(edges)] == [(1, "A")]
+
+
+def test_match_scored_scales_with_blocking():
+    start = date(2025, 1, 1)
+    lines = [cm.StatementLine(i, start + timedelta(days=i % 300), 1000 + i * 37) for i in range(2000)]
+    receipts = [cm.CandidateReceipt(f"R{i}", start + timedelta(days=i % 300), 1000 + i * 37)
+                for i in range(0, 20000)]
+    matches = cm.match_scored(lines, receipts)
+    assert len(matches) == 2000
+    assert all(m.file_id == f"R{m.line_id}" for m in matches)
+
+
+class _Cursor:
+    def __init__(self, log, lines, receipts, open_ids=None):
+        self.log = log
+        self.lines = lines
+        self.receipts = receipts
+        self.open_ids = open_ids
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        self.log.append((sql, params))
+        if sql.startswith("SELECT id, transaction_date"):
+            self._rows = self.lines
+        elif sql.startswith("SELECT u.id"):
+            self._rows = self.receipts
+        elif "FOR UPDATE" in sql:
+            ids = params if self.open_ids is None else [i for i in params if i in self.open_ids]
+            self._rows = [(i,) for i in ids]
+        else:
+            self._rows = []
+
+    def executemany(self, sql, rows):
+        self.log.append((sql, list(rows)))
+
+    def fetchall(self):
+        return self._rows
+
+
+def _wire(monkeypatch, lines, receipts, open_ids=None):
+    log: list = []
+    transactions: list = []
+
+    @contextmanager
+    def fake_cursor():
+        yield _Cursor(log, lines, receipts, open_ids)
+
+    @contextmanager
+    def fake_transaction():
+        transactions.append(True)
+        yield
+
+    monkeypatch.setattr(cm, "db_cursor", fake_cursor)
+    monkeypatch.setattr(cm, "db_transaction", fake_transaction)
+    return log, transactions
+
+
+def test_match_statement_reads_twice_and_writes_in_batches(monkeypatch):
+    monkeypatch.setattr(cm, "UPDATE_BATCH", 2)
+    day = date(2025, 8, 31)
+    lines = [(i, day, Decimal("10.00") + i, "Shop") for i in range(1, 6)]
+    receipts = [(f"R{i}", datetime(2025, 8, 31, 12), Decimal("10.00") + i, datetime(2025, 9, 1), "Shop")
+                for i in range(1, 6)]
+    log, transactions = _wire(monkeypatch, lines, receipts)
+
+    matches = cm.match_statement("DOC-1")
+
+    assert [(m.line_id, m.file_id) for m in matches] == [(i, f"R{i}") for i in range(1, 6)]
+    selects = [sql for sql, _ in log if sql.startswith("SELECT") and "FOR UPDATE" not in sql]
+    assert len(selects) == 2
+    candidates = next(params for sql, params in log if sql.startswith("SELECT u.id"))
+    assert candidates == ("2025-08-28", "2025-09-03")
+    updates = [params for sql, params in log if sql.startswith("UPDATE invoice_lines")]
+    assert len(updates) == 3
+    assert updates[0] == (1, "R1", 2, "R2", 1, 1.0, 2, 1.0, 1, 2)
+    history = [rows for sql, rows in log if sql.startswith("INSERT INTO invoice_line_history")]
+    assert len(history) == 1 and len(history[0]) == 5
+    assert transactions == [True]
+
+
+def test_lines_matched_concurrently_are_skipped(monkeypatch):
+    day = date(2025, 8, 31)
+    lines = [(1, day, Decimal("10.00"), None), (2, day, Decimal("20.00"), None)]
+    receipts = [("R1", day, Decimal("10.00"), None, None), ("R2", day, Decimal("20.00"), None, None)]
+    log, _ = _wire(monkeypatch, lines, receipts, open_ids={2})
+
+    matches = cm.match_statement("DOC-1")
+
+    assert [(m.line_id, m.file_id) for m in matches] == [(2, "R2")]
+    history = [rows for sql, rows in log if sql.startswith("INSERT INTO invoice_line_history")]
+    assert history == [[(2, "system", "R2", "auto-match")]]
+
+
+def test_no_open_lines_touches_nothing_else(monkeypatch):
+    log, transactions = _wire(monkeypatch, [], [])
+    assert cm.match_statement("DOC-1") == []
+    assert len(log) == 1 and not transactions
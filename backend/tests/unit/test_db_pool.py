@@ -0,0 +1,193 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+connection = import_module("services.db.connection")
+ConnectionPool = connection.ConnectionPool
+PoolTimeout = connection.PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.closed = False
+        self.autocommit = True
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.commits = 0
+        self.pings = 0
+        self.alive = True
+
+    def ping(self, reconnect: bool = False) -> None:
+        self.pings += 1
+        if not self.alive:
+            raise RuntimeError("gone")
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self) -> None:
+        self.closed = True
+
+    def start_transaction(self) -> None:
+        self.in_transaction = True
+
+    def commit(self) -> None:
+        self.commits += 1
+        self.in_transaction = False
+
+    def cursor(self, buffered: bool = False):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, cnx: "FakeConnection") -> None:
+        self.connection = cnx
+
+    def close(self) -> None:
+        pass
+
+
+class Factory:
+    def __init__(self) -> None:
+        self.created: list[FakeConnection] = []
+
+    def __call__(self) -> FakeConnection:
+        cnx = FakeConnection()
+        self.created.append(cnx)
+        return cnx
+
+
+def test_pool_reuses_released_connections():
+    factory = Factory()
+    pool = ConnectionPool(size=2, factory=factory)
+
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    pool.release(second)
+
+    assert len(factory.created) == 1
+    assert first.cnx is second.cnx
+    assert pool.idle == 1 and pool.checked_out == 0
+
+
+def test_pool_blocks_at_size_and_times_out():
+    pool = ConnectionPool(size=1, timeout=0.05, factory=Factory())
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    pool.release(held)
+    assert pool.checked_out == 0
+
+
+def test_pool_wakes_waiter_on_release():
+    pool = ConnectionPool(size=1, timeout=2.0, factory=Factory())
+    held = pool.acquire()
+    got: list = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    pool.release(held)
+    waiter.join(timeout=2.0)
+
+    assert got and got[0].cnx is held.cnx
+
+
+def test_pool_recycles_expired_and_unhealthy_connections():
+    factory = Factory()
+    pool = ConnectionPool(size=2, max_lifetime=3600, ping_interval=0, factory=factory)
+
+    pooled = pool.acquire()
+    pool.release(pooled)
+    factory.created[0].alive = False
+
+    again = pool.acquire()
+    assert factory.created[0].closed is True
+    assert again.cnx is factory.created[1]
+    pool.release(again)
+
+    pool.max_lifetime = 0.000001
+    expired = pool.acquire()
+    pool.release(expired)
+    assert pool.idle == 0
+    assert expired.cnx.closed is True
+
+
+def test_pool_rolls_back_open_transactions_on_release():
+    factory = Factory()
+    pool = ConnectionPool(size=1, factory=factory)
+    pooled = pool.acquire()
+    pooled.cnx.in_transaction = True
+    pooled.cnx.autocommit = False
+    pool.release(pooled)
+
+    assert pooled.cnx.rollbacks == 1
+    assert pooled.cnx.autocommit is True
+    assert pool.idle == 1
+
+
+def test_pool_discard_closes_connection():
+    pool = ConnectionPool(size=1, factory=Factory())
+    pooled = pool.acquire()
+    pool.release(pooled, discard=True)
+    assert pooled.cnx.closed is True
+    assert pool.idle == 0 and pool.checked_out == 0
+
+
+def test_get_pool_disabled_with_zero_size(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "0")
+    assert connection.get_pool() is None
+
+
+def test_get_pool_rebuilt_after_fork(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    connection.reset_pool()
+    pool = connection.get_pool()
+    assert pool is not None and pool.size == 3
+    assert connection.get_pool() is pool
+
+    monkeypatch.setattr(pool, "pid", -1)
+    rebuilt = connection.get_pool()
+    assert rebuilt is not pool
+    connection.reset_pool()
+
+
+def test_db_transaction_shares_one_connection(monkeypatch):
+    factory = Factory()
+    pool = ConnectionPool(size=2, factory=factory)
+    monkeypatch.setattr(connection, "get_pool", lambda: pool)
+
+    with connection.db_transaction():
+        with connection.db_cursor() as first:
+            pass
+        with connection.db_cursor() as second:
+            pass
+
+    assert len(factory.created) == 1
+    assert first.connection is second.connection
+    assert first.connection.commits == 1
+    assert pool.checked_out == 0 and pool.idle == 1
+
+
+def test_db_transaction_rolls_back_on_error(monkeypatch):
+    factory = Factory()
+    pool = ConnectionPool(size=1, factory=factory)
+    monkeypatch.setattr(connection, "get_pool", lambda: pool)
+
+    with pytest.raises(ValueError):
+        with connection.db_transaction():
+            with connection.db_cursor():
+                raise ValueError("boom")
+
+    assert factory.created[0].rollbacks == 1
+    assert pool.checked_out == 0
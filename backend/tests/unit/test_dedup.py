@@ -0,0 +1,96 @@
+import hashlib
+import io
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+import pytest  # noqa: E402
+
+dedup = import_module("services.dedup")
+ingest = import_module("api.ingest")
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_copy_hashing_writes_and_hashes_in_chunks():
+    dst = io.BytesIO()
+    digest = dedup.copy_hashing(io.BytesIO(b"x" * 1000), dst, chunk_size=64)
+    assert dst.getvalue() == b"x" * 1000
+    assert digest == _sha(b"x" * 1000)
+
+    writer = dedup.HashingWriter(io.BytesIO())
+    writer.write(b"ab")
+    writer.write(b"c")
+    assert writer.size == 3 and writer.hexdigest() == _sha(b"abc")
+
+
+def test_combine_keeps_single_page_hash_and_is_order_sensitive():
+    a, b = _sha(b"a"), _sha(b"b")
+    assert dedup.combine([a]) == a
+    assert dedup.combine([a, b]) != dedup.combine([b, a])
+
+
+@pytest.mark.parametrize("capture_db", [{"hashes": {"h-old": "OLD"}}], indirect=True)
+def test_split_duplicates_checks_db_once_and_within_batch(monkeypatch, capture_db):
+    monkeypatch.setattr(dedup, "db_cursor", capture_db.cursor)
+
+    fresh, dups = dedup.split_duplicates([("1", "h-new"), ("2", "h-old"), ("3", "h-new")])
+
+    assert fresh == [("1", "h-new")]
+    assert dups == [("2", "OLD"), ("3", "1")]
+    assert capture_db.queries == 1
+
+
+def test_split_duplicates_ingests_everything_when_lookup_fails(monkeypatch):
+    @contextmanager
+    def broken():
+        raise RuntimeError("db down")
+        yield
+
+    monkeypatch.setattr(dedup, "db_cursor", broken)
+    fresh, dups = dedup.split_duplicates([("1", "h"), ("2", "h")])
+    assert fresh == [("1", "h")] and dups == [("2", "1")]
+
+
+class _DuplicateEntry(Exception):
+    errno = 1062
+
+
+def _upload(client, *pages):
+    data = {"images": [(io.BytesIO(page), f"p{i}.jpg") for i, page in enumerate(pages)]}
+    return client.post("/capture/upload", data=data, content_type="multipart/form-data")
+
+
+def test_capture_upload_links_repeated_receipt_to_existing_row(capture_client, capture_db, tmp_path):
+    client, queued = capture_client
+
+    first = _upload(client, b"page one", b"page two").get_json()
+    assert first["ok"] and "duplicate" not in first
+    assert capture_db.rows[0][-1] == dedup.combine([_sha(b"page one"), _sha(b"page two")])
+
+    again = _upload(client, b"page one", b"page two").get_json()
+    assert again == {"ok": True, "receipt_id": first["receipt_id"], "duplicate": True, "saved": []}
+    assert queued == [first["receipt_id"]]
+    assert len(capture_db.rows) == 1
+    assert [p.name for p in tmp_path.iterdir()] == [first["receipt_id"]]
+
+
+@pytest.mark.parametrize("capture_db", [{"fail_insert": _DuplicateEntry("Duplicate entry")}], indirect=True)
+def test_capture_upload_losing_the_unique_index_race_is_a_duplicate(capture_client, monkeypatch, tmp_path):
+    client, queued = capture_client
+    lookups = iter([{}, {_sha(b"page"): "WINNER"}])
+    monkeypatch.setattr(dedup, "find_existing", lambda hashes: next(lookups))
+
+    body = _upload(client, b"page").get_json()
+
+    assert body["receipt_id"] == "WINNER" and body["duplicate"] is True
+    assert queued == [] and list(tmp_path.iterdir()) == []
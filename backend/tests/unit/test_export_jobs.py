@@ -0,0 +1,170 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+from flask import Flask  # noqa: E402
+
+exports = import_module("services.exports")
+export = import_module("api.export")
+
+
+def _job_store():
+    jobs: dict = {}
+
+    def create_job(job_id, kind, params, cache_key, status="queued", result_path=None, result_size=None):
+        jobs[job_id] = {"id": job_id, "kind": kind, "params": params, "cache_key": cache_key, "status": status,
+                        "result_path": result_path, "result_size": result_size, "error": None}
+
+    def mark_done(job_id, result_path, result_size):
+        jobs[job_id].update(status="done", result_path=result_path, result_size=result_size)
+
+    return SimpleNamespace(
+        jobs=jobs,
+        create_job=create_job,
+        get_job=lambda job_id: dict(jobs[job_id]) if job_id in jobs else None,
+        mark_running=lambda job_id: jobs[job_id].update(status="running"),
+        mark_done=mark_done,
+        mark_error=lambda job_id, error: jobs[job_id].update(status="error", error=error),
+    )
+
+
+def _setup(monkeypatch, tmp_path, version="v1"):
+    store = _job_store()
+    rendered: list = []
+
+    def fake_open(kind, params):
+        rendered.append(params)
+        return iter([b"#FLAGGA 0\n", b"#SIETYP 4\n"])
+
+    monkeypatch.setenv("EXPORT_CACHE_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(exports, "job_store", store)
+    monkeypatch.setattr(exports, "data_version", lambda kind, params: version)
+    monkeypatch.setattr(exports, "open_export", fake_open)
+    monkeypatch.setattr(export, "open_export", fake_open)
+    return store, rendered
+
+
+def _client():
+    app = Flask(__name__)
+    app.register_blueprint(export.export_bp)
+    return app.test_client()
+
+
+def test_queued_job_runs_and_downloads(monkeypatch, tmp_path):
+    store, rendered = _setup(monkeypatch, tmp_path)
+    queued: list = []
+    monkeypatch.setattr(export, "process_export", SimpleNamespace(delay=queued.append))
+    client = _client()
+
+    resp = client.post("/export/jobs", json={"kind": "sie", "from": "2025-08-31", "to": "2025-08-01"})
+    job_id = resp.get_json()["id"]
+
+    assert resp.status_code == 202 and queued == [job_id]
+    assert store.jobs[job_id]["params"] == {"from": "2025-08-01", "to": "2025-08-31"}
+    assert client.get(f"/export/jobs/{job_id}/download").status_code == 409
+
+    assert exports.run_job(job_id)["ok"] is True
+    status = client.get(f"/export/jobs/{job_id}").get_json()
+    assert status["status"] == "done" and status["download_url"].endswith("/download")
+    download = client.get(f"/export/jobs/{job_id}/download")
+    assert download.data == b"#FLAGGA 0\n#SIETYP 4\n"
+    assert "export_2025-08-01_2025-08-31.sie" in download.headers["Content-Disposition"]
+    assert len(rendered) == 1
+
+
+def test_same_data_version_is_served_from_cache(monkeypatch, tmp_path):
+    store, rendered = _setup(monkeypatch, tmp_path)
+    monkeypatch.setattr(export, "process_export", SimpleNamespace(delay=exports.run_job))
+    client = _client()
+
+    first = client.post("/export/jobs", json={"kind": "sie", "from": "2025-08-01", "to": "2025-08-31"})
+    second = client.post("/export/jobs", json={"kind": "sie", "from": "2025-08-01", "to": "2025-08-31"})
+    direct = client.get("/export/sie?from=2025-08-01&to=2025-08-31")
+
+    assert first.status_code in (200, 202)
+    assert second.status_code == 200 and second.get_json()["status"] == "done"
+    assert direct.data == b"#FLAGGA 0\n#SIETYP 4\n"
+    assert len(rendered) == 1
+
+
+def test_direct_download_fills_cache_and_new_version_misses(monkeypatch, tmp_path):
+    store, rendered = _setup(monkeypatch, tmp_path)
+    client = _client()
+
+    client.get("/export/sie?from=2025-08-01").get_data()
+    client.get("/export/sie?from=2025-08-01").get_data()
+    assert len(rendered) == 1
+    assert store.jobs == {}  # direct downloads are not recorded
+
+    monkeypatch.setattr(exports, "data_version", lambda kind, params: "v2")
+    client.get("/export/sie?from=2025-08-01").get_data()
+    assert len(rendered) == 2
+
+
+def test_interrupted_direct_download_leaves_no_cache(monkeypatch, tmp_path):
+    store, _rendered = _setup(monkeypatch, tmp_path)
+    client = _client()
+
+    resp = client.get("/export/sie?from=2025-08-01", buffered=False)
+    assert next(resp.response) == b"#FLAGGA 0\n"
+    resp.close()
+
+    assert store.jobs == {}
+    assert list((tmp_path / "exports").iterdir()) == []
+
+
+def test_direct_download_that_breaks_midway_leaves_no_cache(monkeypatch, tmp_path):
+    store, _rendered = _setup(monkeypatch, tmp_path)
+
+    def broken(kind, params):
+        yield b"#FLAGGA 0\n"
+        raise RuntimeError("db gone")
+
+    monkeypatch.setattr(export, "open_export", broken)
+    resp = _client().get("/export/sie?from=2025-08-01", buffered=False)
+    try:
+        b"".join(resp.response)
+    except RuntimeError:
+        pass
+    resp.close()
+
+    assert store.jobs == {}
+    assert list((tmp_path / "exports").iterdir()) == []
+
+
+def test_job_is_never_done_without_a_result_file(monkeypatch, tmp_path):
+    store, _rendered = _setup(monkeypatch, tmp_path, version=None)
+    client = _client()
+    assert client.get("/export/sie?from=2025-08-01").data == b"#FLAGGA 0\n#SIETYP 4\n"
+    assert store.jobs == {}
+
+    job = exports.start_job("sie", {"from": "2025-08-01", "to": None})
+    exports.finish_job(job["id"], None)
+    assert store.jobs[job["id"]]["status"] == "error"
+
+    store.jobs[job["id"]].update(status="done", result_path=None)
+    assert client.get(f"/export/jobs/{job['id']}").get_json()["download_url"] is None
+
+
+def test_unknown_job_and_bad_request(monkeypatch, tmp_path):
+    _setup(monkeypatch, tmp_path)
+    client = _client()
+
+    assert client.get("/export/jobs/missing").status_code == 404
+    assert client.post("/export/jobs", json={"kind": "company_card"}).status_code == 400
+    assert client.post("/export/jobs", json={"kind": "pdf"}).status_code == 400
+
+
+def test_tee_to_file_discards_partial_output(tmp_path):
+    target = tmp_path / "out"
+    stream = exports.tee_to_file(iter([b"a", b"b"]), target)
+    next(stream)
+    stream.close()
+    assert not target.exists() and list(tmp_path.iterdir()) == []
@@ -0,0 +1,132 @@
+import sys
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+export = import_module("api.export")
+exports = import_module("services.exports")
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path, blueprint_client):
+    monkeypatch.setattr(exports, "job_store", None)
+    monkeypatch.setenv("EXPORT_CACHE_DIR", str(tmp_path / "exports"))
+    return blueprint_client(export.export_bp, exports)
+
+
+def _rows():
+    day1 = datetime(2025, 8, 1, 9, 0)
+    day2 = datetime(2025, 8, 2, 9, 0)
+    return [
+        ("R1", day1, "Cafe", "5790", Decimal("25.50"), 0, "Expense"),
+        ("R1", day1, "Cafe", "2440", 0, Decimal("25.50"), "Liability"),
+        ("R2", day2, "Receipt R2", "5790", Decimal("10.00"), 0, None),
+        ("R2", day2, "Receipt R2", "2440", 0, Decimal("10.00"), ""),
+    ]
+
+
+def test_sie_export_streams_grouped_verifications(monkeypatch, client, fake_cursor):
+    monkeypatch.setattr(exports, "_SIE_FETCH_ROWS", 3)
+    fake_cursor.rows, fake_cursor.stream = [("5790", "Expense"), ("2440", " ")], _rows()
+
+    resp = client.get("/export/sie?from=2025-08-01&to=2025-08-31")
+    body = resp.get_data(as_text=True)
+
+    assert fake_cursor.fetchmany_calls == 3
+    assert all("GROUP BY ap.account_code" in sql for sql in fake_cursor.fetched), "proposal rows must not be fetched at once"
+    assert '#KONTO 2440 "Account 2440"' in body and '#KONTO 5790 "Expense"' in body
+    assert '#VER "A" "0001" 20250801 "Cafe"' in body
+    assert '#VER "A" "0002" 20250802 "Receipt R2"' in body
+    assert '#TRANS 2440 {} -10.00 "Receipt R2"' in body
+    assert body.index('"0001"') < body.index('#TRANS 2440 {} -25.50') < body.index('"0002"')
+    assert resp.headers["X-Export-Job-Id"].startswith("sie-")
+
+
+def test_sie_numbering_orders_merchants_by_code_point(client, fake_cursor):
+    # The default utf8mb4 collation folds case and accents (Åhléns next to Apoteket);
+    # #VER numbers must follow the binary order the Python sort used
+    day = datetime(2025, 8, 1, 9, 0)
+    merchants = ["Ölstugan", "ica", "Åhléns", "ICA Maxi", "Apoteket", "apotek hjärtat"]
+    rows = [(f"R{i}", day, name, "5790", Decimal("1.00"), 0, "") for i, name in enumerate(merchants)]
+
+    fake_cursor.rows = [("5790", "Expense")]
+    fake_cursor.stream = sorted(rows, key=lambda row: (row[1].date(), row[2], row[0]))
+
+    body = client.get("/export/sie").get_data(as_text=True)
+
+    order_by = next(sql for sql, _ in fake_cursor.executed if "ORDER BY DATE(dt)" in sql)
+    assert "COLLATE utf8mb4_bin" in order_by
+
+    numbered = [line.split('"')[3::2] for line in body.splitlines() if line.startswith("#VER")]
+    assert numbered == [
+        ["0001", "Apoteket"],
+        ["0002", "ICA Maxi"],
+        ["0003", "apotek hjärtat"],
+        ["0004", "ica"],
+        ["0005", "Åhléns"],
+        ["0006", "Ölstugan"],
+    ]
+
+
+def test_sie_export_without_proposals_skips_row_query(client, fake_cursor):
+    body = client.get("/export/sie").get_data(as_text=True)
+
+    assert "; No verifications available for selected period" in body
+    assert not any("ORDER BY DATE(dt)" in sql for sql, _ in fake_cursor.executed)
+
+
+def test_iter_sie_chunks_output(monkeypatch):
+    monkeypatch.setattr(exports, "_SIE_CHUNK_LINES", 4)
+    vers = ({"date": datetime(2025, 8, 1).date(), "text": f"V{i}", "entries": [
+        {"account": "5790", "amount": Decimal("1.00"), "notes": ""}]} for i in range(5))
+
+    chunks = list(exports.iter_sie(vers, {"5790": "Expense"}, None, None))
+
+    assert len(chunks) > 1
+    assert "".join(chunks).count("#VER") == 5
+
+
+def test_company_card_export_streams_attachments(monkeypatch, tmp_path, blueprint_client):
+    import io
+    import zipfile
+
+    storage = import_module("services.storage").FileStorage(tmp_path)
+    storage.save("R1", "page1.jpg", b"\xff\xd8jpeg")
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+
+    class CardCursor:
+        results = {
+            "FROM invoice_documents": [("S1", None, None, "matched", datetime(2025, 9, 1))],
+            "FROM invoice_lines WHERE": [(1, datetime(2025, 8, 1).date(), Decimal("25.50"), "Cafe", "", "R1", "auto")],
+            "FROM unified_files WHERE id IN": [
+                ("R1", "Cafe", datetime(2025, 8, 1, 9, 0), Decimal("25.50"), None, "completed", "alice")],
+            "BIT_XOR": [(1, 12345)],
+            "SELECT DISTINCT matched_file_id": [("R1",)],
+        }
+
+        def execute(self, sql, params=None):
+            self.current = next(rows for key, rows in self.results.items() if key in sql)
+
+        def fetchone(self):
+            return self.current[0]
+
+        def fetchall(self):
+            return self.current
+
+    monkeypatch.setattr(exports, "job_store", None)
+    client = blueprint_client(export.export_bp, exports, CardCursor())
+    resp = client.get("/export/company-card?statement_id=S1")
+
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.get_data())) as zf:
+        assert zf.read("receipts/R1/page1.jpg") == b"\xff\xd8jpeg"
+        assert "receipts/R1/page1.jpg" in zf.read("statement.json").decode("utf-8")
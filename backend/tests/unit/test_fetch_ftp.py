@@ -0,0 +1,384 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from ftplib import error_perm, error_temp
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+fetch_ftp = import_module("services.fetch_ftp")
+dedup = import_module("services.dedup")
+
+
+class _Server:
+    def __init__(self, files):
+        self.files = dict(files)
+        self.connects = 0
+        self.active = 0
+        self.max_active = 0
+        self.deleted = []
+        self.fail_once = set()
+        self.mtimes = {}
+        self.mlsd = True
+        self.retrieved = []
+        self.commands = []
+        self.lock = threading.Lock()
+
+
+def _fake_ftp(server):
+    class FakeFTP:
+        def connect(self, host, port, timeout):
+            with server.lock:
+                server.connects += 1
+
+        def login(self, user, passwd):
+            pass
+
+        def set_pasv(self, passive):
+            pass
+
+        def cwd(self, path):
+            pass
+
+        def nlst(self):
+            server.commands.append("NLST")
+            return list(server.files)
+
+        def mlsd(self, path="", facts=()):
+            if not server.mlsd:
+                raise error_perm("500 MLSD not understood")
+            server.commands.append("MLSD")
+            yield ".", {"type": "cdir"}
+            for name, data in server.files.items():
+                yield name, {"type": "file", "size": str(len(data)), "modify": server.mtimes.get(name, "20250901120000")}
+
+        def voidcmd(self, cmd):
+            return "200 ok"
+
+        def size(self, name):
+            server.commands.append(f"SIZE {name}")
+            return len(server.files[name])
+
+        def sendcmd(self, cmd):
+            server.commands.append(cmd)
+            return f"213 {server.mtimes.get(cmd.split()[-1], '20250901120000')}"
+
+        def retrbinary(self, cmd, callback, blocksize=8192):
+            name = cmd[len("RETR "):]
+            with server.lock:
+                server.retrieved.append(name)
+                server.active += 1
+                server.max_active = max(server.max_active, server.active)
+            try:
+                data = server.files[name]
+                if name in server.fail_once:
+                    server.fail_once.discard(name)
+                    callback(data[:3])
+                    raise error_temp("426 connection closed")
+                for start in range(0, len(data), 4):
+                    callback(data[start:start + 4])
+                time.sleep(0.05)
+            finally:
+                with server.lock:
+                    server.active -= 1
+
+        def delete(self, name):
+            server.deleted.append(name)
+
+        def quit(self):
+            pass
+
+        def close(self):
+            pass
+
+    return FakeFTP
+
+
+class _DuplicateEntry(Exception):
+    errno = 1062
+
+
+class _DB:
+    def __init__(self):
+        self.batches = []
+        self.in_tx = False
+        self.hashes = {}
+        # content_hash -> id committed by a concurrent ingest just before our insert
+        self.racing = {}
+        self.rows = []
+
+    def _claim(self, row):
+        content_hash = row[-1]
+        if content_hash in self.racing:
+            self.hashes[content_hash] = self.racing[content_hash]
+            raise _DuplicateEntry("Duplicate entry for key 'uq_unified_files_content_hash'")
+
+    @contextmanager
+    def cursor(self):
+        db = self
+
+        class Cur:
+            def execute(self, sql, params=()):
+                if sql.lstrip().startswith("INSERT INTO unified_files"):
+                    db._claim(params)
+                    db.rows.append(params)
+                if "file_suffix" in sql:
+                    self._rows = [("jpg", 1), ("pdf", 2)]
+                elif "content_hash IN" in sql:
+                    self._rows = [(h, db.hashes[h]) for h in params if h in db.hashes]
+                else:
+                    self._rows = []
+
+            def fetchall(self):
+                return self._rows
+
+            def executemany(self, sql, rows):
+                table = sql.split("(")[0].split()[-1]
+                rows = list(rows)
+                if table == "unified_files":
+                    for row in rows:
+                        db._claim(row)
+                db.batches.append((table, rows, db.in_tx))
+                if table == "unified_files":
+                    db.hashes.update((row[-1], row[0]) for row in rows)
+
+        yield Cur()
+
+    @contextmanager
+    def transaction(self):
+        self.in_tx = True
+        try:
+            yield
+        finally:
+            self.in_tx = False
+
+
+class _Manifest:
+    def __init__(self):
+        self.entries = {}
+
+    def load(self, source):
+        return {name: (size, modified) for (src, name), (size, modified, _fid) in self.entries.items() if src == source}
+
+    def record(self, source, rows):
+        for name, size, modified, file_id in rows:
+            self.entries[(source, name)] = (size, modified, file_id)
+
+
+def _setup(monkeypatch, tmp_path, files, sessions=3):
+    server = _Server(files)
+    db = _DB()
+    queued = []
+    monkeypatch.setattr(fetch_ftp, "manifest_store", _Manifest())
+    monkeypatch.setattr(fetch_ftp, "FTP", _fake_ftp(server))
+    monkeypatch.setattr(fetch_ftp, "db_cursor", db.cursor)
+    monkeypatch.setattr(fetch_ftp, "db_transaction", db.transaction)
+    monkeypatch.setattr(dedup, "db_cursor", db.cursor)
+    monkeypatch.setitem(sys.modules, "services.tasks", SimpleNamespace(process_ocr=SimpleNamespace(delay=queued.append)))
+    monkeypatch.setenv("FTP_HOST", "ftp.example")
+    monkeypatch.setenv("FTP_SESSIONS", str(sessions))
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+    return server, db, queued
+
+
+def test_fetch_streams_files_in_parallel_over_reused_sessions(monkeypatch, tmp_path):
+    files = {f"r{i}.jpg": f"image-{i}".encode() * 5 for i in range(9)}
+    files["notes.txt"] = b"skip me"
+    files["r0.jpg.json"] = json.dumps({"merchant_name": "Cafe", "tags": [7, 9], "location": {"lat": "59.3", "lon": "18.0"}}).encode()
+    server, db, queued = _setup(monkeypatch, tmp_path, files)
+
+    result = fetch_ftp.fetch_from_ftp()
+
+    assert result.errors == [] and result.skipped == ["notes.txt"]
+    assert [name for _, name in result.downloaded] == [f"r{i}.jpg" for i in range(9)]
+    # One listing session plus at most one per worker, reused across all files.
+    assert server.connects <= 4
+    assert server.max_active > 1
+    for file_id, name in result.downloaded:
+        assert (tmp_path / file_id / name).read_bytes() == files[name]
+        assert not (tmp_path / file_id / f"{name}.part").exists()
+    assert queued == [file_id for file_id, _ in result.downloaded]
+
+    tables = {table: (rows, in_tx) for table, rows, in_tx in db.batches}
+    assert set(tables) == {"unified_files", "file_locations", "file_tags"}
+    assert all(in_tx for _, in_tx in tables.values())
+    rows, _ = tables["unified_files"]
+    assert len(rows) == 9
+    first = next(row for row in rows if row[0] == result.downloaded[0][0])
+    assert first[2] == 1 and first[4] == "Cafe" and first[-2] == "queued"
+    assert first[-1] == hashlib.sha256(files["r0.jpg"]).hexdigest()
+    assert tables["file_tags"][0] == [(first[0], "7"), (first[0], "9")]
+    assert tables["file_locations"][0] == [(first[0], 59.3, 18.0, None)]
+
+
+def test_dropped_transfer_is_retried_on_a_new_session(monkeypatch, tmp_path):
+    server, _db, _queued = _setup(monkeypatch, tmp_path, {"a.pdf": b"0123456789"}, sessions=1)
+    server.fail_once.add("a.pdf")
+
+    result = fetch_ftp.fetch_from_ftp()
+
+    [(file_id, name)] = result.downloaded
+    assert (tmp_path / file_id / name).read_bytes() == b"0123456789"
+    assert server.connects == 3  # listing, first worker session, reconnect
+
+
+def test_incremental_sync_fetches_only_new_or_changed_files(monkeypatch, tmp_path):
+    files = {f"r{i}.jpg": b"x" * (i + 1) for i in range(50)}
+    files.update({f"r{i}.jpg.json": b"{}" for i in range(50)})
+    server, _db, _queued = _setup(monkeypatch, tmp_path, files)
+
+    first = fetch_ftp.fetch_from_ftp()
+    assert len(first.downloaded) == 50
+
+    server.retrieved.clear()
+    server.commands.clear()
+    assert fetch_ftp.fetch_from_ftp().downloaded == []
+    assert server.commands == ["MLSD"] and server.retrieved == []
+
+    server.files["r3.jpg"] = b"changed!"
+    server.files["new.pdf"] = b"new"
+    server.mtimes["r7.jpg"] = "20250902080000"
+    result = fetch_ftp.fetch_from_ftp()
+    assert sorted(name for _, name in result.downloaded) == ["new.pdf", "r3.jpg"]
+    # r7 was touched but its bytes are unchanged: refetched, then linked to the existing row.
+    assert [name for name, _ in result.duplicates] == ["r7.jpg"]
+    # Metadata is read only for the files being ingested.
+    assert sorted(server.retrieved) == ["new.pdf", "r3.jpg", "r3.jpg.json", "r7.jpg", "r7.jpg.json"]
+
+
+def test_incremental_sync_without_mlsd_uses_size_and_mdtm(monkeypatch, tmp_path):
+    server, _db, _queued = _setup(monkeypatch, tmp_path, {"a.pdf": b"one", "b.pdf": b"two"})
+    server.mlsd = False
+
+    assert len(fetch_ftp.fetch_from_ftp().downloaded) == 2
+    server.retrieved.clear()
+    assert fetch_ftp.fetch_from_ftp().downloaded == []
+    assert server.retrieved == []
+
+    server.files["b.pdf"] = b"two, longer"
+    assert [name for _, name in fetch_ftp.fetch_from_ftp().downloaded] == ["b.pdf"]
+
+
+def test_full_mode_fetches_everything_every_time(monkeypatch, tmp_path):
+    server, _db, _queued = _setup(monkeypatch, tmp_path, {"a.pdf": b"one"})
+    monkeypatch.setenv("FTP_SYNC_MODE", "full")
+
+    [(file_id, _name)] = fetch_ftp.fetch_from_ftp().downloaded
+    server.retrieved.clear()
+    again = fetch_ftp.fetch_from_ftp()
+    assert server.retrieved == ["a.pdf"]
+    assert again.downloaded == [] and again.duplicates == [("a.pdf", file_id)]
+
+
+def test_delete_after_removes_files_and_metadata(monkeypatch, tmp_path):
+    files = {"a.pdf": b"data", "a.pdf.json": b"{}", "b.png": b"data"}
+    server, _db, _queued = _setup(monkeypatch, tmp_path, files)
+    monkeypatch.setenv("FTP_DELETE_AFTER", "true")
+
+    fetch_ftp.fetch_from_ftp()
+
+    assert sorted(server.deleted) == ["a.pdf", "a.pdf.json", "b.png"]
+
+
+def test_duplicate_content_is_linked_not_stored_again(monkeypatch, tmp_path):
+    files = {"a.jpg": b"same receipt", "a-again.jpg": b"same receipt", "b.jpg": b"other"}
+    server, db, queued = _setup(monkeypatch, tmp_path, files)
+    db.hashes[hashlib.sha256(b"other").hexdigest()] = "EXISTING"
+
+    result = fetch_ftp.fetch_from_ftp()
+
+    [(file_id, name)] = result.downloaded
+    assert name == "a.jpg"
+    assert sorted(result.duplicates) == [("a-again.jpg", file_id), ("b.jpg", "EXISTING")]
+    assert queued == [file_id]
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir() and p.name != "statements") == [file_id]
+    [unified] = [rows for table, rows, _ in db.batches if table == "unified_files"]
+    assert [row[0] for row in unified] == [file_id]
+
+    # The manifest remembers duplicates too, so they are not fetched again.
+    server.retrieved.clear()
+    assert fetch_ftp.fetch_from_ftp().duplicates == []
+    assert server.retrieved == []
+
+
+def test_local_inbox_skips_duplicates(monkeypatch, tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    (inbox / "a.pdf").write_bytes(b"receipt")
+    (inbox / "b.pdf").write_bytes(b"receipt")
+    db = _DB()
+    inserted = []
+
+    def insert(file_id, name, metadata, content_hash=None):
+        inserted.append(file_id)
+        db.hashes[content_hash] = file_id
+        return True
+
+    monkeypatch.setattr(fetch_ftp, "db_cursor", db.cursor)
+    monkeypatch.setattr(dedup, "db_cursor", db.cursor)
+    monkeypatch.setattr(fetch_ftp, "_insert_unified_file", insert)
+    monkeypatch.setattr(fetch_ftp, "set_ai_status", lambda file_id, status: True)
+    monkeypatch.setitem(sys.modules, "services.tasks", SimpleNamespace(process_ocr=None))
+    monkeypatch.delenv("FTP_HOST", raising=False)
+    monkeypatch.setenv("FTP_LOCAL_DIR", str(inbox))
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path / "storage"))
+
+    result = fetch_ftp.fetch_from_ftp()
+
+    [(file_id, name)] = result.downloaded
+    assert name == "a.pdf" and inserted == [file_id]
+    assert result.duplicates == [("b.pdf", file_id)]
+    assert [p.name for p in (tmp_path / "storage").iterdir()] == [file_id]
+
+
+def test_batch_losing_the_unique_index_race_links_to_the_winner(monkeypatch, tmp_path):
+    files = {"a.jpg": b"raced", "b.jpg": b"fresh", "b.jpg.json": json.dumps({"tags": [3]}).encode()}
+    server, db, queued = _setup(monkeypatch, tmp_path, files)
+    db.racing[hashlib.sha256(b"raced").hexdigest()] = "WINNER"
+    tagged = []
+    monkeypatch.setattr(fetch_ftp, "_insert_file_tags", lambda file_id, tags: tagged.append(file_id))
+    monkeypatch.setattr(fetch_ftp, "set_ai_status", lambda file_id, status: True)
+
+    result = fetch_ftp.fetch_from_ftp()
+
+    [(file_id, name)] = result.downloaded
+    assert name == "b.jpg"
+    assert result.duplicates == [("a.jpg", "WINNER")] and result.errors == []
+    assert queued == [file_id] and tagged == [file_id]
+    assert [row[0] for row in db.rows] == [file_id]
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == [file_id]
+    manifest = fetch_ftp.manifest_store.entries
+    assert manifest[("ftp.example:21/", "a.jpg")][2] == "WINNER"
+    assert manifest[("ftp.example:21/", "b.jpg")][2] == file_id
+
+
+def test_local_inbox_insert_losing_the_race_is_a_duplicate(monkeypatch, tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    (inbox / "a.pdf").write_bytes(b"receipt")
+    db = _DB()
+    db.racing[hashlib.sha256(b"receipt").hexdigest()] = "WINNER"
+    queued = []
+    monkeypatch.setattr(fetch_ftp, "db_cursor", db.cursor)
+    monkeypatch.setattr(dedup, "db_cursor", db.cursor)
+    monkeypatch.setattr(fetch_ftp, "_get_file_category", lambda suffix: None)
+    monkeypatch.setattr(fetch_ftp, "set_ai_status", lambda file_id, status: True)
+    monkeypatch.setitem(sys.modules, "services.tasks", SimpleNamespace(process_ocr=SimpleNamespace(delay=queued.append)))
+    monkeypatch.delenv("FTP_HOST", raising=False)
+    monkeypatch.setenv("FTP_LOCAL_DIR", str(inbox))
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path / "storage"))
+
+    result = fetch_ftp.fetch_from_ftp()
+
+    assert result.downloaded == [] and result.duplicates == [("a.pdf", "WINNER")]
+    assert queued == [] and db.rows == []
+    assert list((tmp_path / "storage").iterdir()) == []
@@ -0,0 +1,90 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+ocr = import_module("services.ocr")
+
+pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _no_ocr_cache(monkeypatch):
+    monkeypatch.setenv("OCR_CACHE_ENABLED", "false")
+
+
+def _page_result(text: str) -> dict:
+    return {
+        "res": {
+            "rec_texts": [text, "Total 125,00"],
+            "rec_polys": [[[10, 10], [90, 10], [90, 30], [10, 30]], [[10, 50], [90, 50], [90, 70], [10, 70]]],
+            "rec_scores": [0.99, 0.95],
+        }
+    }
+
+
+class BatchEngine:
+    def __init__(self) -> None:
+        self.batches: list[int] = []
+        self.single_calls = 0
+
+    def predict(self, inputs):
+        self.batches.append(len(inputs))
+        return [_page_result(f"Shop {i}") for i, _ in enumerate(inputs)]
+
+    def ocr(self, item):
+        self.single_calls += 1
+        return [_page_result("Shop 0")]
+
+
+def _make_receipt(base: Path, rid: str, pages: int) -> None:
+    root = base / rid
+    root.mkdir(parents=True)
+    for i in range(pages):
+        Image.new("RGB", (100, 200), "white").save(root / f"page-{i + 1}.jpg")
+
+
+def test_pages_are_sent_to_engine_in_batches(tmp_path, monkeypatch):
+    engine = BatchEngine()
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: engine)
+    monkeypatch.setenv("OCR_BATCH_SIZE", "2")
+    _make_receipt(tmp_path, "R1", 3)
+
+    result = ocr.run_ocr("R1", tmp_path)
+
+    assert engine.batches == [2]
+    assert engine.single_calls == 1  # trailing single page uses the plain call
+    assert result["gross_amount"] == 125.0
+    assert (tmp_path / "R1" / "boxes.json").exists()
+
+
+def test_run_ocr_batch_matches_single_receipt_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: BatchEngine())
+    monkeypatch.setenv("OCR_BATCH_SIZE", "1")
+    _make_receipt(tmp_path, "R1", 1)
+    _make_receipt(tmp_path, "R2", 2)
+    single = {rid: ocr.run_ocr(rid, tmp_path) for rid in ("R1", "R2")}
+
+    monkeypatch.setenv("OCR_BATCH_SIZE", "8")
+    engine = BatchEngine()
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: engine)
+    batched = ocr.run_ocr_batch(["R1", "R2"], tmp_path)
+
+    assert engine.batches == [3]
+    assert batched["R1"]["text"] == single["R1"]["text"]
+    assert batched["R2"]["text"] == "Shop 1\nTotal 125,00\nShop 2\nTotal 125,00"
+    assert set(batched["R1"]) == set(single["R1"])
+
+
+def test_run_ocr_batch_without_pages_returns_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: BatchEngine())
+    out = ocr.run_ocr_batch(["EMPTY"], tmp_path)
+    assert out["EMPTY"]["confidence"] == 0.5
@@ -0,0 +1,78 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+ocr = import_module("services.ocr")
+ocr_cache = import_module("services.ocr_cache")
+
+pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+
+class CountingEngine:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def ocr(self, item):
+        self.calls += 1
+        return [{
+            "res": {
+                "rec_texts": ["Cafe", "Total 125,00"],
+                "rec_polys": [[[10, 10], [90, 10], [90, 30], [10, 30]], [[10, 50], [90, 50], [90, 70], [10, 70]]],
+                "rec_scores": [0.99, 0.95],
+            }
+        }]
+
+
+def test_cache_roundtrip_and_key_depends_on_signature(tmp_path):
+    cache = ocr_cache.OcrCache(tmp_path, max_bytes=1024 * 1024)
+    digest = ocr_cache.content_hash(b"image")
+    key = cache.key(digest, "paddleocr=3.0;lang=sv")
+
+    assert cache.get(key) is None
+    cache.put(key, {"texts": ["a"], "boxes": []})
+    assert cache.get(key) == {"texts": ["a"], "boxes": []}
+    assert cache.key(digest, "paddleocr=3.1;lang=sv") != key
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ocr_cache.OcrCache(tmp_path, max_bytes=600)
+    payload = {"texts": ["x" * 200], "boxes": []}
+    keys = [cache.key(ocr_cache.content_hash(bytes([i])), "sig") for i in range(3)]
+
+    cache.put(keys[0], payload)
+    cache.put(keys[1], payload)
+    old = cache._path(keys[1])
+    os.utime(old, (1, 1))  # make keys[1] the least recently used
+    cache.put(keys[2], payload)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+
+
+def test_run_ocr_skips_engine_for_cached_pages(tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_CACHE_ENABLED", "true")
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path / "cache"))
+    engine = CountingEngine()
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: engine)
+    for rid in ("R1", "R2"):
+        (tmp_path / rid).mkdir()
+        Image.new("RGB", (100, 200), "white").save(tmp_path / rid / "page-1.png")
+
+    first = ocr.run_ocr("R1", tmp_path)
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: None)
+    second = ocr.run_ocr("R2", tmp_path)  # identical bytes, different receipt
+
+    assert engine.calls == 1
+    assert second["text"] == first["text"]
+    assert second["gross_amount"] == 125.0
+    assert (tmp_path / "R2" / "boxes.json").exists()
@@ -0,0 +1,93 @@
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+ocr = import_module("services.ocr")
+
+pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+
+class Engine:
+    def ocr(self, item):
+        return [{
+            "res": {
+                "rec_texts": ["Cafe", "Total 125,00"],
+                "rec_polys": [[[10, 10], [90, 10], [90, 30], [10, 30]], [[10, 50], [90, 50], [90, 70], [10, 70]]],
+                "rec_scores": [0.99, 0.95],
+            }
+        }]
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self) -> None:
+        super().__init__(max_workers=2)
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+class BrokenExecutor:
+    def submit(self, fn, *args, **kwargs):
+        future: Future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+
+@pytest.fixture(autouse=True)
+def _no_ocr_cache(monkeypatch):
+    monkeypatch.setenv("OCR_CACHE_ENABLED", "false")
+
+
+def _make_receipt(base: Path, rid: str, pages: int) -> None:
+    (base / rid).mkdir()
+    for i in range(pages):
+        Image.new("RGB", (100, 200), "white").save(base / rid / f"page-{i + 1}.png")
+
+
+def test_executor_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("OCR_EXECUTOR_WORKERS", raising=False)
+    assert ocr._ocr_executor() is None
+
+
+def test_pages_are_submitted_to_executor_per_batch(tmp_path, monkeypatch):
+    executor = RecordingExecutor()
+    monkeypatch.setattr(ocr, "_ocr_executor", lambda: executor)
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: Engine())
+    monkeypatch.setenv("OCR_BATCH_SIZE", "2")
+    _make_receipt(tmp_path, "R1", 3)
+
+    result = ocr.run_ocr("R1", tmp_path)
+    executor.shutdown()
+
+    assert executor.submitted == 2
+    assert result["text"].count("Cafe") == 3
+    assert result["gross_amount"] == 125.0
+
+
+def test_broken_executor_resets_pool_and_falls_back(tmp_path, monkeypatch):
+    resets: list[bool] = []
+    monkeypatch.setattr(ocr, "_ocr_executor", lambda: BrokenExecutor())
+    monkeypatch.setattr(ocr, "shutdown_ocr_executor", lambda: resets.append(True))
+    _make_receipt(tmp_path, "R1", 1)
+
+    result = ocr.run_ocr("R1", tmp_path)
+
+    assert resets == [True]
+    assert result["confidence"] == 0.5
+
+
+def test_parse_cpus():
+    assert ocr._parse_cpus("0-2, 5,1") == [0, 1, 2, 5]
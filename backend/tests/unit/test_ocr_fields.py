@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+ocr_fields = import_module("services.ocr_fields")
+
+RECEIPT = """ICA Supermarket Hjorthagen
+Org.nr 556677-8899
+31.08.2025 12:30
+Mjölk 1,5l 18,90
+Entrecote 1 045,00
+Subtotal 1 063,90
+Totalt 1 063,90 kr
+Moms 12% 2,03
+Varav moms (25%) 209,00
+Kort 1 063,90"""
+
+
+def test_extract_fields_single_receipt():
+    fields = ocr_fields.extract_fields(RECEIPT)
+
+    assert fields.merchant == "ICA Supermarket Hjorthagen"
+    assert fields.gross == pytest.approx(1063.90)
+    assert fields.purchase_datetime == "2025-08-31T12:30:00"
+    assert fields.vat_breakdown == {12: pytest.approx(2.03), 25: pytest.approx(209.0)}
+    descriptions = [item["description"] for item in fields.line_items]
+    assert descriptions == ["Mjölk 1,5l", "Entrecote", "Kort"]
+
+
+def test_gross_falls_back_to_largest_amount_without_total_line():
+    fields = ocr_fields.extract_fields("Kiosk\n2025-09-01\nGlass 25,00\nLäsk 19,50")
+    assert fields.gross == 25.0
+    assert fields.purchase_datetime == "2025-09-01"
+
+
+def test_labelled_total_wins_over_a_larger_amount():
+    # The cash tendered is the largest number; the old helpers stored it as the gross amount
+    fields = ocr_fields.extract_fields("Kiosk\nTotalt 120,00\nKontant 200,00\nVäxel 80,00")
+    assert fields.gross == 120.0
+
+
+@pytest.mark.parametrize(
+    "raw,expected",
+    [("99,00", 99.0), ("1 234,50", 1234.5), ("1.234,50", 1234.5), ("1,234.50", 1234.5), ("12.5x", None)],
+)
+def test_parse_amount(raw, expected):
+    assert ocr_fields.parse_amount(raw) == expected
+
+
+def test_empty_text():
+    fields = ocr_fields.extract_fields("")
+    assert fields.merchant is None and fields.gross is None
+    assert fields.vat_breakdown == {} and fields.line_items == []
@@ -0,0 +1,104 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+pytest.importorskip("PIL")
+pytest.importorskip("numpy")
+from PIL import Image, ImageDraw  # noqa: E402
+
+ocr = import_module("services.ocr")
+prep = import_module("services.ocr_preprocess")
+
+
+class RelativeBoxEngine:
+    """Returns one detection covering the same fraction of whatever page it is given."""
+
+    def __init__(self) -> None:
+        self.shapes: list[tuple] = []
+
+    def ocr(self, item):
+        h, w = item.shape[:2]
+        self.shapes.append(item.shape)
+        poly = [[0.1 * w, 0.2 * h], [0.5 * w, 0.2 * h], [0.5 * w, 0.3 * h], [0.1 * w, 0.3 * h]]
+        return [{"res": {"rec_texts": ["Total 125,00"], "rec_polys": [poly], "rec_scores": [0.9]}}]
+
+
+@pytest.fixture(autouse=True)
+def _no_ocr_cache(monkeypatch):
+    monkeypatch.setenv("OCR_CACHE_ENABLED", "false")
+
+
+def _lines(size=(600, 400)) -> Image.Image:
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    for y in range(40, size[1] - 40, 30):
+        draw.rectangle([60, y, size[0] - 60, y + 8], fill=0)
+    return img
+
+
+def test_downscale_to_long_edge_and_map_back():
+    options = prep.PreprocessOptions(max_long_edge=1000)
+    page = prep.preprocess(Image.new("RGB", (4000, 3000), "white"), options)
+
+    assert page.image.size == (1000, 750)
+    assert page.image.mode == "L"
+    assert page.scale == pytest.approx(0.25)
+    assert page.to_source(100, 50) == pytest.approx((400, 200))
+
+
+def test_deskew_straightens_and_maps_points_back():
+    options = prep.PreprocessOptions(deskew=True, autocontrast=False)
+    page = prep.preprocess(_lines().rotate(3, fillcolor=255), options)
+    assert page.angle == pytest.approx(-3.0)
+
+    marked = Image.new("L", (200, 100), 255)
+    marked.putpixel((150, 30), 0)
+    rotated = prep.PreparedPage(image=marked.rotate(10, fillcolor=255), angle=10)
+    assert rotated.to_source(146, 21) == pytest.approx((150, 30), abs=1.0)
+
+
+def test_boxes_contract_unchanged_by_downscaling(tmp_path, monkeypatch):
+    (tmp_path / "R1").mkdir()
+    Image.new("RGB", (3000, 4000), "white").save(tmp_path / "R1" / "page-1.jpg")
+    engine = RelativeBoxEngine()
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: engine)
+
+    boxes_file = tmp_path / "R1" / "boxes.json"
+
+    monkeypatch.setenv("OCR_PREPROCESS", "false")
+    ocr.run_ocr("R1", tmp_path)
+    raw = json.loads(boxes_file.read_text())
+    monkeypatch.setenv("OCR_PREPROCESS", "true")
+    monkeypatch.setenv("OCR_MAX_LONG_EDGE", "1000")
+    ocr.run_ocr("R1", tmp_path)
+    prepared = json.loads(boxes_file.read_text())
+
+    assert engine.shapes == [(4000, 3000, 3), (1000, 750, 3)]
+    assert len(prepared) == len(raw) == 1
+    for key in ("x", "y", "w", "h"):
+        assert prepared[0][key] == pytest.approx(raw[0][key], abs=1e-3)
+
+
+def test_normalised_page_is_cached_next_to_original(tmp_path, monkeypatch):
+    original = tmp_path / "page-1.png"
+    Image.new("RGB", (3000, 1000), "white").save(original)
+    options = prep.PreprocessOptions(max_long_edge=600)
+
+    with Image.open(original) as image:
+        first = prep.prepare_page(original, image, options)
+    sidecars = sorted(p.name for p in (tmp_path / prep.SIDECAR_DIR).iterdir())
+    assert len(sidecars) == 2 and all(options.signature() in name for name in sidecars)
+
+    monkeypatch.setattr(prep, "preprocess", lambda *_: (_ for _ in ()).throw(AssertionError("not cached")))
+    with Image.open(original) as image:
+        again = prep.prepare_page(original, image, options)
+    assert again.image.size == first.image.size and again.scale == first.scale
@@ -0,0 +1,136 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+ocr = import_module("services.ocr")
+tasks = import_module("services.tasks")
+
+PREFORK = SimpleNamespace(pool_cls="prefork")
+
+
+class CountingEngine:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def ocr(self, item):
+        self.calls += 1
+        return [{"res": {"rec_texts": [], "rec_polys": [], "rec_scores": []}}]
+
+
+def test_warm_engine_runs_inference_and_touches_ready_file(tmp_path, monkeypatch):
+    ready = tmp_path / "ready" / "ocr"
+    engine = CountingEngine()
+    monkeypatch.setenv("OCR_READY_FILE", str(ready))
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: engine)
+    monkeypatch.setattr(ocr, "_ENGINE_WARM", False)
+
+    assert ocr.warm_ocr_engine(run_inference=False) is True
+    assert not ready.exists() and not ocr.ocr_engine_ready()
+
+    assert ocr.warm_ocr_engine() is True
+    assert ready.exists() and ocr.ocr_engine_ready()
+    assert engine.calls == (1 if ocr.np is not None else 0)
+
+    ocr.clear_ocr_ready()
+    assert not ready.exists()
+
+
+def test_warm_engine_without_engine_is_not_ready(tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_READY_FILE", str(tmp_path / "ready"))
+    monkeypatch.setattr(ocr, "_get_ocr_engine", lambda: None)
+    monkeypatch.setattr(ocr, "_ENGINE_WARM", False)
+
+    assert ocr.warm_ocr_engine() is False
+    assert not (tmp_path / "ready").exists()
+
+
+def test_worker_hooks_follow_preload_mode(monkeypatch):
+    calls: list[bool] = []
+    monkeypatch.setattr(tasks, "warm_ocr_engine", lambda run_inference=True: calls.append(run_inference))
+    monkeypatch.setattr(tasks, "clear_ocr_ready", lambda: None)
+    monkeypatch.setattr(tasks, "_worker_consumes_ocr", lambda: True)
+    monkeypatch.setenv("ENABLE_REAL_OCR", "true")
+
+    monkeypatch.setenv("OCR_PRELOAD", "off")
+    tasks._preload_ocr_in_parent(sender=PREFORK)
+    tasks._preload_ocr_in_child()
+    assert calls == []
+
+    monkeypatch.setenv("OCR_PRELOAD", "parent")
+    tasks._preload_ocr_in_parent(sender=PREFORK)
+    tasks._preload_ocr_in_child()
+    assert calls == [False, True]
+
+    calls.clear()
+    monkeypatch.setenv("OCR_PRELOAD", "child")
+    tasks._preload_ocr_in_parent(sender=PREFORK)
+    tasks._preload_ocr_in_child()
+    assert calls == [True]
+
+    calls.clear()
+    monkeypatch.setattr(tasks, "_worker_consumes_ocr", lambda: False)
+    tasks._preload_ocr_in_child()
+    monkeypatch.setattr(tasks, "_worker_consumes_ocr", lambda: True)
+    monkeypatch.setenv("ENABLE_REAL_OCR", "false")
+    tasks._preload_ocr_in_child()
+    assert calls == []
+
+
+def test_preload_without_pool_processes_warms_in_the_worker(monkeypatch):
+    calls: list[bool] = []
+    monkeypatch.setattr(tasks, "warm_ocr_engine", lambda run_inference=True: calls.append(run_inference))
+    monkeypatch.setattr(tasks, "clear_ocr_ready", lambda: None)
+    monkeypatch.setattr(tasks, "_worker_consumes_ocr", lambda: True)
+    monkeypatch.setenv("ENABLE_REAL_OCR", "true")
+
+    # worker_process_init never fires under --pool=threads, so the worker itself warms up.
+    for mode in ("child", "parent"):
+        monkeypatch.setenv("OCR_PRELOAD", mode)
+        tasks._preload_ocr_in_parent(sender=SimpleNamespace(pool_cls="threads"))
+    assert calls == [True, True]
+
+
+def test_executor_replaces_in_process_preload(monkeypatch):
+    calls: list[str] = []
+    monkeypatch.setattr(tasks, "warm_ocr_engine", lambda run_inference=True: calls.append("warm"))
+    monkeypatch.setattr(tasks, "start_ocr_executor", lambda: calls.append("executor"))
+    monkeypatch.setattr(tasks, "clear_ocr_ready", lambda: None)
+    monkeypatch.setattr(tasks, "_worker_consumes_ocr", lambda: True)
+    monkeypatch.setenv("ENABLE_REAL_OCR", "true")
+    monkeypatch.setenv("OCR_PRELOAD", "parent")
+    monkeypatch.setenv("OCR_EXECUTOR_WORKERS", "2")
+
+    tasks._preload_ocr_in_parent(sender=SimpleNamespace(pool_cls="threads"))
+    tasks._preload_ocr_in_child()
+
+    assert calls == ["executor"]
+
+
+def test_executor_is_switched_off_under_the_prefork_pool(monkeypatch, caplog):
+    calls: list[str] = []
+    monkeypatch.setattr(ocr, "_EXECUTOR_DISABLED", False)
+    monkeypatch.setattr(tasks, "warm_ocr_engine", lambda run_inference=True: calls.append(f"warm:{run_inference}"))
+    monkeypatch.setattr(tasks, "start_ocr_executor", lambda: calls.append("executor"))
+    monkeypatch.setattr(tasks, "clear_ocr_ready", lambda: None)
+    monkeypatch.setattr(tasks, "_worker_consumes_ocr", lambda: True)
+    monkeypatch.setenv("ENABLE_REAL_OCR", "true")
+    monkeypatch.setenv("OCR_PRELOAD", "parent")
+    monkeypatch.setenv("OCR_EXECUTOR_WORKERS", "2")
+
+    tasks._preload_ocr_in_parent(sender=SimpleNamespace(pool_cls="threads"))
+    assert calls == ["executor"] and ocr.ocr_executor_workers() == 2
+
+    calls.clear()
+    tasks._preload_ocr_in_parent(sender=SimpleNamespace(pool_cls="prefork"))
+    tasks._preload_ocr_in_child()
+
+    assert calls == ["warm:False", "warm:True"]
+    assert ocr.ocr_executor_workers() == 0
+    assert "OCR_EXECUTOR_WORKERS is ignored" in caplog.text
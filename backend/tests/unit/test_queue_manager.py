@@ -18,3 +18,27 @@ def test_celery_singleton_and_basic_conf():
     assert c1.conf.task_acks_late is True
     assert c1.conf.worker_prefetch_multiplier == 1
     assert c1.conf.task_default_queue == "default"
+
+
+def test_pipeline_stages_route_to_dedicated_queues():
+    c = queue_manager.get_celery()
+    routes = c.conf.task_routes
+    assert routes["services.tasks.process_ocr"]["queue"] == "ocr"
+    assert routes["services.tasks.process_classification"]["queue"] == "classify"
+    assert routes["services.tasks.process_validation"]["queue"] == "validate"
+    assert routes["services.tasks.process_accounting_proposal"]["queue"] == "accounting"
+    assert routes["services.tasks.process_matching"]["queue"] == "matching"
+    assert routes["services.tasks.process_export"]["queue"] == "export"
+    assert routes["services.tasks.process_statement_pdf"]["queue"] == "matching"
+
+    queue_names = {getattr(q, "name", q) for q in c.conf.task_queues}
+    assert {"default", *queue_manager.PIPELINE_QUEUES} <= queue_names
+    assert {r["queue"] for r in routes.values()} <= queue_names
+
+
+def test_beat_schedules_capture_upload_pruning():
+    schedule = queue_manager.get_celery().conf.beat_schedule
+    entry = schedule["prune-capture-uploads"]
+    assert entry["task"] == "services.tasks.prune_capture_uploads"
+    assert entry["schedule"] == 3600.0
+    assert callable(getattr(import_module("services.tasks"), "prune_capture_uploads"))
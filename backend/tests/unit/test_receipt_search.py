@@ -0,0 +1,78 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+search = import_module("services.receipt_search")
+receipts = import_module("api.receipts")
+
+
+def test_parse_query_builds_required_prefix_terms():
+    query = search.parse_query('ICA "kvitto" +kaffe -x ab')
+    assert query.terms == ["ica", "kvitto", "kaffe"]
+    assert query.boolean == "+ica* +kvitto* +kaffe*"
+
+
+def test_parse_query_without_indexable_terms():
+    query = search.parse_query("a b")
+    assert query.terms == [] and query.boolean == "" and query.pattern is None
+
+
+def test_highlight_offsets_match_word_prefixes():
+    query = search.parse_query("kaff")
+    text = "Kaffe 25,00\nKaffebryggare 299,00"
+    spans = search.highlight(text, query)
+    assert [text[s:e] for s, e in spans] == ["Kaffe", "Kaffebryggare"]
+
+
+def test_snippet_centres_on_first_hit():
+    query = search.parse_query("kanelbulle")
+    text = ("rad " * 100) + "Kanelbulle 32,00 " + ("slut " * 100)
+    out = search.snippet(text, query, width=80)
+    assert "Kanelbulle" in out and len(out) <= 80
+    assert not out.startswith("ad ")
+
+
+@pytest.fixture
+def client(monkeypatch, blueprint_client):
+    monkeypatch.setattr(receipts, "_COUNT_CACHE", {})
+    return blueprint_client(receipts.receipts_bp, receipts)
+
+
+def test_list_search_ranks_and_highlights(client, fake_cursor):
+    created = datetime(2025, 9, 1, 12, 0)
+    row = ("R1", "R1.jpg", "Cafe Kaffe", created, 80.0, 100.0, "completed", "alice", None, 1,
+           None, None, None, "", created, 3.5, "Cafe Kaffe\nKaffe 25,00\nTotalt 25,00")
+    fake_cursor.rows = [row]
+
+    body = client.get("/receipts?q=kaffe&status=completed").get_json()
+
+    hit = body["items"][0]["search"]
+    assert hit["score"] == 3.5
+    assert hit["merchant_highlights"] == [[5, 10]]
+    assert hit["snippet"] == "Cafe Kaffe Kaffe 25,00 Totalt 25,00"
+    assert len(hit["snippet_highlights"]) == 2
+    assert body["meta"]["next_cursor"] is None
+    sql, params = fake_cursor.executed[-1]
+    assert "ORDER BY score DESC, created_at DESC" in sql
+    assert "MATCH(merchant_name, ocr_raw) AGAINST (%s IN BOOLEAN MODE)" in sql
+    assert params[:3] == ("+kaffe*", "completed", "+kaffe*")
+
+
+def test_list_search_rejects_cursor(client):
+    assert client.get("/receipts?q=kaffe&cursor=").status_code == 400
+
+
+def test_short_query_falls_back_to_merchant_filter(client, fake_cursor):
+    client.get("/receipts?q=ab")
+    sql, params = fake_cursor.executed[-1]
+    assert "merchant_name LIKE %s" in sql and "MATCH(" not in sql
+    assert params[0] == "%ab%"
@@ -0,0 +1,61 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+receipts = import_module("api.receipts")
+
+
+def _row(rid, count):
+    return (rid, f"{rid}.jpg", "Cafe", datetime(2025, 9, 1, 12, 0), 80.0, 100.0, "completed",
+            "alice", None, count, None, None, None, "meal", datetime(2025, 9, 1, 12, 0), 0, None)
+
+
+@pytest.fixture
+def client(blueprint_client):
+    return blueprint_client(receipts.receipts_bp, receipts)
+
+
+def test_list_reads_line_item_count_column(monkeypatch, client, fake_cursor):
+    def no_file_reads(_rid):
+        raise AssertionError("line items file should not be read")
+
+    monkeypatch.setattr(receipts, "_count_line_items", no_file_reads)
+    fake_cursor.rows = [_row("R1", 3), _row("R2", 0)]
+
+    body = client.get("/receipts").get_json()
+
+    assert [item["line_item_count"] for item in body["items"]] == [3, 0]
+    assert "u.line_item_count" in fake_cursor.executed[-1][0]
+
+
+def test_list_backfills_uncounted_rows_once(monkeypatch, client, fake_cursor):
+    stored: list = []
+    monkeypatch.setattr(receipts, "_count_line_items", lambda rid: 2)
+    monkeypatch.setattr(receipts, "set_line_item_counts", lambda counts: stored.extend(counts))
+    fake_cursor.rows = [_row("R1", None), _row("R2", 5)]
+
+    body = client.get("/receipts").get_json()
+
+    assert [item["line_item_count"] for item in body["items"]] == [2, 5]
+    assert stored == [("R1", 2)]
+
+
+def test_put_line_items_updates_count(tmp_path, monkeypatch, client):
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+    counts: list = []
+    monkeypatch.setattr(receipts, "set_line_item_count", lambda rid, n: counts.append((rid, n)))
+
+    resp = client.put("/receipts/R1/line-items", json={"line_items": [{"description": "a"}, {"description": "b"}]})
+
+    assert resp.status_code == 200
+    assert counts == [("R1", 2)]
+    assert (tmp_path / "line_items" / "R1.json").exists()
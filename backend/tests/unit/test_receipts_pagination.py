@@ -0,0 +1,104 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+receipts = import_module("api.receipts")
+
+
+def _row(rid, minute):
+    created = datetime(2025, 9, 1, 12, minute)
+    return (rid, f"{rid}.jpg", "Cafe", created, 80.0, 100.0, "completed",
+            "alice", None, 1, None, None, None, "", created, 0, None)
+
+
+@pytest.fixture
+def client(monkeypatch, blueprint_client):
+    monkeypatch.setattr(receipts, "_COUNT_CACHE", {})
+    return blueprint_client(receipts.receipts_bp, receipts)
+
+
+def test_cursor_round_trip():
+    token = receipts._encode_cursor(datetime(2025, 9, 1, 12, 30, 5, 120), "R9")
+    assert receipts._decode_cursor(token) == (datetime(2025, 9, 1, 12, 30, 5, 120), "R9")
+    assert receipts._decode_cursor(receipts._encode_cursor(None, "R9")) == (None, "R9")
+
+
+def test_first_cursor_page_returns_next_cursor(client, fake_cursor):
+    fake_cursor.rows = [_row("R3", 3), _row("R2", 2), _row("R1", 1)]
+
+    body = client.get("/receipts?cursor=&page_size=2").get_json()
+
+    assert [item["id"] for item in body["items"]] == ["R3", "R2"]
+    assert receipts._decode_cursor(body["meta"]["next_cursor"]) == (datetime(2025, 9, 1, 12, 2), "R2")
+    assert body["meta"]["total_mode"] == "cached"
+    sql, params = fake_cursor.executed[-1]
+    assert "ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s" in sql
+    assert "ORDER BY score" not in sql
+    assert params[-2:] == (3, 0)
+
+
+def test_next_cursor_page_seeks_instead_of_offset(client, fake_cursor):
+    fake_cursor.rows = [_row("R1", 1)]
+    token = receipts._encode_cursor(datetime(2025, 9, 1, 12, 2), "R2")
+
+    body = client.get(f"/receipts?cursor={token}&page_size=2&status=completed&total=none").get_json()
+
+    assert [item["id"] for item in body["items"]] == ["R1"]
+    assert body["meta"]["next_cursor"] is None
+    assert body["meta"]["total"] is None
+    assert len(fake_cursor.executed) == 1
+    sql, params = fake_cursor.executed[0]
+    # Rows without created_at sort last, so they are still ahead of a timestamped cursor
+    assert "ai_status = %s AND (created_at <= %s AND (created_at < %s OR id < %s) OR created_at IS NULL)" in sql
+    assert params == ("completed", datetime(2025, 9, 1, 12, 2), datetime(2025, 9, 1, 12, 2), "R2", 3, 0)
+
+
+def test_page_ending_on_null_created_at_keeps_paging(client, fake_cursor):
+    untimed = _row("R2", 0)[:14] + (None,) + _row("R2", 0)[15:]
+    fake_cursor.rows = [_row("R3", 3), untimed, _row("R1", 1)]
+
+    body = client.get("/receipts?cursor=&page_size=2").get_json()
+
+    token = body["meta"]["next_cursor"]
+    assert receipts._decode_cursor(token) == (None, "R2")
+
+    fake_cursor.rows = []
+    client.get(f"/receipts?cursor={token}&page_size=2&total=none")
+    sql, params = fake_cursor.executed[-1]
+    assert "WHERE created_at IS NULL AND id < %s ORDER BY" in sql
+    assert params == ("R2", 3, 0)
+
+
+def test_invalid_cursor_is_rejected(client):
+    resp = client.get("/receipts?cursor=not-a-cursor")
+    assert resp.status_code == 400
+
+
+def test_cached_total_is_reused_across_pages(client, fake_cursor):
+    fake_cursor.rows, fake_cursor.total = [_row("R1", 1)], 42
+
+    first = client.get("/receipts?cursor=").get_json()
+    second = client.get("/receipts?cursor=").get_json()
+
+    counts = [sql for sql, _ in fake_cursor.executed if sql.startswith("SELECT COUNT(1)")]
+    assert first["meta"]["total"] == second["meta"]["total"] == 42
+    assert len(counts) == 1
+
+
+def test_page_mode_stays_exact_and_offset_based(client, fake_cursor):
+    fake_cursor.rows, fake_cursor.total = [_row("R1", 1)], 7
+
+    body = client.get("/receipts?page=3&page_size=2").get_json()
+
+    assert body["meta"]["page"] == 3 and body["meta"]["total"] == 7
+    assert body["meta"]["total_mode"] == "exact"
+    assert fake_cursor.executed[-1][1][-2:] == (3, 4)
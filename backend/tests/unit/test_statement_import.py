@@ -0,0 +1,249 @@
+import base64
+import json
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+from flask import Flask  # noqa: E402
+
+si = import_module("services.statement_import")
+recon = import_module("api.reconciliation_firstcard")
+
+PAGE_1 = "Period: 2025-09-01 - 2025-09-30\n2025-09-02 Espresso House 45,00\n2025-09-03 SJ AB 312.50\n"
+PAGE_2 = "2025-09-10 Circle K -120,00\n"
+
+
+class _Cursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        self.db.log.append(("execute", sql, params, self.db.in_tx))
+        if sql.startswith("UPDATE invoice_documents SET status='parsing'"):
+            meta, doc_id, stale_before = params
+            doc = self.db.documents.get(doc_id)
+            stale = doc is not None and doc["status"] == "parsing" and (doc["metadata"] or {}).get("claimed_at", 0) < stale_before
+            self.rowcount = int(doc is not None and (doc["status"] in ("queued", "failed") or stale))
+            if self.rowcount:
+                doc.update(status="parsing", metadata=json.loads(meta))
+                self.db.statuses.append("parsing")
+        elif sql.startswith("INSERT INTO invoice_documents"):
+            self.db.documents[params[0]] = {"status": params[4], "metadata": None}
+        elif sql.startswith("UPDATE invoice_documents SET status='imported'"):
+            doc = self.db.documents[params[-2]]
+            self.rowcount = int(doc["status"] == "parsing" and (doc["metadata"] or {}).get("claim") == params[-1])
+            if self.rowcount:
+                doc.update(status="imported", metadata=json.loads(params[0]))
+                self.db.statuses.append("imported")
+        elif sql.startswith("UPDATE invoice_documents SET status="):
+            self.db.documents[params[-1]].update(status=params[0], metadata=json.loads(params[1]))
+            self.db.statuses.append(params[0])
+        elif sql.startswith("UPDATE invoice_documents SET metadata_json"):
+            self.db.documents[params[-1]]["metadata"] = json.loads(params[0])
+
+    def executemany(self, sql, rows):
+        self.db.log.append(("executemany", sql, list(rows), self.db.in_tx))
+        self.db.lines.extend(rows)
+
+
+class _DB:
+    def __init__(self):
+        self.log: list = []
+        self.documents: dict = {}
+        self.lines: list = []
+        self.statuses: list = []
+        self.in_tx = False
+        self.transactions = 0
+
+    @contextmanager
+    def cursor(self):
+        yield _Cursor(self)
+
+    @contextmanager
+    def transaction(self):
+        self.transactions += 1
+        self.in_tx = True
+        kept = len(self.lines)
+        try:
+            yield
+        except Exception:
+            del self.lines[kept:]
+            raise
+        finally:
+            self.in_tx = False
+
+
+def _wire(monkeypatch, tmp_path):
+    db = _DB()
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(si, "db_cursor", db.cursor)
+    monkeypatch.setattr(si, "db_transaction", db.transaction)
+    return db
+
+
+def test_parse_pages_collects_lines_period_and_reports_progress():
+    seen = []
+    parsed = si.parse_pages([PAGE_1, PAGE_2], progress=lambda pages, lines: seen.append((pages, lines)))
+    assert parsed["period_start"] == "2025-09-01" and parsed["period_end"] == "2025-09-30"
+    assert [ln["amount"] for ln in parsed["lines"]] == [45.0, 312.5, -120.0]
+    assert parsed["pages"] == 2
+    assert seen == [(1, 2), (2, 3)]
+
+
+def test_import_statement_batches_lines_in_one_transaction(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    monkeypatch.setattr(si, "INSERT_BATCH", 2)
+    lines = [{"transaction_date": "2025-09-02", "amount": i, "merchant": "Shop"} for i in range(5)]
+
+    assert si.import_statement("DOC-1", "2025-09-01", "2025-09-30", lines) == 5
+
+    batches = [entry for entry in db.log if entry[0] == "executemany"]
+    assert [len(entry[2]) for entry in batches] == [2, 2, 1]
+    assert all(entry[3] for entry in db.log)
+    assert db.transactions == 1
+    assert db.lines[0] == ("DOC-1", "2025-09-02", 0, "Shop", None)
+
+
+def test_import_pdf_reports_progress_and_commits_lines_with_status(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    monkeypatch.setattr(si, "PROGRESS_EVERY_PAGES", 1)
+    monkeypatch.setattr(si, "iter_pdf_pages", lambda path: iter([PAGE_1, PAGE_2]))
+    si.create_pending("DOC-1", None, None)
+
+    result = si.import_pdf("DOC-1")
+
+    assert result == {"document_id": "DOC-1", "status": "imported", "pages": 2, "lines": 3}
+    assert db.statuses == ["parsing", "parsing", "parsing", "imported"]
+    # Progress is written outside the transaction; lines and the final status inside it.
+    progress = [e for e in db.log if "SET status=%s" in e[1]]
+    assert not any(e[3] for e in progress)
+    final = [e for e in db.log if e[0] == "executemany" or "status='imported'" in e[1]]
+    assert final and all(e[3] for e in final)
+    assert db.documents["DOC-1"]["metadata"] == {"source": "pdf", "pages": 2, "lines": 3}
+
+
+def test_import_pdf_marks_failure(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    si.create_pending("DOC-1", None, None)
+
+    def broken(path):
+        yield PAGE_1
+        raise ValueError("corrupt page")
+
+    monkeypatch.setattr(si, "iter_pdf_pages", broken)
+    assert si.import_pdf("DOC-1")["status"] == "failed"
+    assert db.documents["DOC-1"]["status"] == "failed"
+    assert db.documents["DOC-1"]["metadata"]["error"] == "corrupt page"
+    assert not db.lines
+
+    # A failed statement can be imported again.
+    monkeypatch.setattr(si, "iter_pdf_pages", lambda path: iter([PAGE_1, PAGE_2]))
+    assert si.import_pdf("DOC-1")["status"] == "imported"
+    assert len(db.lines) == 3
+
+
+def test_import_pdf_redelivered_after_import_inserts_nothing(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    monkeypatch.setattr(si, "iter_pdf_pages", lambda path: iter([PAGE_1, PAGE_2]))
+    si.create_pending("DOC-1", None, None)
+    assert si.import_pdf("DOC-1")["status"] == "imported"
+
+    assert si.import_pdf("DOC-1") == {"document_id": "DOC-1", "status": "skipped"}
+    assert len(db.lines) == 3 and db.documents["DOC-1"]["status"] == "imported"
+
+    # Nor does a second run while the first is still parsing.
+    si.create_pending("DOC-2", None, None)
+    db.documents["DOC-2"].update(status="parsing", metadata={"claim": "live", "claimed_at": time.time()})
+    assert si.import_pdf("DOC-2")["status"] == "skipped"
+
+
+def test_import_pdf_takes_over_a_statement_left_parsing_by_a_dead_run(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    monkeypatch.setattr(si, "iter_pdf_pages", lambda path: iter([PAGE_1, PAGE_2]))
+    si.create_pending("DOC-1", None, None)
+    # A worker claimed the statement and was killed before committing anything.
+    db.documents["DOC-1"].update(status="parsing", metadata={"claim": "dead", "claimed_at": time.time() - 3600})
+
+    assert si.import_pdf("DOC-1")["status"] == "imported"
+    assert si.import_pdf("DOC-1")["status"] == "skipped"
+    assert len(db.lines) == 3 and db.documents["DOC-1"]["status"] == "imported"
+
+
+def test_import_pdf_that_lost_its_claim_commits_nothing(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    si.create_pending("DOC-1", None, None)
+
+    def slow_pages(path):
+        yield PAGE_1
+        # Meanwhile the run is considered dead and another one claims the statement.
+        db.documents["DOC-1"]["metadata"]["claim"] = "newer"
+
+    monkeypatch.setattr(si, "iter_pdf_pages", slow_pages)
+
+    assert si.import_pdf("DOC-1")["status"] == "skipped"
+    assert db.lines == [] and db.documents["DOC-1"]["status"] == "parsing"
+
+
+def test_iter_pdf_pages_falls_back_to_plain_text(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_DIR", str(tmp_path))
+    path = si.save_pdf("../evil", PAGE_2.encode())
+    assert path == tmp_path / "statements" / "___evil.pdf"
+    assert "".join(si.iter_pdf_pages(path)) == PAGE_2
+
+
+def _client(monkeypatch, db):
+    monkeypatch.setattr(recon, "db_cursor", db.cursor)
+    app = Flask(__name__)
+    app.register_blueprint(recon.recon_bp)
+    return app.test_client()
+
+
+def test_pdf_import_is_queued(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    queued: list = []
+    monkeypatch.setattr(recon, "process_statement_pdf", SimpleNamespace(delay=queued.append))
+    client = _client(monkeypatch, db)
+
+    body = {"document_id": "DOC-1", "pdf_base64": base64.b64encode(b"%PDF-1.4 ...").decode()}
+    resp = client.post("/reconciliation/firstcard/import", json=body)
+
+    assert resp.status_code == 202
+    assert resp.get_json() == {"status": "queued", "id": "DOC-1", "lines": 0}
+    assert queued == ["DOC-1"]
+    assert db.documents["DOC-1"]["status"] == "queued"
+    assert si.pdf_path("DOC-1").read_bytes() == b"%PDF-1.4 ..."
+
+
+def test_pdf_import_without_queue_parses_in_request(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    monkeypatch.setattr(recon, "process_statement_pdf", None)
+    client = _client(monkeypatch, db)
+
+    body = {"document_id": "DOC-1", "pdf_base64": base64.b64encode((PAGE_1 + PAGE_2).encode()).decode()}
+    resp = client.post("/reconciliation/firstcard/import", json=body)
+
+    assert resp.status_code == 200
+    assert resp.get_json()["lines"] == 3
+    assert db.documents["DOC-1"]["status"] == "imported"
+
+
+def test_json_import_inserts_in_bulk(monkeypatch, tmp_path):
+    db = _wire(monkeypatch, tmp_path)
+    client = _client(monkeypatch, db)
+    lines = [{"transaction_date": "2025-09-02", "amount": 10.0, "merchant_name": "Shop"}] * 3
+
+    resp = client.post("/reconciliation/firstcard/import", json={"document_id": "DOC-1", "lines": lines})
+
+    assert resp.get_json() == {"status": "ok", "id": "DOC-1", "lines": 3}
+    assert [e[0] for e in db.log].count("executemany") == 1
+    assert db.documents["DOC-1"]["status"] == "imported"
@@ -44,3 +44,48 @@ def test_file_storage_protects_traversal(tmp_path: Path):
         assert False, "Expected ValueError"
     except ValueError:
         pass
+
+
+def test_file_storage_writer_publishes_only_complete_files(tmp_path: Path):
+    store = FileStorage(tmp_path)
+    with store.writer("R1", "big.pdf") as fh:
+        fh.write(b"part one, ")
+        assert store.list("R1") == ["big.pdf.part"]
+        fh.write(b"part two")
+    assert store.load("R1", "big.pdf") == b"part one, part two"
+    assert store.list("R1") == ["big.pdf"]
+
+    try:
+        with store.writer("R1", "broken.pdf") as fh:
+            fh.write(b"half")
+            raise OSError("connection lost")
+    except OSError:
+        pass
+    assert store.list("R1") == ["big.pdf"]
+
+
+def test_file_storage_purge_removes_subdirectories(tmp_path: Path):
+    store = FileStorage(tmp_path)
+    store.save("R1", "page-1.jpg", b"jpeg")
+    cache = tmp_path / "R1" / ".ocr"
+    cache.mkdir()
+    (cache / "page-1.json").write_text("[]")
+    store.save("R2", "page-1.jpg", b"other")
+
+    store.purge("R1")
+
+    assert not (tmp_path / "R1").exists()
+    assert store.list("R2") == ["page-1.jpg"]
+
+
+def test_file_storage_purge_stays_inside_base(tmp_path: Path):
+    base = tmp_path / "storage"
+    store = FileStorage(base)
+    (tmp_path / "keep.txt").write_text("x")
+    for receipt_id in ("..", "R1/..", "R1/sub"):
+        try:
+            store.purge(receipt_id)
+            assert False, "Expected ValueError"
+        except ValueError:
+            pass
+    assert (tmp_path / "keep.txt").exists() and base.exists()
@@ -0,0 +1,219 @@
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+tasks = import_module("services.tasks")
+
+
+class FakeCursor:
+    def __init__(self, row, tags=()):
+        self.row = row
+        self.tags = [(tag,) for tag in tags]
+        self.executed: list[tuple[str, tuple]] = []
+        self.rowcount = 1
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return self.row
+
+    def fetchall(self):
+        return self.tags
+
+
+def _fake_db(cursor):
+    calls = {"n": 0}
+
+    @contextmanager
+    def _cursor():
+        calls["n"] += 1
+        yield cursor
+
+    return _cursor, calls
+
+
+def test_load_file_context_uses_one_cursor(monkeypatch):
+    row = (
+        "F1",
+        "alice",
+        datetime(2025, 9, 1, 10, 0, 0),
+        "Cafe",
+        "5566778899",
+        datetime(2025, 8, 31, 12, 30, 0),
+        Decimal("125.00"),
+        Decimal("100.00"),
+        0.91,
+        "receipt",
+    )
+    cursor = FakeCursor(row, tags=["meal", "travel\nabroad", ""])
+    fake, calls = _fake_db(cursor)
+    monkeypatch.setattr(tasks, "db_cursor", fake)
+
+    ctx = tasks._load_file_context("F1")
+
+    assert calls["n"] == 1
+    assert [params for _, params in cursor.executed] == [("F1",), ("F1",)]
+    assert "GROUP_CONCAT" not in cursor.executed[0][0]
+    assert ctx["file_type"] == "receipt"
+    assert ctx["tags"] == ["meal", "travel\nabroad"]
+    assert ctx["gross_amount"] == "125.00"
+    assert ctx["purchase_datetime"] == "2025-08-31T12:30:00"
+
+
+def test_load_file_context_skips_tags_for_a_missing_file(monkeypatch):
+    cursor = FakeCursor(None)
+    fake, _calls = _fake_db(cursor)
+    monkeypatch.setattr(tasks, "db_cursor", fake)
+
+    assert tasks._load_file_context("F404") is None
+    assert len(cursor.executed) == 1
+
+
+def test_receipt_from_context_round_trip():
+    ctx = {
+        "id": "F1",
+        "submitted_by": "alice",
+        "created_at": "2025-09-01T10:00:00",
+        "merchant_name": "Cafe",
+        "orgnr": None,
+        "purchase_datetime": "2025-08-31T12:30:00",
+        "gross_amount": "125.00",
+        "net_amount": None,
+        "ai_confidence": 0.91,
+        "file_type": "receipt",
+        "tags": ["meal"],
+    }
+    receipt = tasks._receipt_from_context(ctx)
+
+    assert receipt is not None
+    assert receipt.gross_amount == Decimal("125.00")
+    assert receipt.purchase_datetime.tzinfo is not None
+    assert receipt.tags == ["meal"]
+    assert receipt.confidence_summary == 0.91
+    assert tasks._receipt_from_context(None) is None
+
+
+def test_pipeline_stage_reuses_passed_context(monkeypatch):
+    def _fail_load(_file_id):
+        raise AssertionError("context should not be reloaded")
+
+    monkeypatch.setattr(tasks, "_load_file_context", _fail_load)
+    monkeypatch.setattr(tasks, "_finish_stage", lambda *a, **k: True)
+    monkeypatch.setattr(tasks, "_save_accounting_entries", lambda *_: True)
+    monkeypatch.setattr(tasks, "_update_file_status", lambda *a, **k: True)
+    monkeypatch.setattr(tasks, "_history", lambda *a, **k: None)
+
+    ctx = {
+        "id": "F1",
+        "created_at": "2025-09-01T10:00:00",
+        "merchant_name": "Cafe",
+        "gross_amount": "125.00",
+        "net_amount": "100.00",
+        "tags": [],
+    }
+    out = tasks.process_accounting_proposal.run("F1", ctx)
+    assert out["ok"] is True and out["entries"] > 0
+
+
+def test_fused_pipeline_runs_all_stages_in_one_transaction(monkeypatch):
+    stages: list[tuple[str, str]] = []
+    transactions = {"opened": 0}
+
+    @contextmanager
+    def fake_transaction():
+        transactions["opened"] += 1
+        yield
+
+    def fake_finish(file_id, job, status, confidence=None):
+        stages.append((job, status))
+        return True
+
+    monkeypatch.setattr(tasks, "db_transaction", fake_transaction)
+    monkeypatch.setattr(tasks, "_finish_stage", fake_finish)
+    monkeypatch.setattr(tasks, "_collect_text_hints", lambda _fid: "")
+    monkeypatch.setattr(tasks, "_save_accounting_entries", lambda *_: True)
+    monkeypatch.setattr(tasks, "_update_file_status", lambda *a, **k: True)
+    monkeypatch.setattr(tasks, "_history", lambda fid, job, status: stages.append((job, status)))
+
+    ctx = {
+        "id": "F1",
+        "created_at": "2025-09-01T10:00:00",
+        "merchant_name": "Cafe",
+        "purchase_datetime": "2025-08-31T12:30:00",
+        "gross_amount": "125.00",
+        "net_amount": "125.00",
+        "ai_confidence": 0.9,
+        "file_type": "receipt",
+        "tags": [],
+    }
+    out = tasks.process_receipt_pipeline.run("F1", ctx)
+
+    assert transactions["opened"] == 1
+    assert [job for job, _ in stages] == ["classification", "validation", "accounting_proposal"]
+    assert set(out["stages"]) == {"classification", "validation", "accounting_proposal"}
+    assert out["ok"] is True
+
+
+def test_fused_pipeline_looks_up_company_before_opening_the_transaction(monkeypatch):
+    state = {"in_tx": False, "lookups": [], "renamed": []}
+
+    @contextmanager
+    def fake_transaction():
+        state["in_tx"] = True
+        try:
+            yield
+        finally:
+            state["in_tx"] = False
+
+    def fake_enrich(receipt, provider):
+        state["lookups"].append(state["in_tx"])
+        return type("Company", (), {"legal_name": "Cafe Holding AB"})()
+
+    monkeypatch.setattr(tasks, "db_transaction", fake_transaction)
+    monkeypatch.setattr(tasks, "enrich_receipt", fake_enrich)
+    monkeypatch.setattr(tasks, "provider_from_env", lambda: None)
+    monkeypatch.setattr(tasks, "_update_file_fields", lambda fid, **f: state["renamed"].append((state["in_tx"], f)))
+    monkeypatch.setattr(tasks, "_finish_stage", lambda *a, **k: True)
+    monkeypatch.setattr(tasks, "_collect_text_hints", lambda _fid: "")
+    monkeypatch.setattr(tasks, "_history", lambda *a, **k: None)
+
+    ctx = {"id": "F1", "merchant_name": "Cafe", "orgnr": "556000-0000", "file_type": "other", "tags": []}
+    tasks.process_receipt_pipeline.run("F1", ctx)
+
+    assert state["lookups"] == [False]
+    assert state["renamed"] == [(True, {"merchant": "Cafe Holding AB"})]
+    assert ctx["merchant_name"] == "Cafe Holding AB"
+
+
+def test_process_ocr_chains_fused_task_when_enabled(monkeypatch):
+    queued: list[str] = []
+
+    class Recorder:
+        def __init__(self, name):
+            self.name = name
+
+        def delay(self, *_args):
+            queued.append(self.name)
+
+    monkeypatch.setenv("ENABLE_REAL_OCR", "false")
+    monkeypatch.setenv("PIPELINE_FUSED", "true")
+    monkeypatch.setattr(tasks, "_finish_stage", lambda *a, **k: True)
+    monkeypatch.setattr(tasks, "_load_file_context", lambda _fid: {"id": "F1"})
+    monkeypatch.setattr(tasks, "process_receipt_pipeline", Recorder("fused"))
+    monkeypatch.setattr(tasks, "process_classification", Recorder("classification"))
+
+    tasks.process_ocr.run("F1")
+    monkeypatch.setenv("PIPELINE_FUSED", "false")
+    tasks.process_ocr.run("F1")
+
+    assert queued == ["fused", "classification"]
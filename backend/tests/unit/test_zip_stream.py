@@ -0,0 +1,50 @@
+import io
+import sys
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from importlib import import_module  # noqa: E402
+
+zip_stream = import_module("services.zip_stream")
+ZipMember = zip_stream.ZipMember
+
+
+def test_stream_zip_round_trip_and_compression(tmp_path):
+    photo = tmp_path / "page1.jpg"
+    photo.write_bytes(b"\xff\xd8" + bytes(range(256)) * 40)
+    members = [
+        ZipMember("statement.json", data=b'{"lines": []}' * 50),
+        ZipMember("receipts/R1/page1.jpg", opener=lambda: photo.open("rb")),
+    ]
+
+    archive = b"".join(zip_stream.stream_zip(members, chunk_size=1024))
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.read("statement.json") == b'{"lines": []}' * 50
+        assert zf.read("receipts/R1/page1.jpg") == photo.read_bytes()
+        assert zf.getinfo("receipts/R1/page1.jpg").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("statement.json").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.testzip() is None
+
+
+def test_stream_zip_yields_per_chunk_and_skips_unreadable(tmp_path):
+    big = tmp_path / "scan.png"
+    big.write_bytes(b"x" * 10_000)
+
+    def missing():
+        raise FileNotFoundError("gone")
+
+    chunks = list(zip_stream.stream_zip(
+        [ZipMember("a.png", opener=lambda: big.open("rb")), ZipMember("b.png", opener=missing)],
+        chunk_size=1000,
+    ))
+
+    assert len(chunks) >= 10
+    assert max(len(c) for c in chunks) < 2000
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.namelist() == ["a.png"]
@@ -0,0 +1,4 @@
+-- Persist the number of line items (STORAGE_DIR/line_items/<id>.json) so the receipts
+-- list does not open one JSON file per row. NULL means "not counted yet"; GET /receipts
+-- fills it from the file the first time such a row is listed.
+ALTER TABLE unified_files ADD COLUMN line_item_count INT NULL;
@@ -0,0 +1,3 @@
+-- Composite index backing keyset pagination of GET /receipts:
+-- ORDER BY created_at DESC, id DESC with a (created_at, id) seek predicate.
+CREATE INDEX idx_unified_files_created_id ON unified_files(created_at, id);
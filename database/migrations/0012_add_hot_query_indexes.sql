@@ -0,0 +1,26 @@
+-- Secondary indexes for the predicates the API filters and sorts on.
+-- unified_files.created_at is covered by idx_unified_files_created_id (0011).
+
+-- GET /receipts?status=, list_unprocessed (ai_status IS NULL OR IN (...) ORDER BY created_at),
+-- SIE export (ai_status = 'completed')
+CREATE INDEX idx_unified_files_status_created ON unified_files(ai_status, created_at);
+
+-- GET /receipts?from=&to= and the company card day/amount lookup
+CREATE INDEX idx_unified_files_purchase_dt ON unified_files(purchase_datetime);
+
+-- GET /receipts?orgnr=
+CREATE INDEX idx_unified_files_orgnr ON unified_files(orgnr);
+
+-- Tag filter subquery: file_id IN (SELECT file_id FROM file_tags WHERE tag IN (...));
+-- the primary key (file_id, tag) cannot serve a lookup by tag.
+CREATE INDEX idx_file_tags_tag ON file_tags(tag, file_id);
+
+-- Statement lines per invoice in date order (export, reconciliation) and unmatched lookups
+CREATE INDEX idx_invoice_lines_invoice_date ON invoice_lines(invoice_id, transaction_date, id);
+CREATE INDEX idx_invoice_lines_matched_file ON invoice_lines(matched_file_id);
+
+-- Company card statement list (invoice_type = 'company_card' ORDER BY uploaded_at DESC)
+CREATE INDEX idx_invoice_documents_type_uploaded ON invoice_documents(invoice_type, uploaded_at);
+
+-- Processing history per file
+CREATE INDEX idx_ai_processing_history_file ON ai_processing_history(file_id, created_at);
@@ -0,0 +1,7 @@
+-- Full-text search for GET /receipts?q= over the merchant and the OCR text.
+-- ocr_raw is written by process_ocr; add it for databases created without it.
+ALTER TABLE unified_files ADD COLUMN ocr_raw MEDIUMTEXT NULL;
+
+-- InnoDB maintains the index as rows are written, so receipts become searchable
+-- as soon as OCR completes. Column order must match MATCH() in services/receipt_search.py.
+CREATE FULLTEXT INDEX ft_unified_files_search ON unified_files(merchant_name, ocr_raw);
@@ -0,0 +1,16 @@
+-- Export job registry shared by all API workers and the export Celery queue.
+CREATE TABLE IF NOT EXISTS export_jobs (
+  id VARCHAR(36) PRIMARY KEY,
+  kind VARCHAR(32) NOT NULL, -- 'sie' | 'company_card'
+  params_json JSON NOT NULL,
+  cache_key VARCHAR(64) NULL, -- hash of (kind, params, data version); NULL when not cacheable
+  status VARCHAR(16) NOT NULL DEFAULT 'queued', -- 'queued' | 'running' | 'done' | 'error'
+  result_path VARCHAR(512) NULL,
+  result_size BIGINT NULL,
+  error VARCHAR(1024) NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  started_at TIMESTAMP NULL,
+  finished_at TIMESTAMP NULL
+);
+
+CREATE INDEX idx_export_jobs_created ON export_jobs(created_at);
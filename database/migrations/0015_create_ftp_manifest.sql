@@ -0,0 +1,11 @@
+-- Remote files already ingested by the incremental FTP sync, per server directory.
+-- A listed file is fetched again only when its size or modification time changes.
+CREATE TABLE IF NOT EXISTS ftp_manifest (
+  source VARCHAR(191) NOT NULL, -- host:port/remote_dir
+  name VARCHAR(500) NOT NULL,
+  size BIGINT NULL,
+  modified VARCHAR(32) NULL, -- MLSD/MDTM timestamp as sent by the server (YYYYMMDDHHMMSS[.sss])
+  file_id VARCHAR(36) NULL,
+  synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (source, name)
+);
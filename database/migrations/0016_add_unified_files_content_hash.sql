@@ -0,0 +1,6 @@
+-- Ingest-time deduplication: SHA-256 of the stored bytes (for multi-page captures,
+-- of the page hashes in order). The unique index makes the first writer win; later
+-- copies are linked to that row instead of being stored and OCR'd again.
+ALTER TABLE unified_files ADD COLUMN content_hash CHAR(64) NULL;
+
+CREATE UNIQUE INDEX uq_unified_files_content_hash ON unified_files(content_hash);
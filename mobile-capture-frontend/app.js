@@ -1,9 +1,15 @@
 // Mobile Receipt Capture App
 // Implements the user flow from MIND_FUNCTION_DESCRIPTION.md
 
+const API_BASE = '/ai/api';
+// Bytes per PUT; small enough that a dropped connection loses little.
+const UPLOAD_CHUNK_SIZE = 256 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
 class ReceiptCaptureApp {
     constructor() {
         this.photos = [];
+        this.upload = null;
         this.selectedTags = [];
         this.includeLocation = false;
         this.availableTags = [];
@@ -243,44 +249,19 @@ class ReceiptCaptureApp {
         submitBtn.textContent = 'Uploading...';
 
         try {
-            const formData = new FormData();
-            
-            // Add photos
-            this.photos.forEach((photo, index) => {
-                formData.append('images', photo.blob, `page-${index + 1}.jpg`);
-            });
-            
-            // Add metadata
-            formData.set('tags', JSON.stringify(this.selectedTags));
-            
-            // Add location if requested
-            if (this.includeLocation && navigator.geolocation) {
-                try {
-                    const position = await this.getCurrentPosition();
-                    const locationData = {
-                        lat: position.coords.latitude,
-                        lon: position.coords.longitude,
-                        acc: position.coords.accuracy
-                    };
-                    formData.set('location', JSON.stringify(locationData));
-                } catch (error) {
-                    console.warn('Could not get location:', error);
-                }
+            const signature = JSON.stringify([this.photos.map(p => p.id), this.selectedTags, this.includeLocation]);
+            if (!this.upload || this.upload.signature !== signature) {
+                // The position is read once per upload; pressing Submit again reuses it
+                this.upload = { id: null, signature, location: await this.getLocationData() };
             }
-
-            // Submit to API
-            const response = await fetch('/ai/api/capture/upload', {
-                method: 'POST',
-                body: formData
-            });
-
-            if (response.ok) {
-                const result = await response.json();
-                console.log('Upload successful:', result);
-                this.showScreen('success-screen');
-            } else {
-                throw new Error(`Upload failed: ${response.status}`);
+            let result = await this.uploadResumable(submitBtn);
+            if (result === null) {
+                // Backend without resumable uploads
+                result = await this.uploadMultipart(this.upload.location);
             }
+            console.log('Upload successful:', result);
+            this.upload = null;
+            this.showScreen('success-screen');
 
         } catch (error) {
             console.error('Upload error:', error);
@@ -291,6 +272,130 @@ class ReceiptCaptureApp {
         }
     }
 
+    async getLocationData() {
+        if (!this.includeLocation || !navigator.geolocation) {
+            return null;
+        }
+        try {
+            const position = await this.getCurrentPosition();
+            return {
+                lat: position.coords.latitude,
+                lon: position.coords.longitude,
+                acc: position.coords.accuracy
+            };
+        } catch (error) {
+            console.warn('Could not get location:', error);
+            return null;
+        }
+    }
+
+    // Resumable upload: open a session, send each page in chunks from the offset the
+    // server reports, then finalize. A failed submit keeps the session in this.upload,
+    // so pressing Submit again only sends what is missing. Returns null if the backend
+    // lacks it.
+    async uploadResumable(submitBtn) {
+        const pages = this.photos.map((photo, index) => ({
+            size: photo.blob.size,
+            filename: `page-${index + 1}.jpg`
+        }));
+
+        if (!this.upload.id) {
+            const res = await fetch(`${API_BASE}/capture/uploads`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ pages, tags: this.selectedTags, location: this.upload.location })
+            });
+            if (res.status === 404 || res.status === 405) {
+                return null;
+            }
+            if (!res.ok) {
+                throw new Error(`Upload failed: ${res.status}`);
+            }
+            const session = await res.json();
+            this.upload.id = session.upload_id;
+        }
+
+        const uploadUrl = `${API_BASE}/capture/uploads/${this.upload.id}`;
+        const state = await this.fetchWithRetry(uploadUrl, {}, uploadUrl);
+        const total = pages.reduce((sum, page) => sum + page.size, 0);
+        let sent = state.pages.reduce((sum, page) => sum + page.received, 0);
+
+        for (const page of state.pages) {
+            const blob = this.photos[page.index - 1].blob;
+            let offset = page.received;
+            while (offset < page.size) {
+                const chunk = blob.slice(offset, offset + UPLOAD_CHUNK_SIZE);
+                const ack = await this.fetchWithRetry(
+                    `${uploadUrl}/pages/${page.index}?offset=${offset}`,
+                    { method: 'PUT', body: chunk },
+                    uploadUrl,
+                    page.index
+                );
+                sent += ack.received - offset;
+                offset = ack.received;
+                submitBtn.textContent = `Uploading... ${Math.floor((sent / total) * 100)}%`;
+            }
+        }
+
+        return this.fetchWithRetry(`${uploadUrl}/finalize`, { method: 'POST' }, uploadUrl);
+    }
+
+    // Retry a request with backoff. For chunk PUTs, a 409 carries the server's offset,
+    // which is returned so the caller continues from there.
+    async fetchWithRetry(url, options, sessionUrl = null, pageIndex = null) {
+        let lastError = null;
+        for (let attempt = 0; attempt <= UPLOAD_MAX_RETRIES; attempt++) {
+            if (attempt > 0) {
+                await new Promise(resolve => setTimeout(resolve, Math.min(1000 * 2 ** (attempt - 1), 15000)));
+            }
+            try {
+                const res = await fetch(url, options);
+                if (res.ok) {
+                    return await res.json();
+                }
+                if (res.status === 409 && pageIndex !== null) {
+                    const body = await res.json();
+                    if (typeof body.received === 'number') {
+                        return { received: body.received };
+                    }
+                }
+                if (res.status === 404 && sessionUrl !== null && this.upload) {
+                    // The session expired; the next submit opens a new one
+                    this.upload.id = null;
+                }
+                if (res.status < 500) {
+                    throw Object.assign(new Error(`Upload failed: ${res.status}`), { fatal: true });
+                }
+                lastError = new Error(`Upload failed: ${res.status}`);
+            } catch (error) {
+                if (error.fatal) {
+                    throw error;
+                }
+                lastError = error;
+            }
+        }
+        throw lastError;
+    }
+
+    async uploadMultipart(location) {
+        const formData = new FormData();
+        this.photos.forEach((photo, index) => {
+            formData.append('images', photo.blob, `page-${index + 1}.jpg`);
+        });
+        formData.set('tags', JSON.stringify(this.selectedTags));
+        if (location) {
+            formData.set('location', JSON.stringify(location));
+        }
+        const response = await fetch(`${API_BASE}/capture/upload`, {
+            method: 'POST',
+            body: formData
+        });
+        if (!response.ok) {
+            throw new Error(`Upload failed: ${response.status}`);
+        }
+        return response.json();
+    }
+
     getCurrentPosition() {
         return new Promise((resolve, reject) => {
             navigator.geolocation.getCurrentPosition(resolve, reject, {
@@ -311,6 +416,7 @@ class ReceiptCaptureApp {
         this.photos = [];
         this.selectedTags = [];
         this.includeLocation = false;
+        this.upload = null;
         
         // Reset UI
         this.renderPhotoQueue();
@@ -0,0 +1,157 @@
+"""Benchmark OCR field parsing (services.ocr_fields) for speed and accuracy.
+
+Corpus format: JSON lines with ``text`` (raw OCR text) and ``expected`` holding any of
+``merchant``, ``gross``, ``date`` (YYYY-MM-DD) and ``vat`` ({"25": 47.78}). An optional
+``legacy`` object holds the same fields as produced by the regex helpers the engine
+replaced; when present, their accuracy is reported alongside and every field where the
+two disagree is listed.
+
+Bundled corpora (backend/tests/perf/data):
+  ocr_receipts_real.jsonl   anonymised ocr_raw of stored receipts, with legacy output
+  ocr_receipts.jsonl        synthetic receipts covering the layouts the engine targets
+
+    python scripts/benchmark_ocr_parsing.py                      # real receipts
+    python scripts/benchmark_ocr_parsing.py --corpus backend/tests/perf/data/ocr_receipts.jsonl
+    python scripts/benchmark_ocr_parsing.py --corpus texts.jsonl
+    python scripts/benchmark_ocr_parsing.py --from-db 500        # ocr_raw + stored fields from MySQL
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "backend" / "src"))
+
+from services.ocr_fields import extract_fields  # noqa: E402
+
+DEFAULT_CORPUS = ROOT / "backend" / "tests" / "perf" / "data" / "ocr_receipts_real.jsonl"
+
+
+def load_corpus(path: Path) -> list[dict]:
+    with path.open(encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def load_from_db(limit: int) -> list[dict]:
+    """Use stored OCR text with the (possibly user-corrected) receipt fields as labels."""
+    import mysql.connector
+
+    cnx = mysql.connector.connect(
+        host=os.getenv("DB_HOST", "127.0.0.1"),
+        port=int(os.getenv("DB_PORT", "3310")),
+        database=os.getenv("DB_NAME", "mono_se_db_9"),
+        user=os.getenv("DB_USER", "mind"),
+        password=os.getenv("DB_PASS", "mind"),
+    )
+    try:
+        cur = cnx.cursor()
+        cur.execute(
+            "SELECT ocr_raw, merchant_name, gross_amount, purchase_datetime FROM unified_files "
+            "WHERE ocr_raw IS NOT NULL AND ocr_raw <> '' ORDER BY created_at DESC LIMIT %s",
+            (limit,),
+        )
+        corpus = []
+        for text, merchant, gross, purchased in cur.fetchall():
+            expected = {}
+            if merchant:
+                expected["merchant"] = merchant
+            if gross is not None:
+                expected["gross"] = float(gross)
+            if purchased is not None:
+                expected["date"] = purchased.strftime("%Y-%m-%d")
+            corpus.append({"text": text, "expected": expected})
+        return corpus
+    finally:
+        cnx.close()
+
+
+def field_values(fields) -> dict:
+    """The extracted fields in corpus form, so engine and legacy output compare alike."""
+    return {
+        "merchant": fields.merchant,
+        "gross": fields.gross,
+        "date": (fields.purchase_datetime or "")[:10] or None,
+        "vat": {str(rate): round(amount, 2) for rate, amount in fields.vat_breakdown.items()},
+    }
+
+
+def _matches(name: str, got, expected) -> bool:
+    if name == "merchant":
+        return (got or "").strip().lower() == str(expected).strip().lower()
+    if name == "gross":
+        return got is not None and abs(got - float(expected)) < 0.005
+    if name == "date":
+        return got == expected
+    if name == "vat":
+        got = {str(rate): round(float(amount), 2) for rate, amount in (got or {}).items()}
+        return got == {str(rate): round(float(amount), 2) for rate, amount in expected.items()}
+    return False
+
+
+def _same(name: str, old, new) -> bool:
+    if old is None or new is None:
+        return old is None and new is None
+    return _matches(name, new, old)
+
+
+def run(corpus: list[dict], repeat: int) -> dict:
+    timings: list[float] = []
+    hits: dict[str, list[bool]] = {}
+    legacy_hits: dict[str, list[bool]] = {}
+    changed: list[tuple[str, str, object, object]] = []
+    for sample in corpus:
+        text = sample["text"]
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fields = extract_fields(text)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best * 1e6)
+        values = field_values(fields)
+        for name, expected in (sample.get("expected") or {}).items():
+            hits.setdefault(name, []).append(_matches(name, values[name], expected))
+        legacy = sample.get("legacy")
+        if legacy is None:
+            continue
+        for name, expected in (sample.get("expected") or {}).items():
+            legacy_hits.setdefault(name, []).append(_matches(name, legacy.get(name), expected))
+        for name, old in legacy.items():
+            if not _same(name, old, values[name]):
+                changed.append((sample.get("source") or text[:30], name, old, values[name]))
+    timings.sort()
+    return {
+        "receipts": len(corpus),
+        "mean_us": statistics.fmean(timings) if timings else 0.0,
+        "p50_us": timings[len(timings) // 2] if timings else 0.0,
+        "p95_us": timings[max(int(0.95 * len(timings)) - 1, 0)] if timings else 0.0,
+        "accuracy": {name: sum(ok) / len(ok) for name, ok in hits.items()},
+        "legacy_accuracy": {name: sum(ok) / len(ok) for name, ok in legacy_hits.items()},
+        "changed": changed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--from-db", type=int, default=0, metavar="N", help="benchmark the latest N receipts in MySQL")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per receipt; the fastest is reported")
+    args = parser.parse_args()
+
+    corpus = load_from_db(args.from_db) if args.from_db else load_corpus(args.corpus)
+    report = run(corpus, max(args.repeat, 1))
+    print(f"receipts: {report['receipts']}")
+    print(f"parse time per receipt: mean {report['mean_us']:.1f} us, p50 {report['p50_us']:.1f} us, p95 {report['p95_us']:.1f} us")
+    legacy = report["legacy_accuracy"]
+    for name, score in sorted(report["accuracy"].items()):
+        baseline = f"   (legacy {legacy[name]:6.1%})" if name in legacy else ""
+        print(f"accuracy {name:<8} {score:6.1%}{baseline}")
+    for source, name, old, new in report["changed"]:
+        print(f"changed  {name:<8} {source}: {old!r} -> {new!r}")
+
+
+if __name__ == "__main__":
+    main()
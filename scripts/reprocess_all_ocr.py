@@ -1,4 +1,5 @@
 
+import argparse
 import os
 import sys
 import mysql.connector
@@ -21,10 +22,12 @@ CELERY_RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 
 # --- Main Script ---
 
-def enqueue_ocr_for_all_receipts():
+def enqueue_ocr_for_all_receipts(batch_size: int = 1):
     """
     Connects to the database, fetches all receipt IDs, and enqueues a Celery
-    task to process OCR for each one.
+    task to process OCR for each one. With batch_size > 1, receipts are sent in
+    groups to 'process_ocr_batch' so the worker can batch pages through the
+    OCR engine (see OCR_BATCH_SIZE).
     """
     if not DB_PASS:
         print("ERROR: The DB_PASS environment variable is not set.", file=sys.stderr)
@@ -77,15 +80,25 @@ def enqueue_ocr_for_all_receipts():
         print("Celery connection successful.")
 
         enqueued_count = 0
-        print(f"Enqueuing {len(receipt_ids)} tasks...")
-        for rid in receipt_ids:
-            try:
-                # The task name must match how Celery knows it.
-                # Usually 'path.to.module.task_function_name'
-                celery_app.send_task('services.tasks.process_ocr', args=[rid])
-                enqueued_count += 1
-            except Exception as e:
-                print(f"Failed to enqueue task for receipt ID {rid}: {e}", file=sys.stderr)
+        if batch_size > 1:
+            print(f"Enqueuing {len(receipt_ids)} receipts in batches of {batch_size}...")
+            for start in range(0, len(receipt_ids), batch_size):
+                chunk = receipt_ids[start:start + batch_size]
+                try:
+                    celery_app.send_task('services.tasks.process_ocr_batch', args=[chunk], queue='ocr')
+                    enqueued_count += len(chunk)
+                except Exception as e:
+                    print(f"Failed to enqueue batch starting at {chunk[0]}: {e}", file=sys.stderr)
+        else:
+            print(f"Enqueuing {len(receipt_ids)} tasks...")
+            for rid in receipt_ids:
+                try:
+                    # The task name must match how Celery knows it.
+                    # Usually 'path.to.module.task_function_name'
+                    celery_app.send_task('services.tasks.process_ocr', args=[rid], queue='ocr')
+                    enqueued_count += 1
+                except Exception as e:
+                    print(f"Failed to enqueue task for receipt ID {rid}: {e}", file=sys.stderr)
 
         print(f"\nSuccessfully enqueued {enqueued_count} OCR tasks.")
         print("You can now monitor the 'celery-worker' container logs to see the processing progress.")
@@ -97,4 +110,12 @@ def enqueue_ocr_for_all_receipts():
 
 
 if __name__ == "__main__":
-    enqueue_ocr_for_all_receipts()
+    parser = argparse.ArgumentParser(description="Re-enqueue OCR for all receipts that are not completed.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=int(os.getenv("OCR_REPROCESS_BATCH", "1")),
+        help="Receipts per process_ocr_batch task (1 = one process_ocr task per receipt)",
+    )
+    args = parser.parse_args()
+    enqueue_ocr_for_all_receipts(batch_size=max(args.batch_size, 1))